@@ -9,12 +9,25 @@
 
 Uso:
 ====
-ama [--process-reflectivity] [-t=target] [-d=destination]
-    [--process-rainfall] [-t=target] [-d=destination]
-    [--correlate-dbz-location] [-f=filename] [-d=destination] [-l=0] [--all] [--json-test]
+ama [--process-reflectivity] [-t=target] [-d=destination] [--workers=1] [--thumbnail=512]
+    [--process-rainfall] [-t=target] [-d=destination] [--workers=1] [--thumbnail=512]
+    [--correlate-dbz-location] [-f=filename] [-d=destination] [-l=0] [--all] [--json-test] [--workers=1] [--binary]
+        [--cell-size=500] [--cell-mean] [--dedup=max] [--geofence=zones.geojson] [--all-layers] [--cappi=2000]
     [--show-data] [-t=target]
-    [--run] [-l=0]
-    [--dbscan] [-f=filename] [-l=0] [--test]
+    [--run] [-l=0] [--workers=1] [--cell-size=500] [--cell-mean] [--dedup=max] [--geofence=zones.geojson] [--accumulate]
+        [--buffer=12] [--track] [--delta]
+    [--dbscan] [-f=filename] [-l=0] [--test] [--grid-engine] [--cell-size=500] [--cell-mean] [--dedup=max]
+    [--dbscan-sweep] [-f=filename] [-l=0] [--eps=5,10,15] [--min-samples=100,300,500]
+    [--replay-spool] [--newest-first]
+    [--learn-clutter] [-t=target] [-l=0]
+    [--accumulate-rainfall] [-t=target] [-d=destination] [-l=0] [--thumbnail=512]
+    [--sweep-max] [-d=destination] [-l=0] [--window=1800] [--binary]
+    [--replay-sweeps] [-l=0] [--window=1800] [--test] [--grid-engine]
+
+Filtros y Región (--correlate-dbz-location, --run, --dbscan, --dbscan-sweep, --sweep-max y --replay-sweeps):
+============================================================================================================
+    [--speckle=3] [--clutter] [--min-range=2] [--blocked-sector=350:10]
+    [--max-range=50] [--bbox=lat_min,lon_min,lat_max,lon_max] [--notification-zone]
 
 Opciones:
 =========
@@ -26,8 +39,22 @@ Opciones:
                              coordenadas geograficas
     --show-data              muestra los datos en pantalla (DEBUG)
     --run                    lanza un proceso que escucha por el ultimo archivo
-                             generado por el radar, y lo procesa
+                             generado por el radar, y lo procesa. Requiere las
+                             credenciales del Controlador en AMA_CONTROLLER_USER y
+                             AMA_CONTROLLER_PASSWORD
     --dbscan                 procesa datos utilizando el algoritmo DBSCAN
+    --dbscan-sweep           evalúa varias combinaciones de parámetros de DBSCAN
+                             sobre un mismo archivo
+    --replay-spool           reenvía al Controlador los datos guardados en el spool
+                             mientras el servicio Web no respondía
+    --learn-clutter          aprende la máscara de clutter de una capa a partir de los
+                             archivos de un directorio (idealmente sin lluvia)
+    --accumulate-rainfall    integra en orden los archivos de un directorio en los
+                             acumulados de lluvia de 1, 3 y 24 horas de una capa
+    --sweep-max              correlaciona la reflectividad máxima de los últimos barridos
+                             guardados en el buffer de una capa
+    --replay-sweeps          vuelve a detectar los clusters de los barridos guardados en
+                             el buffer de una capa con los parámetros actuales
 
     ---
 
@@ -44,6 +71,39 @@ Opciones:
     --all       Procesar todos los archivos en un directorio.
     --test      Habilitar modo pruebas/verificación.
     --json-test Habilitar modo pruebas/verificación con generación del archivo JSON.
+    --workers   La cantidad de procesos a utilizar para procesar un directorio, o de hilos
+                que procesan los archivos nuevos en modo *run*. Por defecto 1. En modo *run* no
+                puede combinarse con --track, --delta ni --accumulate, que dependen del orden de
+                los barridos.
+    --binary    Generar los archivos de correlación en formato binario (*.amab*).
+    --all-layers Correlacionar todas las capas leyendo el archivo una sola vez y generar el
+                máximo en columna de reflectividad del volumen.
+    --cappi     Con --all-layers, generar también un CAPPI a esta altitud en metros.
+    --accumulate Actualizar los acumulados de lluvia con cada archivo nuevo en modo *run*.
+    --track     Seguir las celdas de tormenta entre barridos e incluir su identificador, velocidad y
+                crecimiento en el JSON.
+    --delta     Enviar al Controlador solo los puntos que cambiaron desde el barrido anterior, con un
+                número de secuencia y un envío completo periódico.
+    --buffer    Guardar los últimos N barridos de la capa en el buffer circular en modo *run*.
+    --window    La ventana en segundos de --sweep-max y --replay-sweeps. Por defecto todo el buffer.
+    --thumbnail Generar miniaturas PNG de este lado en píxeles sin utilizar matplotlib.
+    --newest-first Reenviar primero los datos más nuevos del spool.
+    --grid-engine  Utilizar el DBSCAN indexado por grilla en lugar del de sklearn (ball tree).
+    --cell-size    Agregar los gates en celdas de este lado en metros antes de agrupar y enviar.
+    --cell-mean    Utilizar el promedio de reflectividad de cada celda en lugar del máximo.
+    --dedup        Combinar los gates con las mismas coordenadas con la reflectividad máxima (max),
+                   el promedio (mean) o la del primero (first).
+    --speckle      Descartar los gates con menos de esta cantidad de vecinos con eco.
+    --clutter      Descartar los gates marcados en la máscara de clutter de la capa.
+    --min-range    Descartar los gates a menos de esta distancia del radar en km.
+    --blocked-sector Descartar los gates entre dos azimuts en grados (desde:hasta). Se puede repetir.
+    --max-range    Procesar solo los gates a esta distancia del radar en km o menos.
+    --bbox         Procesar solo los gates dentro del rectángulo lat_min,lon_min,lat_max,lon_max.
+    --notification-zone Procesar solo los gates dentro del radio de notificaciones (50 km).
+    --geofence     Archivo GeoJSON con las zonas de notificación. Se notifica cuando un cluster
+                   afecta a alguna zona y el JSON incluye las zonas afectadas por cada cluster.
+    --eps          Lista separada por comas de distancias en km a evaluar con --dbscan-sweep.
+    --min-samples  Lista separada por comas de cantidades mínimas de puntos a evaluar con --dbscan-sweep.
 
 Banderas:
 =========
@@ -54,7 +114,9 @@ import ama.utils as utils
 import ama.dbscan_processor as dbscan
 import ama.processor as processor
 import ama.file_listener as listener
+import ama.geofence as geofence
 import ama.show_data as show
+import ama.uploader as uploader
 import getopt
 import os
 import sys
@@ -90,6 +152,13 @@ def main(argv=None):
     process_all = False
     test = False
     json_test = False
+    workers = 1
+    binary = False
+    all_layers = False
+    newest_first = False
+    epsilons = None
+    window = None
+    min_samples = None
 
     if argv is None:
         argv = sys.argv
@@ -108,7 +177,38 @@ def main(argv=None):
                     "all",
                     "test",
                     "json-test",
-                    "dbscan"
+                    "dbscan",
+                    "workers=",
+                    "binary",
+                    "replay-spool",
+                    "newest-first",
+                    "grid-engine",
+                    "dbscan-sweep",
+                    "eps=",
+                    "min-samples=",
+                    "cell-size=",
+                    "cell-mean",
+                    "dedup=",
+                    "learn-clutter",
+                    "speckle=",
+                    "clutter",
+                    "min-range=",
+                    "blocked-sector=",
+                    "max-range=",
+                    "bbox=",
+                    "notification-zone",
+                    "geofence=",
+                    "all-layers",
+                    "cappi=",
+                    "thumbnail=",
+                    "accumulate-rainfall",
+                    "accumulate",
+                    "sweep-max",
+                    "replay-sweeps",
+                    "buffer=",
+                    "window=",
+                    "track",
+                    "delta"
                 ]
             )
             if not opts:
@@ -134,6 +234,18 @@ def main(argv=None):
                 command = 5
             elif opt == "--dbscan":
                 command = 6
+            elif opt == "--replay-spool":
+                command = 7
+            elif opt == "--dbscan-sweep":
+                command = 8
+            elif opt == "--learn-clutter":
+                command = 9
+            elif opt == "--accumulate-rainfall":
+                command = 10
+            elif opt == "--sweep-max":
+                command = 11
+            elif opt == "--replay-sweeps":
+                command = 12
             elif opt == "-t":
                 target = arg
             elif opt == "-d":
@@ -148,6 +260,57 @@ def main(argv=None):
                 test = True
             elif opt == "--json-test":
                 json_test = True
+            elif opt == "--workers":
+                workers = int(arg)
+            elif opt == "--binary":
+                binary = True
+            elif opt == "--all-layers":
+                all_layers = True
+            elif opt == "--cappi":
+                processor.Processor.CAPPI_ALTITUDE = float(arg)
+            elif opt == "--track":
+                processor.Processor.TRACK_CELLS = True
+            elif opt == "--delta":
+                processor.Processor.DELTA_PAYLOAD = True
+            elif opt == "--buffer":
+                processor.Processor.SWEEP_BUFFER_SIZE = int(arg)
+            elif opt == "--window":
+                window = int(arg)
+            elif opt == "--accumulate":
+                processor.Processor.ACCUMULATE_RAINFALL = True
+            elif opt == "--thumbnail":
+                processor.Processor.THUMBNAIL_SIZE = int(arg)
+            elif opt == "--newest-first":
+                newest_first = True
+            elif opt == "--grid-engine":
+                dbscan.DBSCANProcessor.CLUSTERING_ENGINE = "grid"
+            elif opt == "--cell-size":
+                processor.Processor.GRID_CELL_SIZE = float(arg)
+            elif opt == "--cell-mean":
+                processor.Processor.GRID_AGGREGATION = "mean"
+            elif opt == "--dedup":
+                processor.Processor.DEDUPLICATION = arg
+            elif opt == "--speckle":
+                processor.Processor.SPECKLE_MINIMUM_NEIGHBORS = int(arg)
+            elif opt == "--clutter":
+                processor.Processor.USE_CLUTTER_MASK = True
+            elif opt == "--min-range":
+                processor.Processor.MINIMUM_RANGE = float(arg)
+            elif opt == "--blocked-sector":
+                start, end = arg.split(":")
+                processor.Processor.BLOCKED_SECTORS.append((float(start), float(end)))
+            elif opt == "--max-range":
+                processor.Processor.ROI_MAXIMUM_RANGE = float(arg)
+            elif opt == "--bbox":
+                processor.Processor.ROI_BBOX = tuple(float(value) for value in arg.split(","))
+            elif opt == "--notification-zone":
+                processor.Processor.ROI_MAXIMUM_RANGE = processor.Processor.NOTIFICATION_RADIUS
+            elif opt == "--geofence":
+                processor.Processor.GEOFENCE_FILE = os.path.abspath(arg)
+            elif opt == "--eps":
+                epsilons = [float(value) for value in arg.split(",")]
+            elif opt == "--min-samples":
+                min_samples = [int(value) for value in arg.split(",")]
 
         # tomar la decision.
         if command == 1:
@@ -155,19 +318,20 @@ def main(argv=None):
                 print(utils.Colors.FAIL + "ERROR: Origen y destino no definidos." + utils.Colors.ENDC)
                 return 2
 
-            processor.Processor().process_directory_generate_raw_images_from_reflectivity(target, destination)
+            processor.Processor().process_directory_generate_raw_images_from_reflectivity(target, destination, workers)
         elif command == 2:
             if not target and not destination:
                 print(utils.Colors.FAIL + "ERROR: Origen y destino no definidos." + utils.Colors.ENDC)
                 return 2
 
-            processor.Processor().process_directory_generate_raw_images_from_rainfall_intensity(target, destination)
+            processor.Processor().process_directory_generate_raw_images_from_rainfall_intensity(target, destination, workers)
         elif command == 3:
             if not filename and not destination:
                 print(utils.Colors.FAIL + "ERROR: Nombre de archivo y destino no definidos." + utils.Colors.ENDC)
                 return 2
 
-            processor.Processor().correlate_dbz_to_location(filename, destination, process_all, layer, json_test)
+            processor.Processor().correlate_dbz_to_location(filename, destination, process_all, layer, json_test, workers,
+                                                            binary, all_layers)
         elif command == 4:
             if not target:
                 print(utils.Colors.FAIL + "ERROR: Origen no definido." + utils.Colors.ENDC)
@@ -175,10 +339,27 @@ def main(argv=None):
 
             show.ShowData.show_data(target)
         elif command == 5:
+            if workers > 1 and (processor.Processor.TRACK_CELLS or processor.Processor.DELTA_PAYLOAD or
+                                processor.Processor.ACCUMULATE_RAINFALL):
+                # con varios hilos los barridos terminan en cualquier orden.
+                print(utils.Colors.FAIL + "ERROR: --track, --delta y --accumulate necesitan procesar los barridos en orden, "
+                                          "utilizar --workers=1." + utils.Colors.ENDC)
+                return 2
+
+            try:
+                sender = uploader.Uploader.default()
+            except ValueError as e:
+                print(utils.Colors.FAIL + "ERROR: {0}".format(e) + utils.Colors.ENDC)
+                return 2
+
             directory = os.path.join(os.environ["WRADLIB_DATA"], target)
             print(utils.Colors.BOLD + "INFO: Escuchando por adiciones en {0}.".format(directory) + utils.Colors.ENDC)
 
-            event_handler = listener.FileListener(layer)
+            sender.start()  # enviar los datos al Controlador en segundo plano.
+            if processor.Processor.GEOFENCE_FILE:
+                geofence.Geofence.default(processor.Processor.GEOFENCE_FILE)  # indexar las zonas una sola vez.
+
+            event_handler = listener.FileListener(layer, workers)
             observer = Observer()
             observer.schedule(event_handler, path=directory, recursive=False)
             observer.start()  # lanzar el proceso que observa adiciones en el directorio.
@@ -188,12 +369,53 @@ def main(argv=None):
             except KeyboardInterrupt:
                 observer.stop()  # agregar opcion de parar el observador con Ctrl+C.
             observer.join()
+            event_handler.stop()
+            sender.stop()
         elif command == 6:
             if not filename:
                 print(utils.Colors.FAIL + "ERROR: Nombre de archivo no especificado." + utils.Colors.ENDC)
                 return 2
 
             dbscan.DBSCANProcessor().plot_all_points(filename, layer, test)
+        elif command == 7:
+            try:
+                sender = uploader.Uploader.default()
+            except ValueError as e:
+                print(utils.Colors.FAIL + "ERROR: {0}".format(e) + utils.Colors.ENDC)
+                return 2
+
+            if sender.spool is None:
+                print(utils.Colors.FAIL + "ERROR: Spool no disponible, definir AMA_EXPORT_DATA." + utils.Colors.ENDC)
+                return 2
+
+            sent = sender.spool.drain(sender.send, newest_first)
+            print(utils.Colors.BOLD + "INFO: Reenviados {0} datos, {1} pendientes.".format(sent, len(sender.spool)) + utils.Colors.ENDC)
+        elif command == 8:
+            if not filename:
+                print(utils.Colors.FAIL + "ERROR: Nombre de archivo no especificado." + utils.Colors.ENDC)
+                return 2
+
+            dbscan.DBSCANProcessor().sweep(filename, layer, epsilons, min_samples, test)
+        elif command == 9:
+            if not target:
+                print(utils.Colors.FAIL + "ERROR: Origen no definido." + utils.Colors.ENDC)
+                return 2
+
+            processor.Processor().learn_clutter(target, layer)
+        elif command == 10:
+            if not target:
+                print(utils.Colors.FAIL + "ERROR: Origen no definido." + utils.Colors.ENDC)
+                return 2
+
+            processor.Processor().process_directory_accumulate_rainfall(target, destination, layer)
+        elif command == 11:
+            if not destination:
+                print(utils.Colors.FAIL + "ERROR: Destino no definido." + utils.Colors.ENDC)
+                return 2
+
+            processor.Processor().sweep_window_maximum(destination, layer, window, binary)
+        elif command == 12:
+            dbscan.DBSCANProcessor().replay(layer, window, test)
     except Usage, err:
         print(utils.Colors.FAIL + "ERROR: {0}".format(err.msg) + utils.Colors.ENDC)
         print(utils.Colors.BOLD + "INFO: para ayuda utilizar --help" + utils.Colors.ENDC)
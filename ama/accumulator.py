@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+
+"""
+Clase perteneciente al módulo de procesamiento de datos e inferencias Ama.
+
+.. module:: accumulator
+   :platform: Unix
+   :synopsis: Acumulados de lluvia de 1, 3 y 24 horas actualizados barrido a barrido.
+
+.. moduleauthor:: Andreas P. Koenzen <akc@apkc.net>
+"""
+
+import ama.utils as utils
+import calendar
+import json
+import numpy as np
+import os
+import threading
+import time
+
+__author__ = "Andreas P. Koenzen"
+__copyright__ = "Copyright 2016, Proyecto de Tesis / Universidad Católica de Asunción."
+__credits__ = "Andreas P. Koenzen"
+__license__ = "BSD"
+__version__ = "0.1"
+__maintainer__ = "Andreas P. Koenzen"
+__email__ = "akc@apkc.net"
+__status__ = "Prototype"
+
+
+class RainfallAccumulator:
+    """
+    Acumulados de lluvia por gate de una capa sobre ventanas de tiempo fijas.
+
+    Cada barrido se convierte en intensidad de lluvia con una tabla sobre la reflectividad
+    cuantizada y se integra por el intervalo desde el barrido anterior. El incremento se suma a
+    los totales de todas las ventanas y se guarda en un buffer circular, de donde se resta cuando
+    sale de cada ventana. Por lo tanto actualizar los acumulados cuesta lo mismo que procesar un
+    barrido, sin volver a leer los archivos de la ventana.
+
+    Los totales y el buffer son archivos *.npy* abiertos en modo *memory-map* dentro de
+    *DIRECTORY*, de esta forma los acumulados sobreviven a un reinicio del proceso.
+    """
+
+    ###### OPCIONES DE ACUMULADOS ######
+    DIRECTORY = "accumulation"
+    """
+    string: El directorio, relativo a la variable de entorno AMA_EXPORT_DATA, donde se guardan los acumulados.
+    """
+    WINDOWS = (3600, 10800, 86400)
+    """
+    tuple: Las ventanas de acumulación en segundos. Por defecto 1, 3 y 24 horas.
+    """
+    SLOTS = 288
+    """
+    int: La cantidad de barridos del buffer circular. Debe cubrir la ventana más larga, ej. 24 horas \
+        con un barrido cada 5 minutos.
+    """
+    SCAN_INTERVAL = 300
+    """
+    int: El intervalo en segundos con el que se integra el primer barrido, o uno posterior a un corte.
+    """
+    MAXIMUM_INTERVAL = 900
+    """
+    int: El intervalo máximo en segundos entre dos barridos. Un intervalo mayor se considera un corte y \
+        el barrido se integra por *SCAN_INTERVAL*.
+    """
+    Z_R_A = 200.
+    """
+    float: El coeficiente *a* de la relación Z = a * R ^ b (Marshall-Palmer).
+    """
+    Z_R_B = 1.6
+    """
+    float: El exponente *b* de la relación Z = a * R ^ b (Marshall-Palmer).
+    """
+    DBZ_MINIMUM = -32.
+    """
+    float: La menor reflectividad de la tabla de intensidades. Valores menores no son lluvia.
+    """
+    DBZ_MAXIMUM = 55.
+    """
+    float: La mayor reflectividad de la tabla de intensidades. Valores mayores se deben en general a \
+        granizo y se toman como este, para no sobreestimar la lluvia.
+    """
+    DBZ_STEP = 0.1
+    """
+    float: La resolución de la tabla de intensidades en dBZ.
+    """
+
+    _table = None
+    _entries = {}
+    _lock = threading.Lock()
+
+    def __init__(self, layer, shape):
+        """
+        Abre los acumulados de una capa o los crea si no existen o la geometría cambió.
+
+        :param layer: La capa de datos.
+        :param shape: La forma de la matriz de la capa (N azimuts, M distancias).
+        """
+        self.layer = layer
+        self.shape = tuple(int(k) for k in shape)
+        self.directory = os.path.join(os.environ["AMA_EXPORT_DATA"], self.DIRECTORY, "layer_{0}".format(layer))
+        self.lock = threading.Lock()
+
+        self.index = self._read_index()
+        if self.index is None or tuple(self.index["shape"]) != self.shape or \
+                list(self.index["windows"]) != list(self.WINDOWS) or len(self.index["times"]) != self.SLOTS:
+            if self.index is not None:
+                print(utils.Colors.WARNING + "WARN: La geometría de los acumulados de la capa {0} cambió, reiniciando...".format(
+                    layer) + utils.Colors.ENDC)
+            self._create()
+
+        self.totals = np.load(os.path.join(self.directory, "totals.npy"), mmap_mode="r+")
+        self.ring = np.load(os.path.join(self.directory, "ring.npy"), mmap_mode="r+")
+
+    @staticmethod
+    def rain_rate(values):
+        """
+        Convierte reflectividades en intensidades de lluvia con la tabla de intensidades. Equivale a
+        *wrl.zr.z2r(wrl.trafo.idecibel(values), a, b)* con la reflectividad redondeada a *DBZ_STEP* y \
+        limitada a *DBZ_MAXIMUM*.
+
+        :param values: Matriz con las reflectividades en dBZ.
+
+        :return: Matriz de float32 con las intensidades en mm/h.
+        """
+        table = RainfallAccumulator.rate_table()
+        values = np.asarray(values, dtype=np.float64)
+
+        levels = np.rint((values - RainfallAccumulator.DBZ_MINIMUM) / RainfallAccumulator.DBZ_STEP)
+        levels = np.where(np.isfinite(levels), levels, 0.).clip(0, len(table) - 1).astype(np.int64)
+
+        return table[levels]
+
+    @staticmethod
+    def rate_table():
+        """
+        Devuelve la tabla de intensidades de lluvia por reflectividad, calculándola la primera vez.
+
+        :return: Vector de float32 con la intensidad en mm/h de cada nivel de *DBZ_STEP* desde *DBZ_MINIMUM*.
+        """
+        if RainfallAccumulator._table is None:
+            count = int(round((RainfallAccumulator.DBZ_MAXIMUM - RainfallAccumulator.DBZ_MINIMUM) /
+                              RainfallAccumulator.DBZ_STEP)) + 1
+            dBZ = RainfallAccumulator.DBZ_MINIMUM + np.arange(count) * RainfallAccumulator.DBZ_STEP
+            table = (10. ** (dBZ / 10.) / RainfallAccumulator.Z_R_A) ** (1. / RainfallAccumulator.Z_R_B)
+            table[0] = 0.  # el mínimo del rango dinámico del radar, o menos, es ausencia de datos.
+            RainfallAccumulator._table = table.astype(np.float32)
+
+        return RainfallAccumulator._table
+
+    @staticmethod
+    def epoch(scan_time):
+        """
+        Convierte la hora de un barrido en segundos desde 1970.
+
+        :param scan_time: La hora en formato ISO 8601 en UTC. Ej. *2017-06-01T10:00:00.000Z*.
+
+        :return: Los segundos desde 1970.
+        """
+        return calendar.timegm(time.strptime(scan_time[:19], "%Y-%m-%dT%H:%M:%S"))
+
+    def add(self, rate, scan_time):
+        """
+        Integra un barrido en los acumulados.
+
+        :param rate: Matriz de NxM con las intensidades de lluvia en mm/h, ver *rain_rate*.
+        :param scan_time: La hora del barrido en segundos desde 1970, ver *epoch*.
+
+        :return: True si el barrido fue agregado, False si es anterior o igual al último agregado.
+        """
+        rate = np.asarray(rate, dtype=np.float32)
+        if rate.shape != self.shape:
+            raise ValueError("La matriz ({0}) no corresponde a los acumulados ({1}).".format(rate.shape, self.shape))
+
+        with self.lock:
+            index = self.index
+            last = index["last"]
+            if last is not None and scan_time <= last:
+                print(utils.Colors.WARNING + "WARN: El barrido es anterior al último acumulado, obviando..." + utils.Colors.ENDC)
+                return False
+
+            interval = self.SCAN_INTERVAL if last is None or scan_time - last > self.MAXIMUM_INTERVAL else scan_time - last
+            sequence = index["sequence"]
+            slot = sequence % self.SLOTS
+
+            # liberar la posición del buffer si todavía forma parte de alguna ventana.
+            for k in range(len(self.WINDOWS)):
+                if index["starts"][k] <= sequence - self.SLOTS:
+                    self.totals[k] -= self.ring[slot]
+                    index["starts"][k] = sequence - self.SLOTS + 1
+
+            increment = rate * np.float32(interval / 3600.)
+            self.ring[slot] = increment
+            self.totals += increment[np.newaxis]
+            index["times"][slot] = scan_time
+            index["sequence"] = sequence + 1
+            index["last"] = scan_time
+
+            # restar los barridos que salieron de cada ventana.
+            for k, window in enumerate(self.WINDOWS):
+                start = index["starts"][k]
+                while start <= sequence and index["times"][start % self.SLOTS] <= scan_time - window:
+                    self.totals[k] -= self.ring[start % self.SLOTS]
+                    start += 1
+                index["starts"][k] = start
+
+            # el redondeo de las restas puede dejar valores levemente negativos.
+            np.maximum(self.totals, 0., out=self.totals)
+
+            self.flush()
+
+        return True
+
+    def accumulation(self, window):
+        """
+        Devuelve el acumulado de una ventana.
+
+        :param window: La ventana en segundos, una de *WINDOWS*.
+
+        :return: Matriz de NxM con la lluvia acumulada en mm.
+        """
+        return np.asarray(self.totals[list(self.WINDOWS).index(window)])
+
+    def flush(self):
+        """
+        Escribe a disco los totales, el buffer y el índice.
+
+        :return: void
+        """
+        self.totals.flush()
+        self.ring.flush()
+        self._write_index()
+
+    @staticmethod
+    def default(layer, shape):
+        """
+        Devuelve los acumulados de una capa compartidos por todo el proceso, abriéndolos la primera vez.
+
+        :param layer: La capa de datos.
+        :param shape: La forma de la matriz de la capa.
+
+        :return: Un *RainfallAccumulator*.
+        """
+        with RainfallAccumulator._lock:
+            accumulator = RainfallAccumulator._entries.get(layer)
+            if accumulator is None or accumulator.shape != tuple(shape):
+                accumulator = RainfallAccumulator(layer, shape)
+                RainfallAccumulator._entries[layer] = accumulator
+
+            return accumulator
+
+    def _read_index(self):
+        path = os.path.join(self.directory, "index.json")
+        if not os.path.exists(path):
+            return None
+
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def _create(self):
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+        for name, count in (("totals.npy", len(self.WINDOWS)), ("ring.npy", self.SLOTS)):
+            array = np.lib.format.open_memmap(os.path.join(self.directory, name), mode="w+", dtype=np.float32,
+                                              shape=(count,) + self.shape)
+            array.flush()
+            del array
+
+        self.index = {
+            "shape": list(self.shape),
+            "windows": list(self.WINDOWS),
+            "sequence": 0,
+            "last": None,
+            "starts": [0] * len(self.WINDOWS),
+            "times": [None] * self.SLOTS
+        }
+        self._write_index()
+
+    def _write_index(self):
+        path = os.path.join(self.directory, "index.json")
+        temporary = "{0}.{1}.tmp".format(path, os.getpid())
+        with open(temporary, "w") as f:
+            json.dump(self.index, f)
+        os.rename(temporary, path)
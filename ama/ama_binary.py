@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+"""
+Clase perteneciente al módulo de procesamiento de datos e inferencias Ama.
+
+.. module:: ama_binary
+   :platform: Unix
+   :synopsis: Formato binario columnar para los archivos de correlación *.ama.
+
+.. moduleauthor:: Andreas P. Koenzen <akc@apkc.net>
+"""
+
+import numpy as np
+import struct
+
+__author__ = "Andreas P. Koenzen"
+__copyright__ = "Copyright 2016, Proyecto de Tesis / Universidad Católica de Asunción."
+__credits__ = "Andreas P. Koenzen"
+__license__ = "BSD"
+__version__ = "0.1"
+__maintainer__ = "Andreas P. Koenzen"
+__email__ = "akc@apkc.net"
+__status__ = "Prototype"
+
+
+class AmaBinaryData:
+    """
+    Contenido de un archivo binario *.amab*. Las columnas se leen en modo *memory-map*, por lo
+    tanto abrir un archivo no carga los datos en memoria.
+    """
+
+    def __init__(self, path, layer, radar_latitude, radar_longitude, scan_time, count):
+        self.path = path
+        self.layer = layer
+        self.radar_latitude = radar_latitude
+        self.radar_longitude = radar_longitude
+        self.scan_time = scan_time
+        self.count = count
+
+        offset = AmaBinary.HEADER_SIZE
+        self.raw_latitude = AmaBinary._column(path, "<i4", offset, count)
+        offset += 4 * count
+        self.raw_longitude = AmaBinary._column(path, "<i4", offset, count)
+        offset += 4 * count
+        self.raw_dBZ = AmaBinary._column(path, "<i2", offset, count)
+
+    @property
+    def latitude(self):
+        """
+        ndarray: Las latitudes en grados.
+        """
+        return self.raw_latitude / AmaBinary.COORDINATE_SCALE
+
+    @property
+    def longitude(self):
+        """
+        ndarray: Las longitudes en grados.
+        """
+        return self.raw_longitude / AmaBinary.COORDINATE_SCALE
+
+    @property
+    def dBZ(self):
+        """
+        ndarray: Las reflectividades en dBZ.
+        """
+        return self.raw_dBZ / AmaBinary.DBZ_SCALE
+
+    def __len__(self):
+        return self.count
+
+
+class AmaBinary:
+    """
+    Formato binario columnar para los datos de correlación entre dBZ y coordenadas geográficas.
+
+    Formato del archivo a generar:
+    ==============================
+    Una cabecera de 64 bytes (little-endian):
+        4 bytes  => Identificador *AMAB*.
+        2 bytes  => Versión del formato.
+        2 bytes  => Capa de datos.
+        8 bytes  => Latitud del radar (float64).
+        8 bytes  => Longitud del radar (float64).
+        32 bytes => Fecha/hora de los datos (ASCII).
+        8 bytes  => Cantidad de puntos (N).
+
+    Seguida de tres columnas:
+        N x int32 => Latitud en punto fijo (1e-5 grados).
+        N x int32 => Longitud en punto fijo (1e-5 grados).
+        N x int16 => dBZ en punto fijo (0.1 dBZ).
+    """
+
+    def __init__(self):
+        pass
+
+    MAGIC = b"AMAB"
+    """
+    bytes: El identificador de los archivos binarios.
+    """
+    VERSION = 1
+    """
+    int: La versión del formato.
+    """
+    HEADER = struct.Struct("<4sHHdd32sQ")
+    """
+    Struct: La estructura de la cabecera.
+    """
+    HEADER_SIZE = HEADER.size
+    """
+    int: El tamaño de la cabecera en bytes.
+    """
+    COORDINATE_SCALE = 1e5
+    """
+    float: La escala del punto fijo para las coordenadas.
+    """
+    DBZ_SCALE = 10.
+    """
+    float: La escala del punto fijo para las reflectividades.
+    """
+    TEXT_FORMAT = "%.1f,%.5f:%.5f"
+    """
+    string: El formato de cada línea de los archivos de texto *.ama*.
+    """
+
+    @staticmethod
+    def write(path, dBZ, lat, lon, radar_latitude, radar_longitude, scan_time, layer):
+        """
+        Escribe un archivo binario.
+
+        :param path: El PATH del archivo a generar.
+        :param dBZ: Vector con las reflectividades.
+        :param lat: Vector con las latitudes.
+        :param lon: Vector con las longitudes.
+        :param radar_latitude: La latitud del radar.
+        :param radar_longitude: La longitud del radar.
+        :param scan_time: La fecha/hora de los datos.
+        :param layer: La capa de datos.
+
+        :return: void
+        """
+        lat = np.round(np.asarray(lat, dtype=np.float64) * AmaBinary.COORDINATE_SCALE).astype("<i4")
+        lon = np.round(np.asarray(lon, dtype=np.float64) * AmaBinary.COORDINATE_SCALE).astype("<i4")
+        dBZ = np.round(np.asarray(dBZ, dtype=np.float64) * AmaBinary.DBZ_SCALE).astype("<i2")
+
+        header = AmaBinary.HEADER.pack(
+            AmaBinary.MAGIC,
+            AmaBinary.VERSION,
+            int(layer),
+            float(radar_latitude),
+            float(radar_longitude),
+            "{0}".format(scan_time).encode("ascii")[:32],
+            len(dBZ))
+
+        with open(path, "wb") as f:
+            f.write(header)
+            lat.tofile(f)
+            lon.tofile(f)
+            dBZ.tofile(f)
+
+    @staticmethod
+    def read(path):
+        """
+        Abre un archivo binario en modo *memory-map*.
+
+        :param path: El PATH del archivo.
+
+        :return: Un *AmaBinaryData* con la cabecera y las columnas del archivo.
+        """
+        with open(path, "rb") as f:
+            header = f.read(AmaBinary.HEADER_SIZE)
+
+        if len(header) != AmaBinary.HEADER_SIZE:
+            raise ValueError("Archivo binario truncado: {0}".format(path))
+
+        magic, version, layer, radar_latitude, radar_longitude, scan_time, count = AmaBinary.HEADER.unpack(header)
+        if magic != AmaBinary.MAGIC:
+            raise ValueError("El archivo no es un binario de Ama: {0}".format(path))
+        if version != AmaBinary.VERSION:
+            raise ValueError("Versión de formato no soportada ({0}): {1}".format(version, path))
+
+        return AmaBinaryData(path, layer, radar_latitude, radar_longitude,
+                             scan_time.rstrip(b"\0").decode("ascii"), count)
+
+    @staticmethod
+    def text_to_binary(text_path, binary_path, radar_latitude, radar_longitude, scan_time, layer):
+        """
+        Convierte un archivo de texto *.ama* al formato binario.
+
+        :param text_path: El PATH del archivo de texto.
+        :param binary_path: El PATH del archivo binario a generar.
+        :param radar_latitude: La latitud del radar.
+        :param radar_longitude: La longitud del radar.
+        :param scan_time: La fecha/hora de los datos.
+        :param layer: La capa de datos.
+
+        :return: void
+        """
+        with open(text_path, "r") as f:
+            text = f.read()
+
+        #
+        # Cada línea tiene el formato *dBZ,latitude:longitude*, por lo tanto reemplazando
+        # los separadores se puede leer todo el archivo como un único vector de números.
+        #
+        values = np.fromstring(text.replace(":", ",").replace("\n", ","), dtype=np.float64, sep=",").reshape(-1, 3)
+
+        AmaBinary.write(binary_path, values[:, 0], values[:, 1], values[:, 2], radar_latitude, radar_longitude,
+                        scan_time, layer)
+
+    @staticmethod
+    def binary_to_text(binary_path, text_path):
+        """
+        Convierte un archivo binario al formato de texto *.ama*.
+
+        :param binary_path: El PATH del archivo binario.
+        :param text_path: El PATH del archivo de texto a generar.
+
+        :return: void
+        """
+        data = AmaBinary.read(binary_path)
+
+        with open(text_path, "w") as f:
+            np.savetxt(f, np.column_stack((data.dBZ, data.latitude, data.longitude)), fmt=AmaBinary.TEXT_FORMAT)
+
+    @staticmethod
+    def _column(path, dtype, offset, count):
+        if count == 0:
+            return np.zeros(0, dtype=dtype)
+
+        return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,))
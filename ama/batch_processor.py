@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+"""
+Clase perteneciente al módulo de procesamiento de datos e inferencias Ama.
+
+.. module:: batch_processor
+   :platform: Unix
+   :synopsis: Procesamiento en paralelo de directorios de datos de radar.
+
+.. moduleauthor:: Andreas P. Koenzen <akc@apkc.net>
+"""
+
+import ama.utils as utils
+import multiprocessing
+import time
+
+__author__ = "Andreas P. Koenzen"
+__copyright__ = "Copyright 2016, Proyecto de Tesis / Universidad Católica de Asunción."
+__credits__ = "Andreas P. Koenzen"
+__license__ = "BSD"
+__version__ = "0.1"
+__maintainer__ = "Andreas P. Koenzen"
+__email__ = "akc@apkc.net"
+__status__ = "Prototype"
+
+
+def run_job(job):
+    """
+    Procesa un único archivo dentro de un proceso del pool. Cualquier error queda aislado
+    en el resultado del archivo y no interrumpe al resto del lote.
+
+    Se define a nivel de módulo para que pueda ser serializada por *multiprocessing*.
+
+    :param job: Tupla con el nombre del método de *Processor*, el archivo y los demás argumentos.
+
+    :return: Tupla con el archivo, si fue procesado correctamente (*None* si el método lo obvió \
+        devolviendo False), el error y el tiempo en segundos.
+    """
+
+    import ama.processor as processor
+
+    method, item, arguments = job
+    start = time.time()
+    try:
+        if getattr(processor.Processor(), method)(item, *arguments) is False:
+            return item, None, "El archivo no cumple con los requisitos de procesamiento.", time.time() - start
+
+        return item, True, None, time.time() - start
+    except Exception as e:
+        return item, False, "{0}".format(e), time.time() - start
+
+
+class BatchProcessor:
+    """
+    Reparte los archivos de un directorio entre un pool de procesos y al final muestra un
+    resumen con la cantidad de archivos procesados, los errores y el rendimiento.
+    """
+
+    def __init__(self, workers=1):
+        self.workers = max(1, int(workers))
+
+    def run(self, method, matches, arguments=()):
+        """
+        Ejecuta un método de *Processor* por cada archivo.
+
+        Los archivos resultantes siempre se nombran a partir del archivo de origen, por lo tanto
+        la salida no depende del orden en que terminen los procesos.
+
+        :param method: El nombre del método de *Processor* a ejecutar. Recibe el archivo como \
+            primer argumento.
+        :param matches: La lista de archivos a procesar.
+        :param arguments: Los demás argumentos del método.
+
+        :return: Una lista de tuplas (archivo, correcto, error, segundos) ordenada por archivo. *correcto* \
+            es *None* para los archivos obviados.
+        """
+        jobs = [(method, item, tuple(arguments)) for item in matches]
+        results = []
+        start = time.time()
+
+        if self.workers == 1 or len(jobs) <= 1:
+            for job in jobs:
+                results.append(self._progress(run_job(job), len(results) + 1, len(jobs)))
+        else:
+            pool = multiprocessing.Pool(min(self.workers, len(jobs)))
+            try:
+                for result in pool.imap_unordered(run_job, jobs, chunksize=1):
+                    results.append(self._progress(result, len(results) + 1, len(jobs)))
+                pool.close()
+            except KeyboardInterrupt:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+
+        end = time.time()
+        results.sort(key=lambda result: result[0])
+        self.summary(results, end - start)
+
+        return results
+
+    def summary(self, results, elapsed):
+        """
+        Imprime el resumen de un lote.
+
+        :param results: Los resultados devueltos por *run*.
+        :param elapsed: El tiempo total del lote en segundos.
+
+        :return: void
+        """
+        failed = [result for result in results if result[1] is False]
+        skipped = [result for result in results if result[1] is None]
+
+        print(utils.Colors.BOLD + "---" + utils.Colors.ENDC)
+        print(utils.Colors.BOLD + "### Resumen del Lote ###" + utils.Colors.ENDC)
+        print(utils.Colors.BOLD + "Procesos: {0}".format(self.workers) + utils.Colors.ENDC)
+        print(utils.Colors.BOLD + "Archivos: {0}".format(len(results)) + utils.Colors.ENDC)
+        print(utils.Colors.BOLD + "Correctos: {0}".format(len(results) - len(failed) - len(skipped)) + utils.Colors.ENDC)
+        print(utils.Colors.BOLD + "Obviados: {0}".format(len(skipped)) + utils.Colors.ENDC)
+        print(utils.Colors.BOLD + "Con Errores: {0}".format(len(failed)) + utils.Colors.ENDC)
+        print(utils.Colors.BOLD + "Tiempo Total: {0:.1f} segundos".format(elapsed) + utils.Colors.ENDC)
+        if elapsed > 0:
+            print(utils.Colors.BOLD + "Rendimiento: {0:.2f} archivos/segundo".format(len(results) / elapsed) + utils.Colors.ENDC)
+
+        for item, ok, error, seconds in failed:
+            print(utils.Colors.FAIL + "ERROR: {0} => {1}".format(item, error) + utils.Colors.ENDC)
+
+    @staticmethod
+    def _progress(result, done, total):
+        item, ok, error, seconds = result
+        if ok:
+            print(utils.Colors.BOLD + "[{0}/{1}] {2} ({3:.1f} segundos)".format(done, total, item, seconds) + utils.Colors.ENDC)
+        elif ok is None:
+            print(utils.Colors.WARNING + "[{0}/{1}] OBVIADO: {2} => {3}".format(done, total, item, error) + utils.Colors.ENDC)
+        else:
+            print(utils.Colors.FAIL + "[{0}/{1}] ERROR: {2} => {3}".format(done, total, item, error) + utils.Colors.ENDC)
+
+        return result
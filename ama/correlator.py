@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+
+"""
+Clase perteneciente al módulo de procesamiento de datos e inferencias Ama.
+
+.. module:: correlator
+   :platform: Unix
+   :synopsis: Correlación vectorizada entre dBZ y coordenadas geográficas para un barrido completo.
+
+.. moduleauthor:: Andreas P. Koenzen <akc@apkc.net>
+"""
+
+import ama.georef_cache as georef_cache
+import ama.gridder as gridder
+import ama.utils as utils
+import numpy as np
+
+__author__ = "Andreas P. Koenzen"
+__copyright__ = "Copyright 2016, Proyecto de Tesis / Universidad Católica de Asunción."
+__credits__ = "Andreas P. Koenzen"
+__license__ = "BSD"
+__version__ = "0.1"
+__maintainer__ = "Andreas P. Koenzen"
+__email__ = "akc@apkc.net"
+__status__ = "Prototype"
+
+
+class Correlator:
+    """
+    Motor de correlación entre dBZ y coordenadas geográficas. Procesa todos los gates
+    de un barrido (SCAN) en una sola pasada utilizando operaciones sobre matrices.
+    """
+
+    def __init__(self):
+        pass
+
+    NO_DATA = -64.
+    """
+    float: Valor a partir del cual un gate se considera sin datos. Valores menores o iguales son obviados.
+    """
+    DBZ_DECIMALS = 1
+    """
+    int: La cantidad de decimales para los valores de reflectividad.
+    """
+    COORDINATE_DECIMALS = 5
+    """
+    int: La cantidad de decimales para las coordenadas geográficas.
+    """
+    DEDUPLICATION_POLICIES = ("max", "mean", "first")
+    """
+    tuple: Las formas de combinar las reflectividades de los gates con las mismas coordenadas.
+    """
+
+    @staticmethod
+    def correlate(values, azimuths, ranges, radar_latitude, radar_longitude, minimum, maximum, limit=None,
+                  elevation=None, cell_size=None, aggregation="max", filters=None, region=None, deduplication=None):
+        """
+        Correlaciona una matriz de reflectividades con sus coordenadas geográficas.
+
+        El orden de los datos devueltos es el mismo que el de recorrer la matriz fila por fila,
+        es decir, azimut por azimut y dentro de cada azimut por distancia.
+
+        :param values: Matriz de NxM con las reflectividades (N azimuts, M distancias).
+        :param azimuths: Vector de N elementos con los azimuts de cada fila.
+        :param ranges: Vector de M elementos con las distancias de cada columna.
+        :param radar_latitude: La latitud del radar.
+        :param radar_longitude: La longitud del radar.
+        :param minimum: El valor mínimo de reflectividad (inclusive).
+        :param maximum: El valor máximo de reflectividad (inclusive).
+        :param limit: La cantidad máxima de puntos a devolver. *None* para devolver todos.
+        :param elevation: El ángulo de elevación de la capa. Forma parte de la clave de la caché \
+            de georeferencias.
+        :param cell_size: El lado en metros de las celdas en las que agregar los gates. *None* para \
+            devolver cada gate.
+        :param aggregation: La función de agregación de las celdas, *max* o *mean*.
+        :param filters: Un *FilterPipeline* a aplicar sobre la matriz antes de georeferenciar.
+        :param region: Una *RegionOfInterest*. La matriz se recorta a los azimuts y distancias de \
+            la región antes de cualquier otro proceso.
+        :param deduplication: La forma de combinar los gates que quedan con las mismas coordenadas \
+            luego de redondearlas, una de *DEDUPLICATION_POLICIES*. *None* para no combinarlos.
+
+        :return: Tres vectores con las dBZ, latitudes y longitudes de los gates filtrados, o de las \
+            celdas con gates filtrados si se utiliza *cell_size*.
+        """
+        values = np.asarray(values)
+
+        if region is not None:
+            region_rows, region_columns = region.indices(azimuths, ranges, radar_latitude, radar_longitude)
+            if filters is not None:
+                filters = filters.crop(region_rows, region_columns, len(values))
+
+            values = values[np.ix_(region_rows, region_columns)]
+            azimuths = np.asarray(azimuths)[region_rows]
+            ranges = np.asarray(ranges)[region_columns]
+
+        #
+        # Primero se redondean y filtran las reflectividades, de esta forma solo se
+        # buscan las coordenadas de los gates que realmente se van a utilizar.
+        #
+        dBZ = np.round(values, Correlator.DBZ_DECIMALS)
+        mask = (values > Correlator.NO_DATA) & (dBZ >= minimum) & (dBZ <= maximum)
+        if filters is not None:
+            mask = filters.apply(values, azimuths, ranges, mask)
+
+        if region is not None and region.bbox is not None:
+            lat, lon = georef_cache.GeorefCache.lookup(azimuths, ranges, radar_latitude, radar_longitude, elevation)
+            mask &= region.contains(lat, lon)
+
+        rows, columns = np.nonzero(mask)
+        if limit is not None:
+            rows = rows[:limit]
+            columns = columns[:limit]
+
+        if cell_size:
+            cells, cell_latitudes, cell_longitudes = gridder.Gridder.cells(azimuths, ranges, radar_latitude,
+                                                                           radar_longitude, cell_size, elevation)
+            return gridder.Gridder.aggregate(dBZ[rows, columns], cells[rows, columns], cell_latitudes, cell_longitudes,
+                                             aggregation)
+
+        lat, lon = georef_cache.GeorefCache.lookup(azimuths, ranges, radar_latitude, radar_longitude, elevation)
+
+        dBZ = dBZ[rows, columns]
+        lat = np.round(lat[rows, columns], Correlator.COORDINATE_DECIMALS)
+        lon = np.round(lon[rows, columns], Correlator.COORDINATE_DECIMALS)
+
+        if deduplication:
+            dBZ, lat, lon, duplicates = Correlator.deduplicate(dBZ, lat, lon, deduplication)
+            if duplicates > 0:
+                print(utils.Colors.BOLD + "INFO: {0} gates con coordenadas duplicadas combinados ({1}).".format(
+                    duplicates, deduplication) + utils.Colors.ENDC)
+
+        return dBZ, lat, lon
+
+    @staticmethod
+    def deduplicate(dBZ, lat, lon, policy="max"):
+        """
+        Combina los puntos con las mismas coordenadas. Cerca del radar varios gates pueden caer
+        sobre la misma coordenada luego de redondearla a *COORDINATE_DECIMALS* decimales.
+
+        Las coordenadas se convierten a una clave entera en punto fijo y los duplicados se
+        agrupan con un único *np.unique* sobre las claves.
+
+        :param dBZ: Vector con las reflectividades.
+        :param lat: Vector con las latitudes.
+        :param lon: Vector con las longitudes.
+        :param policy: *max* para la mayor reflectividad, *mean* para el promedio o *first* para \
+            la del primer punto.
+
+        :return: Tres vectores con las dBZ, latitudes y longitudes sin duplicados, en el orden de \
+            la primera aparición de cada coordenada, y la cantidad de puntos combinados.
+        """
+        if policy not in Correlator.DEDUPLICATION_POLICIES:
+            raise ValueError("Forma de combinar duplicados no soportada: {0}".format(policy))
+
+        dBZ = np.asarray(dBZ, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        if len(dBZ) == 0:
+            return dBZ, lat, lon, 0
+
+        scale = 10 ** Correlator.COORDINATE_DECIMALS
+        keys = ((np.rint(lat * scale).astype(np.int64) + 90 * scale) << 32) | (np.rint(lon * scale).astype(np.int64) + 180 * scale)
+        unique, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        duplicates = len(keys) - len(unique)
+        if duplicates == 0:
+            return dBZ, lat, lon, 0
+
+        if policy == "first":
+            values = dBZ[first]
+        elif policy == "max":
+            order = np.argsort(inverse, kind="mergesort")
+            values = np.maximum.reduceat(dBZ[order], np.searchsorted(inverse[order], np.arange(len(unique))))
+        else:
+            values = np.round(np.bincount(inverse, weights=dBZ) / np.bincount(inverse), Correlator.DBZ_DECIMALS)
+
+        # mantener el orden de recorrido de la matriz.
+        order = np.argsort(first, kind="mergesort")
+
+        return values[order], lat[first[order]], lon[first[order]], duplicates
+
+    @staticmethod
+    def correlate_scan(data, metadata, layer, minimum, maximum, limit=None, cell_size=None, aggregation="max",
+                       filters=None, region=None, deduplication=None):
+        """
+        Correlaciona la capa de reflectividad (*Z*) de un archivo ya procesado.
+
+        :param data: Los datos devueltos por *Processor.process*.
+        :param metadata: Los metadatos devueltos por *Processor.process*.
+        :param layer: La capa de datos a procesar. Cada capa corresponde a un ángulo de elevación del radar.
+        :param minimum: El valor mínimo de reflectividad (inclusive).
+        :param maximum: El valor máximo de reflectividad (inclusive).
+        :param limit: La cantidad máxima de puntos a devolver. *None* para devolver todos.
+        :param cell_size: El lado en metros de las celdas en las que agregar los gates. *None* para \
+            devolver cada gate.
+        :param aggregation: La función de agregación de las celdas, *max* o *mean*.
+        :param filters: Un *FilterPipeline* a aplicar sobre la matriz antes de georeferenciar.
+        :param region: Una *RegionOfInterest* a la que recortar la matriz.
+        :param deduplication: La forma de combinar los gates con las mismas coordenadas. *None* para \
+            no combinarlos.
+
+        :return: Tres vectores con las dBZ, latitudes y longitudes de los gates filtrados.
+        """
+        layer_key = u"SCAN{0}".format(layer)
+
+        return Correlator.correlate(
+            data[layer_key][u"Z"]["data"],
+            metadata[layer_key]["az"],
+            metadata[layer_key]["r"],
+            float(metadata["VOL"]["Latitude"]),
+            float(metadata["VOL"]["Longitude"]),
+            minimum,
+            maximum,
+            limit,
+            metadata[layer_key].get("elevation"),
+            cell_size,
+            aggregation,
+            filters,
+            region,
+            deduplication)
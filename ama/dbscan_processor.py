@@ -10,17 +10,19 @@ Clase perteneciente al módulo de procesamiento de datos e inferencias Ama.
 .. moduleauthor:: Andreas P. Koenzen <akc@apkc.net>
 """
 
+import ama.correlator as correlator
+import ama.grid_dbscan as grid_dbscan
 import ama.utils as utils
 import ama.processor as processor
+import ama.sweep_buffer as sweep_buffer
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
 import time
-import wradlib as wrl
 
-from geopy.distance import great_circle
-from shapely.geometry import MultiPoint
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components, minimum_spanning_tree
 from sklearn.cluster import DBSCAN
+from sklearn.neighbors import NearestNeighbors
 
 __author__ = "Andreas P. Koenzen"
 __copyright__ = "Copyright 2016, Proyecto de Tesis / Universidad Católica de Asunción."
@@ -32,6 +34,116 @@ __email__ = "akc@apkc.net"
 __status__ = "Prototype"
 
 
+class ClusterSet:
+    """
+    Los clusters detectados por DBSCAN agrupados por etiqueta.
+
+    Los puntos que no son ruido se ordenan una sola vez por etiqueta, de forma que cada cluster es
+    un bloque contiguo de *points* y se puede obtener como una vista sin copiar datos. Los
+    resúmenes de todos los clusters se calculan a la vez al crear el objeto.
+    """
+
+    KMS_PER_DEGREE = 6371.0088 * np.pi / 180.
+    """
+    float: La cantidad de kilómetros en un grado de latitud.
+    """
+
+    def __init__(self, matrix, labels):
+        """
+        :param matrix: Una matriz de Nx3 con Latitud, Longitud y dBZ.
+        :param labels: Vector con la etiqueta de cada punto. Las etiquetas negativas son ruido.
+        """
+        matrix = np.asarray(matrix, dtype=np.float64).reshape(-1, 3)
+        labels = np.asarray(labels)
+
+        # el ordenamiento estable mantiene el orden original de los puntos dentro de cada cluster.
+        members = np.nonzero(labels >= 0)[0]
+        order = members[np.argsort(labels[members], kind="mergesort")]
+
+        self.points = matrix[order]
+        """
+        ndarray: Matriz de Mx3 con todos los puntos que no son ruido, agrupados por cluster.
+        """
+        self.ids, self.starts, self.sizes = np.unique(labels[order], return_index=True, return_counts=True)
+        """
+        ndarray: Las etiquetas de DBSCAN de cada cluster, el índice de su primer punto en *points* y su cantidad de puntos.
+        """
+
+        if len(self) == 0:
+            self.max_dBZ = self.mean_dBZ = self.area = np.zeros(0)
+            self.bbox = np.zeros((0, 4))
+            self.centroids = np.zeros((0, 2))
+            self.centermost = np.zeros((0, 3))
+            return
+
+        lat, lon, dBZ = self.points[:, 0], self.points[:, 1], self.points[:, 2]
+
+        self.max_dBZ = np.maximum.reduceat(dBZ, self.starts)
+        """
+        ndarray: La reflectividad máxima de cada cluster.
+        """
+        self.mean_dBZ = np.add.reduceat(dBZ, self.starts) / self.sizes
+        """
+        ndarray: La reflectividad promedio de cada cluster.
+        """
+        self.bbox = np.column_stack((
+            np.minimum.reduceat(lat, self.starts),
+            np.minimum.reduceat(lon, self.starts),
+            np.maximum.reduceat(lat, self.starts),
+            np.maximum.reduceat(lon, self.starts)))
+        """
+        ndarray: Matriz de Kx4 con el rectángulo de cada cluster. Latitud y Longitud mínimas, Latitud y Longitud máximas.
+        """
+        self.area = (
+            (self.bbox[:, 2] - self.bbox[:, 0]) * self.KMS_PER_DEGREE *
+            (self.bbox[:, 3] - self.bbox[:, 1]) * self.KMS_PER_DEGREE *
+            np.cos(np.radians((self.bbox[:, 0] + self.bbox[:, 2]) / 2.)))
+        """
+        ndarray: El área estimada de cada cluster en km², a partir de su rectángulo.
+        """
+
+        indices, self.centroids = DBSCANProcessor.centermost_indices(
+            self.points, np.repeat(np.arange(len(self)), self.sizes), len(self))
+        """
+        ndarray: Matriz de Kx2 con el promedio de Latitud y Longitud de cada cluster.
+        """
+        self.centermost = self.points[indices]
+        """
+        ndarray: Matriz de Kx3 con el punto de cada cluster más cercano a su centroide.
+        """
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, k):
+        return self.points[self.starts[k]:self.starts[k] + self.sizes[k]]
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self[k]
+
+    @property
+    def centermost_points(self):
+        """
+        list: Tuplas de Latitud, Longitud, dBZ con el punto más cercano al centroide de cada cluster.
+        """
+        return [tuple(point) for point in self.centermost]
+
+    def summary(self):
+        """
+        Texto con una línea de resumen por cluster.
+
+        :return: string
+        """
+        lines = []
+        for k in range(len(self)):
+            lines.append("{0}: Puntos={1} dBZ Máx.={2:.1f} dBZ Prom.={3:.1f} Área={4:.1f}km² Centro=({5:.5f}, {6:.5f})".format(
+                self.ids[k], self.sizes[k], self.max_dBZ[k], self.mean_dBZ[k], self.area[k], self.centermost[k, 0],
+                self.centermost[k, 1]))
+
+        return "\n".join(lines)
+
+
 class DBSCANProcessor:
     """
     Detección de clusters de tormenta utilizando el algoritmo DBSCAN.
@@ -59,73 +171,116 @@ class DBSCANProcessor:
     """
     int: La cantidad máxima de puntos a utilizar para las pruebas y verificaciones. 
     """
+    SWEEP_EPSILONS = [5., 7.5, 10., 12.5, 15.]
+    """
+    list: Las distancias en kilómetros a evaluar en el barrido de parámetros.
+    """
+    SWEEP_MIN_SAMPLES = [100, 200, 300, 400, 500]
+    """
+    list: Las cantidades mínimas de puntos a evaluar en el barrido de parámetros.
+    """
+    CLUSTERING_ENGINE = "ball_tree"
+    """
+    string: El motor de agrupamiento. *ball_tree* para el DBSCAN de sklearn con métrica haversine o *grid* \
+        para el DBSCAN indexado por grilla sobre un plano centrado en el radar.
+    """
 
-    def get_centermost_point(self, clusters):
+    @staticmethod
+    def centermost_indices(points, labels, num_clusters):
         """
-        Función que detecta el centroide para cada cluster de tormenta.
+        Calcula los centroides de todos los clusters a la vez y el índice del punto más cercano a
+        cada uno.
 
-        :param clusters: Un vector con los clusters detectados por DBSCAN.
+        :param points: Una matriz de Nx2 o más columnas con Latitud, Longitud en las dos primeras.
+        :param labels: Vector con la etiqueta de cada punto, entre 0 y *num_clusters* - 1.
+        :param num_clusters: La cantidad de clusters.
 
-        :return: Un vector con tuplas de Latitud, Longitud correspondientes a cada centroide.
+        :return: Tupla con un vector de *num_clusters* índices sobre *points* y una matriz de \
+            *num_clusters*x2 con los promedios de Latitud, Longitud.
         """
-        result = []
+        sizes = np.bincount(labels, minlength=num_clusters).astype(np.float64)
+        centroids = np.column_stack((
+            np.bincount(labels, weights=points[:, 0], minlength=num_clusters) / sizes,
+            np.bincount(labels, weights=points[:, 1], minlength=num_clusters) / sizes))
+
+        distances = DBSCANProcessor.haversine(points[:, 0], points[:, 1], centroids[labels, 0], centroids[labels, 1])
+
+        #
+        # Ordenar por cluster y luego por distancia; el primer punto de cada cluster es el más
+        # cercano. Ante empates gana el primero, igual que *min()*.
+        #
+        order = np.lexsort((np.arange(len(points)), distances, labels))
+        first = np.searchsorted(labels[order], np.arange(num_clusters))
 
-        for cluster in clusters:
-            if len(cluster):
-                centroid = (MultiPoint(cluster).centroid.x, MultiPoint(cluster).centroid.y)
-                centermost_point = min(cluster, key=lambda point: great_circle(point, centroid).m)
+        return order[first], centroids
 
-                result.append(tuple(centermost_point))
+    @staticmethod
+    def haversine(lat1, lon1, lat2, lon2):
+        """
+        Distancia sobre la esfera entre pares de coordenadas.
 
-        return result
+        :param lat1: Vector con las latitudes de origen.
+        :param lon1: Vector con las longitudes de origen.
+        :param lat2: Vector con las latitudes de destino.
+        :param lon2: Vector con las longitudes de destino.
 
-    def detect_dbz_clusters(self, filename, layer, test=False):
+        :return: Vector con las distancias en kilómetros.
         """
-        Función que detecta los clusters de tormenta.
+        lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+        a = np.sin((lat2 - lat1) / 2.) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.) ** 2
+
+        return 2. * DBSCANProcessor.KMS_PER_RADIAN * np.arcsin(np.sqrt(np.clip(a, 0., 1.)))
+
+    def load_points(self, filename, layer, test=False, descriptor=None):
+        """
+        Función que lee un archivo y genera la matriz de puntos a agrupar.
 
         :param filename: El archivo con datos de Radar a procesar.
         :param layer: La capa de datos a procesar. Cada capa corresponde a un ángulo de elevación del radar.
         :param test: Habilitar modo verificación de datos. En modo verificación se utilizan pocos datos \
             para poder verificar cada uno de los datos.
+        :param descriptor: El descriptor del archivo devuelto por *Utils.should_process_file*.
 
-        :return: matrix = Una matriz de Nx3 con los valores originales. \
-            no_noise = Un vector de vectores con todos los puntos detectados como no-ruido. \
-            centermost_points = Un vector de tuplas con las coordenadas de los centroides detectados. \
+        :return: matrix = Una matriz de Nx3 con Latitud, Longitud y dBZ. \
             time = Fecha/hora de los datos. \
             radar = Tupla con las coordenadas del radar.
         """
-        data, metadata = processor.Processor.process(filename)
-        lat_vector = []
-        lon_vector = []
-        dBZ_vector = []
-        layer_key = u"SCAN{0}".format(layer)
+        data, metadata = processor.Processor.process(filename, layer=layer, descriptor=descriptor)
 
-        radar_latitude = float(metadata["VOL"]["Latitude"])
-        radar_longitude = float(metadata["VOL"]["Longitude"])
+        return self.scan_points(data, metadata, layer, test)
 
-        for (row, column), value in np.ndenumerate(data[layer_key][u"Z"]["data"]):
-            if value > -64.:
-                rng = metadata[layer_key]["r"][column]
-                azi = metadata[layer_key]["az"][row]
-                dBZ = value
-                lon, lat = wrl.georef.polar2lonlat(rng, azi, (radar_longitude, radar_latitude))
+    def scan_points(self, data, metadata, layer, test=False):
+        """
+        Función que genera la matriz de puntos a agrupar de un barrido ya decodificado.
 
-                # realizar los redondeos
-                dBZ_value = float("{0:.1f}".format(dBZ))
-                latitude_value = float("{0:.5f}".format(lat))
-                longitude_value = float("{0:.5f}".format(lon))
+        :param data: Los datos devueltos por *Processor.process* o *SweepBuffer.scan*.
+        :param metadata: Los metadatos devueltos por *Processor.process* o *SweepBuffer.scan*.
+        :param layer: La capa de datos a procesar. Cada capa corresponde a un ángulo de elevación del radar.
+        :param test: Habilitar modo verificación de datos.
 
-                # filtrar los datos.
-                if dBZ_value >= processor.Processor.MINIMUM_REFLECTIVITY and dBZ_value <= processor.Processor.MAXIMUM_REFLECTIVITY:
-                    lat_vector.append(latitude_value)
-                    lon_vector.append(longitude_value)
-                    dBZ_vector.append(dBZ_value)
+        :return: Igual que *load_points*.
+        """
+        layer_key = u"SCAN{0}".format(layer)
 
-                    if test == 1:
-                        if len(lat_vector) > self.TESTING_POINTS:
-                            break
+        radar_latitude = float(metadata["VOL"]["Latitude"])
+        radar_longitude = float(metadata["VOL"]["Longitude"])
+
+        #
+        # En modo verificación solo se utilizan los primeros puntos.
+        #
+        dBZ_vector, lat_vector, lon_vector = correlator.Correlator.correlate_scan(
+            data,
+            metadata,
+            layer,
+            processor.Processor.MINIMUM_REFLECTIVITY,
+            processor.Processor.MAXIMUM_REFLECTIVITY,
+            (self.TESTING_POINTS + 1) if test == 1 else None,
+            processor.Processor.GRID_CELL_SIZE,
+            processor.Processor.GRID_AGGREGATION,
+            processor.Processor.filter_pipeline(layer),
+            processor.Processor.region(),
+            processor.Processor.DEDUPLICATION)
 
-        ###### DBSCAN ######
         #
         # Convertir los vectores de latitud, longitud y dBZ a una matriz de Nx3.
         #
@@ -140,61 +295,194 @@ class DBSCANProcessor:
         print(utils.Colors.BOLD + "{0}".format(np.matrix(matrix)) + utils.Colors.ENDC)
         print("")
 
+        return matrix, metadata[layer_key]["Time"], (radar_latitude, radar_longitude)
+
+    def detect_dbz_clusters(self, filename, layer, test=False, descriptor=None, data=None, metadata=None):
+        """
+        Función que detecta los clusters de tormenta.
+
+        :param filename: El archivo con datos de Radar a procesar.
+        :param layer: La capa de datos a procesar. Cada capa corresponde a un ángulo de elevación del radar.
+        :param test: Habilitar modo verificación de datos. En modo verificación se utilizan pocos datos \
+            para poder verificar cada uno de los datos.
+        :param descriptor: El descriptor del archivo devuelto por *Utils.should_process_file*.
+        :param data: Los datos ya decodificados por *Processor.process*. *None* para leer el archivo.
+        :param metadata: Los metadatos ya decodificados por *Processor.process*.
+
+        :return: matrix = Una matriz de Nx3 con los valores originales. \
+            clusters = Un *ClusterSet* con los puntos detectados como no-ruido, sus centroides y resúmenes. \
+            time = Fecha/hora de los datos. \
+            radar = Tupla con las coordenadas del radar.
+        """
+        if data is None:
+            matrix, scan_time, radar = self.load_points(filename, layer, test, descriptor)
+        else:
+            matrix, scan_time, radar = self.scan_points(data, metadata, layer, test)
+
+        return self.cluster_points(matrix, scan_time, radar)
+
+    def replay(self, layer, seconds=None, test=False):
+        """
+        Función que vuelve a detectar los clusters de tormenta de los barridos guardados en el buffer
+        de una capa, con los parámetros actuales y sin leer archivos.
+
+        :param layer: La capa de datos a procesar. Cada capa corresponde a un ángulo de elevación del radar.
+        :param seconds: La duración de la ventana en segundos que termina en el barrido más reciente. \
+            *None* para todos los barridos del buffer.
+        :param test: Habilitar modo verificación de datos.
+
+        :return: Una lista con el resultado de *cluster_points* de cada barrido, del más antiguo al más reciente.
+        """
+        results = []
+        for data, metadata in sweep_buffer.SweepBuffer.default(layer).replay(seconds):
+            matrix, scan_time, radar = self.scan_points(data, metadata, layer, test)
+            results.append(self.cluster_points(matrix, scan_time, radar))
+
+        return results
+
+    def cluster_points(self, matrix, scan_time, radar):
+        """
+        Función que agrupa una matriz de puntos con DBSCAN.
+
+        :param matrix: La matriz de Nx3 con Latitud, Longitud y dBZ devuelta por *load_points*.
+        :param scan_time: Fecha/hora de los datos.
+        :param radar: Tupla con las coordenadas del radar.
+
+        :return: Igual que *detect_dbz_clusters*.
+        """
+        radar_latitude, radar_longitude = radar
+        lat_vector, lon_vector = matrix[:, 0], matrix[:, 1]
+
+        ###### DBSCAN ######
         #
         # Ejecutar el algoritmo DBSCAN sobre la matriz recién generada, pero los valores
         # deben ser convertidos a radianes para poder aplicar la función haversine sobre cada
         # punto.
         #
         start_time = time.time()
-        db = DBSCAN(eps=self.EPSILON, min_samples=self.MIN_SAMPLES, algorithm='ball_tree', metric='haversine').fit(
-            np.radians(np.column_stack((lat_vector, lon_vector))))
+        if self.CLUSTERING_ENGINE == "grid":
+            db = grid_dbscan.GridDBSCAN(self.EPSILON * self.KMS_PER_RADIAN, self.MIN_SAMPLES).fit(
+                lat_vector, lon_vector, (radar_latitude, radar_longitude))
+        else:
+            db = DBSCAN(eps=self.EPSILON, min_samples=self.MIN_SAMPLES, algorithm='ball_tree', metric='haversine').fit(
+                np.radians(np.column_stack((lat_vector, lon_vector))))
         cluster_labels = db.labels_
-        num_clusters = len(set(cluster_labels))
+        clusters = ClusterSet(matrix, cluster_labels)
         end_time = time.time()
         print("")
-        print(utils.Colors.BOLD + "### DBSCAN sobre matriz Latitud-Longitud ###" + utils.Colors.ENDC)
+        print(utils.Colors.BOLD + "### DBSCAN sobre matriz Latitud-Longitud ({0}) ###".format(self.CLUSTERING_ENGINE) + utils.Colors.ENDC)
         print(utils.Colors.BOLD + "Nro. Puntos: {0}".format(len(matrix)) + utils.Colors.ENDC)
-        print(utils.Colors.BOLD + "Nro. Clusteres: {0}".format(num_clusters) + utils.Colors.ENDC)
-        print(utils.Colors.BOLD + "Compresión: {0}".format(100 * (1 - float(num_clusters) / len(matrix))) + utils.Colors.ENDC)
+        print(utils.Colors.BOLD + "Nro. Clusteres: {0}".format(len(clusters)) + utils.Colors.ENDC)
+        print(utils.Colors.BOLD + "Nro. Puntos Ruido: {0}".format(len(matrix) - len(clusters.points)) + utils.Colors.ENDC)
+        if len(matrix) > 0:
+            print(utils.Colors.BOLD + "Compresión: {0}".format(100 * (1 - float(len(clusters)) / len(matrix))) + utils.Colors.ENDC)
         print(utils.Colors.BOLD + "Tiempo: {0} segundos".format(end_time - start_time) + utils.Colors.ENDC)
         print(utils.Colors.BOLD + "Tamaño: {0}".format(cluster_labels.shape) + utils.Colors.ENDC)
         print(utils.Colors.BOLD + "{0}".format(np.array(cluster_labels)) + utils.Colors.ENDC)
         print("")
 
-        clusters = pd.Series([matrix[cluster_labels == n] for n in range(num_clusters)])
         print("")
         print(utils.Colors.BOLD + "### Lista de Clusteres ###" + utils.Colors.ENDC)
-        print(utils.Colors.BOLD + "Tamaño: {0}".format(clusters.shape) + utils.Colors.ENDC)
-        print(utils.Colors.BOLD + "{0}".format(clusters.to_string()) + utils.Colors.ENDC)
-        print("###")
-        print(utils.Colors.BOLD + "Clusteres:" + utils.Colors.ENDC)
-        for cluster in clusters:
-            print(utils.Colors.BOLD + "Tamaño: {0}".format(cluster.shape) + utils.Colors.ENDC)
-            print(utils.Colors.BOLD + "{0}".format(cluster) + utils.Colors.ENDC)
+        print(utils.Colors.BOLD + "Tamaño: {0}".format(len(clusters)) + utils.Colors.ENDC)
+        print(utils.Colors.BOLD + "{0}".format(clusters.summary()) + utils.Colors.ENDC)
         print("")
 
+        return matrix, clusters, scan_time, (radar_latitude, radar_longitude)
+
+    def sweep(self, filename, layer, epsilons=None, min_samples=None, test=False):
+        """
+        Función que evalúa DBSCAN con varias combinaciones de parámetros sobre un mismo archivo.
+
+        El archivo se lee y georreferencia una sola vez y el grafo de vecinos se calcula una sola
+        vez con el radio más grande. Para cada *eps* se filtra ese grafo y se calcula un bosque
+        generador de los puntos núcleo, y cada *min_samples* cuenta clusters y ruido sobre ese
+        bosque, sin volver a buscar vecinos.
+
+        :param filename: El archivo con datos de Radar a procesar.
+        :param layer: La capa de datos a procesar. Cada capa corresponde a un ángulo de elevación del radar.
+        :param epsilons: Lista de distancias en kilómetros. Por defecto *SWEEP_EPSILONS*.
+        :param min_samples: Lista de cantidades mínimas de puntos. Por defecto *SWEEP_MIN_SAMPLES*.
+        :param test: Habilitar modo verificación de datos.
+
+        :return: Una lista de tuplas (eps, min_samples, clusters, ruido, segundos), con el ruido \
+            como proporción de los puntos y los segundos incluyendo la parte proporcional del filtrado por *eps*.
+        """
+        epsilons = sorted(epsilons or self.SWEEP_EPSILONS)
+        min_samples = sorted(min_samples or self.SWEEP_MIN_SAMPLES)
+
+        matrix, scan_time, radar_coordinates = self.load_points(filename, layer, test)
+        if len(matrix) == 0:
+            print(utils.Colors.BOLD + "No hay puntos para agrupar." + utils.Colors.ENDC)
+            return []
+
         #
-        # Vector de tuplas con todos los centroides.
-        #
-        # Ejemplo:
-        #   [(-25.29036,-57.52304),...]
+        # Grafo disperso con la distancia haversine (en radianes) entre cada par de puntos a
+        # distancia menor o igual al radio más grande.
         #
-        centermost_points = self.get_centermost_point(clusters)
+        start_time = time.time()
+        points = np.radians(matrix[:, :2])
+        graph = NearestNeighbors(radius=epsilons[-1] / self.KMS_PER_RADIAN, algorithm='ball_tree',
+                                 metric='haversine').fit(points).radius_neighbors_graph(points, mode='distance')
+        graph_time = time.time() - start_time
+
+        # pares (punto, vecino) sin incluir al propio punto.
+        rows = np.repeat(np.arange(len(matrix)), np.diff(graph.indptr))
+        distinct = rows != graph.indices
+        rows, columns, distances = rows[distinct], graph.indices[distinct], graph.data[distinct]
+
+        results = []
+        for eps in epsilons:
+            #
+            # Una arista une dos puntos núcleo si ambos tienen al menos *min_samples* vecinos, es
+            # decir si el menor de sus conteos de vecinos es al menos *min_samples*. Con ese menor
+            # conteo como peso, el bosque generador máximo conserva la conectividad de los núcleos
+            # para cualquier *min_samples*, y cada combinación solo recorre sus N - 1 aristas.
+            #
+            start_time = time.time()
+            within = distances <= eps / self.KMS_PER_RADIAN
+            eps_rows, eps_columns = rows[within], columns[within]
+            neighbors = np.bincount(eps_rows, minlength=len(matrix)) + 1
+
+            upper = eps_rows < eps_columns  # el grafo es simétrico, basta con una dirección.
+            weights = np.minimum(neighbors[eps_rows[upper]], neighbors[eps_columns[upper]])
+            forest = minimum_spanning_tree(csr_matrix(
+                (neighbors.max() + 1 - weights, (eps_rows[upper], eps_columns[upper])),
+                shape=(len(matrix), len(matrix)))).tocoo()
+            forest_weights = neighbors.max() + 1 - forest.data
+
+            #
+            # Un punto no núcleo es borde si alguno de sus vecinos es núcleo, por lo tanto basta con
+            # el mayor conteo entre sus vecinos. Las filas del grafo están ordenadas por punto.
+            #
+            counts = neighbors - 1
+            present = counts > 0
+            reach = np.zeros(len(matrix), dtype=neighbors.dtype)
+            if np.any(present):
+                reach[present] = np.maximum.reduceat(neighbors[eps_columns], (np.cumsum(counts) - counts)[present])
+            eps_time = time.time() - start_time
+
+            for samples in min_samples:
+                start_time = time.time()
+                core = neighbors >= samples
+                linked = forest_weights >= samples
+                adjacency = csr_matrix((np.ones(np.count_nonzero(linked)), (forest.row[linked], forest.col[linked])),
+                                       shape=(len(matrix), len(matrix)))
+                clusters = len(np.unique(connected_components(adjacency, directed=False)[1][core]))
+                noise = float(np.count_nonzero(~core & (reach < samples))) / len(matrix)
+
+                results.append((eps, samples, clusters, noise, eps_time / len(min_samples) + time.time() - start_time))
+
         print("")
-        print(utils.Colors.BOLD + "### Centroides ###" + utils.Colors.ENDC)
-        print(utils.Colors.BOLD + "Tamaño: {0}".format(len(centermost_points)) + utils.Colors.ENDC)
-        print(utils.Colors.BOLD + "{0}".format(centermost_points) + utils.Colors.ENDC)
+        print(utils.Colors.BOLD + "### Barrido de Parámetros DBSCAN ###" + utils.Colors.ENDC)
+        print(utils.Colors.BOLD + "Nro. Puntos: {0}".format(len(matrix)) + utils.Colors.ENDC)
+        print(utils.Colors.BOLD + "Nro. Vecinos: {0}".format(graph.nnz) + utils.Colors.ENDC)
+        print(utils.Colors.BOLD + "Tiempo Grafo: {0:.2f} segundos".format(graph_time) + utils.Colors.ENDC)
+        print(utils.Colors.BOLD + "{0:>8} {1:>8} {2:>10} {3:>8} {4:>10}".format("Eps(km)", "Densidad", "Clusteres", "Ruido", "Tiempo(s)") + utils.Colors.ENDC)
+        for eps, samples, clusters, noise, elapsed in results:
+            print(utils.Colors.BOLD + "{0:>8.1f} {1:>8d} {2:>10d} {3:>7.1f}% {4:>10.2f}".format(eps, samples, clusters, 100 * noise, elapsed) + utils.Colors.ENDC)
         print("")
 
-        #
-        # Juntar todos los puntos detectados como no-ruido.
-        #
-        no_noise = []
-        for cluster in clusters:
-            for row in cluster:
-                no_noise.append(row)
-
-        return matrix, no_noise, centermost_points, metadata[layer_key]["Time"], (radar_latitude, radar_longitude)
+        return results
 
     def plot_all_points(self, filename, layer, test=False):
         """
@@ -210,11 +498,11 @@ class DBSCANProcessor:
         #
         # Datos que retorna el proceso de detección de clusters.
         #
-        original, clustered, centroids, time, radar_coordinates = self.detect_dbz_clusters(filename, layer, test)
-        if len(clustered) > 0:
-            original_lats, original_lons, original_dBZ = zip(*original)
-            clustered_lats, clustered_lons, clustered_dBZ = zip(*clustered)
-            centroid_lats, centroid_lons, centroid_dBZ = zip(*centroids)
+        original, clusters, time, radar_coordinates = self.detect_dbz_clusters(filename, layer, test)
+        if len(clusters) > 0:
+            original_lats, original_lons, original_dBZ = original[:, 0], original[:, 1], original[:, 2]
+            clustered_lats, clustered_lons = clusters.points[:, 0], clusters.points[:, 1]
+            centroid_lats, centroid_lons = clusters.centermost[:, 0], clusters.centermost[:, 1]
 
             ###### PLOTEAR ######
             #
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+
+"""
+Clase perteneciente al módulo de procesamiento de datos e inferencias Ama.
+
+.. module:: delta
+   :platform: Unix
+   :synopsis: Codificación de los puntos enviados al Controlador como diferencias con el barrido anterior.
+
+.. moduleauthor:: Andreas P. Koenzen <akc@apkc.net>
+"""
+
+import ama.utils as utils
+import gzip
+import io
+import json
+import numpy as np
+import os
+import threading
+
+__author__ = "Andreas P. Koenzen"
+__copyright__ = "Copyright 2016, Proyecto de Tesis / Universidad Católica de Asunción."
+__credits__ = "Andreas P. Koenzen"
+__license__ = "BSD"
+__version__ = "0.1"
+__maintainer__ = "Andreas P. Koenzen"
+__email__ = "akc@apkc.net"
+__status__ = "Prototype"
+
+
+class DeltaEncoder:
+    """
+    Codifica los puntos agrupados de cada barrido de una capa como diferencias con los del
+    último barrido enviado: puntos agregados, eliminados y con otra reflectividad.
+
+    Los puntos enviados se guardan como un índice ordenado de claves en punto fijo, con la
+    misma resolución con la que se escriben en el JSON, por lo tanto comparar dos barridos
+    es una búsqueda binaria vectorizada. Cada *KEYFRAME_INTERVAL* barridos se envían todos los
+    puntos (cuadro completo), y cada envío lleva un número de secuencia para que el receptor
+    detecte los envíos perdidos y espere al siguiente cuadro completo.
+
+    El índice y la secuencia se guardan en *DIRECTORY*, de esta forma la secuencia continúa
+    luego de un reinicio del proceso.
+    """
+
+    ###### OPCIONES DE DIFERENCIAS ######
+    DIRECTORY = "delta"
+    """
+    string: El directorio, relativo a la variable de entorno AMA_EXPORT_DATA, donde se guarda el estado.
+    """
+    KEYFRAME_INTERVAL = 10
+    """
+    int: La cantidad de envíos entre dos cuadros completos, ej. una hora con un barrido cada 6 minutos.
+    """
+    COORDINATE_SCALE = 100000
+    """
+    int: La escala de las coordenadas en punto fijo. 1e-5 grados, la resolución de *arrayDatos*.
+    """
+    DBZ_SCALE = 10
+    """
+    int: La escala de las reflectividades en punto fijo. 0.1 dBZ, la resolución de *arrayDatos*.
+    """
+
+    _entries = {}
+    _lock = threading.Lock()
+
+    def __init__(self, layer):
+        self.layer = layer
+        self.directory = os.path.join(os.environ["AMA_EXPORT_DATA"], self.DIRECTORY)
+        self.path = os.path.join(self.directory, "layer_{0}.json".format(layer))
+        self.lock = threading.Lock()
+
+        self.state = {"sequence": 0, "keyframe": None}
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.values = np.zeros(0, dtype=np.int64)
+        if os.path.exists(self.path) and os.path.exists(self._index_path()):
+            try:
+                with open(self.path, "r") as f:
+                    self.state = json.load(f)
+                index = np.load(self._index_path())
+                self.keys, self.values = index[0], index[1]
+            except ValueError:
+                print(utils.Colors.WARNING + "WARN: Estado de diferencias inválido en {0}, reiniciando...".format(
+                    self.path) + utils.Colors.ENDC)
+                self.state = {"sequence": 0, "keyframe": None}
+
+    @staticmethod
+    def default(layer):
+        """
+        Devuelve el codificador de una capa compartido por todo el proceso, leyéndolo la primera vez.
+
+        :param layer: La capa de datos.
+
+        :return: Un *DeltaEncoder*.
+        """
+        with DeltaEncoder._lock:
+            if layer not in DeltaEncoder._entries:
+                DeltaEncoder._entries[layer] = DeltaEncoder(layer)
+
+            return DeltaEncoder._entries[layer]
+
+    @staticmethod
+    def fixed_point(points):
+        """
+        Convierte una matriz de puntos a claves y valores en punto fijo. La clave de cada punto
+        combina su latitud y longitud en un único entero de 64 bits.
+
+        :param points: Matriz de Nx3 con Latitud, Longitud y dBZ.
+
+        :return: Dos vectores de enteros, las claves y las reflectividades.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        latitudes = np.rint(points[:, 0] * DeltaEncoder.COORDINATE_SCALE).astype(np.int64) + 90 * DeltaEncoder.COORDINATE_SCALE
+        longitudes = np.rint(points[:, 1] * DeltaEncoder.COORDINATE_SCALE).astype(np.int64) + 180 * DeltaEncoder.COORDINATE_SCALE
+
+        return (latitudes << 32) | longitudes, np.rint(points[:, 2] * DeltaEncoder.DBZ_SCALE).astype(np.int64)
+
+    @staticmethod
+    def from_fixed_point(keys, values=None):
+        """
+        Convierte claves y valores en punto fijo a una matriz de puntos.
+
+        :param keys: Vector con las claves devueltas por *fixed_point*.
+        :param values: Vector con las reflectividades. *None* para devolver solo las coordenadas.
+
+        :return: Matriz de Nx3 con Latitud, Longitud y dBZ, o de Nx2 sin *values*.
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        latitudes = ((keys >> 32) - 90 * DeltaEncoder.COORDINATE_SCALE) / float(DeltaEncoder.COORDINATE_SCALE)
+        longitudes = ((keys & 0xFFFFFFFF) - 180 * DeltaEncoder.COORDINATE_SCALE) / float(DeltaEncoder.COORDINATE_SCALE)
+        if values is None:
+            return np.column_stack((latitudes, longitudes))
+
+        return np.column_stack((latitudes, longitudes, np.asarray(values, dtype=np.float64) / DeltaEncoder.DBZ_SCALE))
+
+    def encode(self, points):
+        """
+        Codifica los puntos de un barrido nuevo y los guarda como los últimos enviados.
+
+        :param points: Matriz de Nx3 con Latitud, Longitud y dBZ. Los puntos con las mismas \
+            coordenadas en punto fijo se toman una sola vez, con la mayor reflectividad.
+
+        :return: Un diccionario con el número de secuencia (*secuencia*), el tipo (*tipo*, \
+            *completo* o *delta*) y los puntos como matrices: todos en *puntos* para un cuadro \
+            completo, o *agregados*, *modificados* (Nx3) y *eliminados* (Nx2) para un delta.
+        """
+        keys, values = DeltaEncoder.fixed_point(points)
+        order = np.lexsort((values, keys))
+        keys, values = keys[order], values[order]
+        last = np.ones(len(keys), dtype=bool)
+        last[:-1] = keys[1:] != keys[:-1]
+        keys, values = keys[last], values[last]
+
+        with self.lock:
+            sequence = self.state["sequence"] + 1
+            keyframe = self.state["keyframe"]
+            if keyframe is None or sequence - keyframe >= self.KEYFRAME_INTERVAL:
+                frame = {"secuencia": sequence, "tipo": "completo", "puntos": DeltaEncoder.from_fixed_point(keys, values)}
+                self.state["keyframe"] = sequence
+            else:
+                # buscar cada punto nuevo entre los enviados y cada enviado entre los nuevos.
+                found, position = DeltaEncoder._search(self.keys, keys)
+                changed = found & (self.values[position] != values) if len(self.keys) > 0 else found
+                kept = DeltaEncoder._search(keys, self.keys)[0]
+
+                frame = {
+                    "secuencia": sequence,
+                    "tipo": "delta",
+                    "agregados": DeltaEncoder.from_fixed_point(keys[~found], values[~found]),
+                    "modificados": DeltaEncoder.from_fixed_point(keys[changed], values[changed]),
+                    "eliminados": DeltaEncoder.from_fixed_point(self.keys[~kept])
+                }
+
+            self.keys, self.values = keys, values
+            self.state["sequence"] = sequence
+            self._write_state()
+
+        return frame
+
+    def reset(self):
+        """
+        Fuerza un cuadro completo en el próximo envío, ej. porque el anterior no llegó al Controlador.
+
+        :return: void
+        """
+        with self.lock:
+            self.state["keyframe"] = None
+            self._write_state()
+
+    @staticmethod
+    def _search(index, keys):
+        if len(index) == 0:
+            return np.zeros(len(keys), dtype=bool), np.zeros(len(keys), dtype=np.int64)
+
+        position = np.searchsorted(index, keys).clip(0, len(index) - 1)
+
+        return index[position] == keys, position
+
+    def _index_path(self):
+        return os.path.join(self.directory, "layer_{0}.npy".format(self.layer))
+
+    def _write_state(self):
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+        path = self._index_path()
+        temporary = "{0}.{1}.tmp".format(path, os.getpid())
+        with open(temporary, "wb") as f:
+            np.save(f, np.vstack((self.keys, self.values)))
+        os.rename(temporary, path)
+
+        temporary = "{0}.{1}.tmp".format(self.path, os.getpid())
+        with open(temporary, "w") as f:
+            json.dump(self.state, f)
+        os.rename(temporary, self.path)
+
+
+class DeltaDecoder:
+    """
+    Reconstruye los puntos de una capa a partir de los JSON de cuadros completos y deltas, del
+    mismo modo que debe hacerlo el Controlador. Sirve para verificar los envíos.
+
+    Un delta solo se aplica si su secuencia sigue a la del último JSON aplicado. Ante un envío
+    perdido los deltas se descartan hasta el siguiente cuadro completo, y los JSON anteriores al
+    último aplicado (ej. reenviados desde el spool) se ignoran.
+    """
+
+    def __init__(self):
+        self.sequence = None
+        self.synchronized = False
+        self.state = {}
+
+    def apply(self, payload):
+        """
+        Aplica un JSON.
+
+        :param payload: El JSON como bytes, opcionalmente comprimido con gzip, o ya decodificado.
+
+        :return: True si el JSON fue aplicado, False si fue descartado.
+        """
+        if isinstance(payload, bytes):
+            if payload[:2] == b"\x1f\x8b":
+                payload = gzip.GzipFile(fileobj=io.BytesIO(payload), mode="rb").read()
+            payload = json.loads(payload.decode("utf-8"))
+
+        sequence = payload["secuencia"]
+        if self.sequence is not None and sequence <= self.sequence:
+            return False
+
+        if payload["tipo"] == "completo":
+            keys, values = DeltaEncoder.fixed_point(DeltaDecoder._points(payload["arrayDatos"]))
+            self.state = dict(zip(keys.tolist(), values.tolist()))
+            self.synchronized = True
+        elif not self.synchronized or sequence != self.sequence + 1:
+            print(utils.Colors.WARNING + "WARN: Envío {0} perdido, esperando un cuadro completo...".format(
+                self.sequence + 1 if self.sequence is not None else 1) + utils.Colors.ENDC)
+            self.synchronized = False
+            return False
+        else:
+            removed = [[float(k) for k in text.split(":")] + [0.] for text in payload["eliminados"]]
+            for key in DeltaEncoder.fixed_point(removed)[0].tolist():
+                self.state.pop(key, None)
+
+            for name in ("agregados", "modificados"):
+                keys, values = DeltaEncoder.fixed_point(DeltaDecoder._points(payload[name]))
+                self.state.update(zip(keys.tolist(), values.tolist()))
+
+        self.sequence = sequence
+
+        return True
+
+    def points(self):
+        """
+        Devuelve los puntos reconstruidos.
+
+        :return: Matriz de Nx3 con Latitud, Longitud y dBZ, ordenada por clave.
+        """
+        keys = np.array(sorted(self.state), dtype=np.int64)
+
+        return DeltaEncoder.from_fixed_point(keys, [self.state[k] for k in keys.tolist()])
+
+    @staticmethod
+    def _points(rows):
+        points = []
+        for text in rows:
+            dBZ, coordinates = text.split(";")
+            latitude, longitude = coordinates.split(":")
+            points.append((float(latitude), float(longitude), float(dBZ)))
+
+        return points
@@ -13,10 +13,16 @@ Clase perteneciente al módulo de procesamiento de datos e inferencias Ama.
 import ama.utils as utils
 import ama.processor as processor
 import os
+import threading
 import time
 
 from watchdog.events import FileSystemEventHandler
 
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
 __author__ = "Andreas P. Koenzen"
 __copyright__ = "Copyright 2016, Proyecto de Tesis / Universidad Católica de Asunción."
 __credits__ = "Andreas P. Koenzen"
@@ -30,29 +36,104 @@ __status__ = "Prototype"
 class FileListener(FileSystemEventHandler):
     """
     Manejador de cambios en un directorio previamente establecido.
+
+    Un archivo nuevo se considera completo cuando el sistema de archivos avisa que fue cerrado
+    luego de ser escrito, cuando es renombrado dentro del directorio o, si ninguno de esos
+    eventos llega, cuando su tamaño y fecha de modificación se mantienen estables. Los archivos
+    completos se colocan en una cola acotada atendida por un pool de hilos. Con más de un hilo
+    los archivos pueden terminar en otro orden, por lo tanto el seguimiento de celdas, las
+    diferencias y los acumulados de lluvia requieren un único hilo.
     """
 
     layer = 0
     """
     int: La capa de datos a procesar.
     """
+    WORKERS = 1
+    """
+    int: La cantidad de hilos que procesan archivos.
+    """
+    QUEUE_SIZE = 32
+    """
+    int: La cantidad máxima de archivos completos esperando ser procesados.
+    """
+    POLL_INTERVAL = 1.0
+    """
+    float: Cada cuantos segundos se verifica si los archivos en escritura están completos.
+    """
+    STABLE_CHECKS = 2
+    """
+    int: La cantidad de verificaciones seguidas sin cambios de tamaño ni fecha para considerar completo un archivo.
+    """
 
-    def __init__(self, layer):
+    def __init__(self, layer, workers=None):
         self.layer = layer
+        self.queue = queue.Queue(self.QUEUE_SIZE)
+        self.waiting = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+        self.threads = [threading.Thread(target=self._watch_writes, name="ama-listener-poll")]
+        for k in range(max(1, workers or self.WORKERS)):
+            self.threads.append(threading.Thread(target=self._work, name="ama-listener-{0}".format(k)))
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
 
     def on_created(self, event):
-        # dormir la hebra por 15 segundos, para esperar que el archivo sea copiado por completo.
-        time.sleep(15)
+        if event.is_directory:
+            return
+
+        print(utils.Colors.BOLD + "INFO: Detectado archivo nuevo. Esperando que termine de escribirse..." + utils.Colors.ENDC)
+        with self.lock:
+            self.waiting[event.src_path] = (None, 0)
+
+    def on_closed(self, event):
+        # solo disponible en sistemas con inotify, el archivo fue cerrado luego de ser escrito.
+        if not event.is_directory:
+            self._complete(event.src_path)
 
-        print(utils.Colors.BOLD + "INFO: Detectado archivo nuevo. Procesando..." + utils.Colors.ENDC)
+    def on_moved(self, event):
+        # un archivo renombrado dentro del directorio ya está completo.
+        if not event.is_directory:
+            with self.lock:
+                self.waiting.pop(event.src_path, None)
+                self.waiting[event.dest_path] = (None, 0)
+            self._complete(event.dest_path)
+
+    def stop(self):
+        """
+        Detiene los hilos luego de procesar los archivos que ya estaban en la cola.
+
+        :return: void
+        """
+        self.stopped.set()
+        for _ in self.threads[1:]:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def process(self, path):
+        """
+        Procesa un archivo completo.
+
+        :param path: El PATH del archivo.
+
+        :return: void
+        """
+        print(utils.Colors.BOLD + "INFO: Procesando archivo nuevo..." + utils.Colors.ENDC)
         try:
-            if utils.Utils.should_process_file(event.src_path, processor.Processor.FILE_SIZE_LIMIT, True):
-                print(utils.Colors.BOLD + "ARCHIVO: {0}".format(event.src_path) + utils.Colors.ENDC)
-                # procesar el archivo.
-                processor.Processor().single_correlate_dbz_to_location_to_json(event.src_path, self.layer)
+            descriptor = utils.Utils.should_process_file(path, processor.Processor.FILE_SIZE_LIMIT, True)
+            if descriptor:
+                print(utils.Colors.BOLD + "ARCHIVO: {0}".format(path) + utils.Colors.ENDC)
+                # decodificar la capa una única vez y entregarla a todos los procesos.
+                data, metadata = processor.Processor.process(path, layer=self.layer, descriptor=descriptor)
+                processor.Processor().single_correlate_dbz_to_location_to_json(path, self.layer, descriptor=descriptor,
+                                                                                data=data, metadata=metadata)
+                processor.Processor().ingest_scan(data, metadata, self.layer)
             else:
                 print(utils.Colors.FAIL + "ERROR: El archivo detectado no cumple con los requisitos de procesamiento." + utils.Colors.ENDC)
-                print(utils.Colors.FAIL + "ARCHIVO: {0}".format(event.src_path) + utils.Colors.ENDC)
+                print(utils.Colors.FAIL + "ARCHIVO: {0}".format(path) + utils.Colors.ENDC)
         except Exception as e:
             print(utils.Colors.FAIL + "ERROR: Procesando archivo nuevo." + utils.Colors.ENDC)
             print(utils.Colors.FAIL + "DESC: {0}".format(e) + utils.Colors.ENDC)
@@ -60,7 +141,50 @@ class FileListener(FileSystemEventHandler):
             # siempre borrar el archivo que fue procesado.
             if processor.Processor.SHOULD_REMOVE_PROCESSED_FILES == 1:
                 try:
-                    os.remove(event.src_path)
+                    os.remove(path)
                 except Exception as e:
                     print(utils.Colors.FAIL + "ERROR: Borrando archivo original." + utils.Colors.ENDC)
                     print(utils.Colors.FAIL + "DESC: {0}".format(e) + utils.Colors.ENDC)
+
+    def _complete(self, path):
+        # encolar solo una vez, aunque lleguen varios eventos para el mismo archivo.
+        with self.lock:
+            if self.waiting.pop(path, False) is False:
+                return
+
+        self.queue.put(path)
+
+    def _watch_writes(self):
+        while not self.stopped.wait(self.POLL_INTERVAL):
+            with self.lock:
+                paths = list(self.waiting.items())
+
+            for path, (last, checks) in paths:
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    with self.lock:
+                        self.waiting.pop(path, None)  # el archivo fue borrado o movido.
+                    continue
+
+                current = (stat.st_size, stat.st_mtime)
+                checks = checks + 1 if current == last and stat.st_size > 0 else 0
+                if checks >= self.STABLE_CHECKS:
+                    self._complete(path)
+                else:
+                    with self.lock:
+                        if path in self.waiting:
+                            self.waiting[path] = (current, checks)
+
+    def _work(self):
+        while True:
+            path = self.queue.get()
+            try:
+                if path is None:
+                    return
+
+                start = time.time()
+                self.process(path)
+                print(utils.Colors.BOLD + "INFO: Archivo procesado en {0:.1f} segundos.".format(time.time() - start) + utils.Colors.ENDC)
+            finally:
+                self.queue.task_done()
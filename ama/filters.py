@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+
+"""
+Clase perteneciente al módulo de procesamiento de datos e inferencias Ama.
+
+.. module:: filters
+   :platform: Unix
+   :synopsis: Filtros de ruido (speckle), clutter y sectores sobre las matrices polares de reflectividad.
+
+.. moduleauthor:: Andreas P. Koenzen <akc@apkc.net>
+"""
+
+import ama.utils as utils
+import numpy as np
+import os
+
+__author__ = "Andreas P. Koenzen"
+__copyright__ = "Copyright 2016, Proyecto de Tesis / Universidad Católica de Asunción."
+__credits__ = "Andreas P. Koenzen"
+__license__ = "BSD"
+__version__ = "0.1"
+__maintainer__ = "Andreas P. Koenzen"
+__email__ = "akc@apkc.net"
+__status__ = "Prototype"
+
+
+class Filter:
+    """
+    Filtro sobre la matriz polar de una capa (N azimuts por M distancias).
+
+    Cada filtro recibe la máscara de gates a utilizar y devuelve una nueva máscara, de esta
+    forma los filtros se pueden encadenar y todos trabajan sobre la matriz completa.
+
+    Las subclases implementan *apply(values, azimuths, ranges, mask)*, que recibe la matriz de NxM
+    con las reflectividades, el vector de N azimuts en grados, el vector de M distancias en metros
+    y la máscara booleana de NxM, y devuelve la máscara con los gates que pasan el filtro.
+    """
+
+    def __init__(self):
+        pass
+
+    def crop(self, rows, columns, total_rows):
+        """
+        Devuelve el filtro a aplicar sobre una parte de la matriz, ver *RegionOfInterest*.
+
+        :param rows: Vector con los índices de las filas utilizadas.
+        :param columns: Vector con los índices de las columnas utilizadas.
+        :param total_rows: La cantidad de filas de la matriz completa.
+
+        :return: Un *Filter*.
+        """
+        return self
+
+
+class SpeckleFilter(Filter):
+    """
+    Descarta los gates aislados, es decir con menos de *minimum_neighbors* vecinos utilizados
+    entre sus 8 vecinos. En azimut la matriz es circular, en distancia no.
+    """
+
+    MINIMUM_NEIGHBORS = 3
+    """
+    int: La cantidad mínima de vecinos por defecto.
+    """
+
+    def __init__(self, minimum_neighbors=None, circular=True):
+        Filter.__init__(self)
+        self.minimum_neighbors = self.MINIMUM_NEIGHBORS if minimum_neighbors is None else minimum_neighbors
+        self.circular = circular
+
+    def apply(self, values, azimuths, ranges, mask):
+        echo = mask.astype(np.int16)
+
+        # sumar los vecinos en azimut (circular si están todos los azimuts) y luego en distancia.
+        rows = echo + np.roll(echo, 1, axis=0) + np.roll(echo, -1, axis=0)
+        if not self.circular and len(echo) > 1:
+            rows[0] -= echo[-1]
+            rows[-1] -= echo[0]
+        neighbors = rows.copy()
+        neighbors[:, 1:] += rows[:, :-1]
+        neighbors[:, :-1] += rows[:, 1:]
+        neighbors -= echo
+
+        return mask & (neighbors >= self.minimum_neighbors)
+
+    def crop(self, rows, columns, total_rows):
+        return SpeckleFilter(self.minimum_neighbors, self.circular and len(rows) == total_rows)
+
+
+class SectorFilter(Filter):
+    """
+    Descarta los gates fuera de un rango de distancias o dentro de sectores de azimut bloqueados,
+    por ejemplo por edificios o montañas cercanas al radar.
+    """
+
+    def __init__(self, minimum_range=0., maximum_range=None, blocked_sectors=()):
+        """
+        :param minimum_range: La distancia mínima en kilómetros.
+        :param maximum_range: La distancia máxima en kilómetros. *None* para no limitar.
+        :param blocked_sectors: Lista de tuplas (desde, hasta) en grados. Un sector puede pasar \
+            por el norte, ej. (350, 10).
+        """
+        Filter.__init__(self)
+        self.minimum_range = minimum_range
+        self.maximum_range = maximum_range
+        self.blocked_sectors = list(blocked_sectors)
+
+    def apply(self, values, azimuths, ranges, mask):
+        ranges = np.asarray(ranges, dtype=np.float64) / 1000.
+        columns = ranges >= self.minimum_range
+        if self.maximum_range is not None:
+            columns &= ranges <= self.maximum_range
+
+        azimuths = np.mod(np.asarray(azimuths, dtype=np.float64), 360.)
+        rows = np.ones(len(azimuths), dtype=bool)
+        for start, end in self.blocked_sectors:
+            start, end = start % 360., end % 360.
+            if start <= end:
+                rows &= ~((azimuths >= start) & (azimuths <= end))
+            else:
+                rows &= ~((azimuths >= start) | (azimuths <= end))
+
+        return mask & rows[:, np.newaxis] & columns[np.newaxis, :]
+
+
+class ClutterFilter(Filter):
+    """
+    Descarta los gates marcados como clutter en una máscara aprendida de barridos históricos.
+    Ver *ClutterLearner*.
+
+    Las máscaras se guardan en disco como *layer_N.npy* dentro del directorio *DIRECTORY*.
+    """
+
+    DIRECTORY = "clutter"
+    """
+    string: El directorio, relativo a la variable de entorno AMA_EXPORT_DATA, donde se guardan las máscaras.
+    """
+
+    def __init__(self, clutter):
+        """
+        :param clutter: Matriz booleana de NxM, *True* para los gates con clutter.
+        """
+        Filter.__init__(self)
+        self.clutter = clutter
+
+    def apply(self, values, azimuths, ranges, mask):
+        if self.clutter.shape != mask.shape:
+            print(utils.Colors.WARNING + "WARN: La máscara de clutter ({0}) no corresponde a la capa ({1}), obviando...".format(
+                self.clutter.shape, mask.shape) + utils.Colors.ENDC)
+            return mask
+
+        return mask & ~self.clutter
+
+    def crop(self, rows, columns, total_rows):
+        if self.clutter.shape[0] != total_rows or (len(columns) > 0 and columns[-1] >= self.clutter.shape[1]):
+            return self  # geometría distinta, *apply* informa y no filtra.
+
+        return ClutterFilter(self.clutter[np.ix_(rows, columns)])
+
+    @staticmethod
+    def path(layer):
+        """
+        Devuelve el PATH de la máscara de una capa.
+
+        :param layer: La capa de datos.
+
+        :return: El PATH del archivo *.npy*.
+        """
+        return os.path.join(os.environ["AMA_EXPORT_DATA"], ClutterFilter.DIRECTORY, "layer_{0}.npy".format(layer))
+
+    @staticmethod
+    def load(layer):
+        """
+        Abre la máscara de una capa.
+
+        :param layer: La capa de datos.
+
+        :return: Un *ClutterFilter* o *None* si la capa no tiene una máscara.
+        """
+        path = ClutterFilter.path(layer)
+        if not os.path.exists(path):
+            print(utils.Colors.WARNING + "WARN: No existe una máscara de clutter para la capa {0}.".format(layer) + utils.Colors.ENDC)
+            return None
+
+        return ClutterFilter(np.load(path, mmap_mode="r"))
+
+    def save(self, layer):
+        """
+        Guarda la máscara de una capa.
+
+        :param layer: La capa de datos.
+
+        :return: El PATH del archivo *.npy*.
+        """
+        path = ClutterFilter.path(layer)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+
+        temporary = "{0}.{1}.tmp".format(path, os.getpid())
+        with open(temporary, "wb") as f:
+            np.save(f, np.asarray(self.clutter, dtype=bool))
+        os.rename(temporary, path)
+
+        return path
+
+
+class ClutterLearner:
+    """
+    Aprende una máscara de clutter a partir de barridos históricos. El clutter de tierra aparece
+    en el mismo gate en casi todos los barridos, a diferencia de la lluvia, por lo tanto se marcan
+    los gates con eco en al menos *frequency* de los barridos.
+    """
+
+    THRESHOLD = 10.
+    """
+    float: La reflectividad a partir de la cual un gate tiene eco.
+    """
+    FREQUENCY = 0.8
+    """
+    float: La proporción de barridos con eco para considerar clutter a un gate.
+    """
+
+    def __init__(self, threshold=None, frequency=None):
+        self.threshold = self.THRESHOLD if threshold is None else threshold
+        self.frequency = self.FREQUENCY if frequency is None else frequency
+        self.echoes = None
+        self.scans = 0
+
+    def add(self, values):
+        """
+        Agrega un barrido.
+
+        :param values: Matriz de NxM con las reflectividades.
+
+        :return: True si el barrido fue agregado, False si su geometría no corresponde a los anteriores.
+        """
+        echo = np.asarray(values) >= self.threshold
+        if self.echoes is None:
+            self.echoes = np.zeros(echo.shape, dtype=np.int32)
+        elif self.echoes.shape != echo.shape:
+            return False
+
+        self.echoes += echo
+        self.scans += 1
+
+        return True
+
+    def filter(self):
+        """
+        Genera el filtro con los barridos agregados.
+
+        :return: Un *ClutterFilter*.
+        """
+        if self.scans == 0:
+            raise ValueError("No se agregaron barridos.")
+
+        return ClutterFilter(self.echoes >= self.frequency * self.scans)
+
+
+class FilterPipeline:
+    """
+    Cadena de filtros que se aplican en orden sobre la máscara de gates de una capa.
+    """
+
+    def __init__(self, filters=None):
+        self.filters = list(filters or [])
+
+    def __len__(self):
+        return len(self.filters)
+
+    def apply(self, values, azimuths, ranges, mask):
+        """
+        Aplica todos los filtros.
+
+        :param values: Matriz de NxM con las reflectividades.
+        :param azimuths: Vector de N elementos con los azimuts de cada fila, en grados.
+        :param ranges: Vector de M elementos con las distancias de cada columna, en metros.
+        :param mask: Matriz booleana de NxM con los gates a utilizar.
+
+        :return: Matriz booleana de NxM con los gates que pasan todos los filtros.
+        """
+        for item in self.filters:
+            mask = item.apply(values, azimuths, ranges, mask)
+
+        return mask
+
+    def crop(self, rows, columns, total_rows):
+        """
+        Devuelve la cadena a aplicar sobre una parte de la matriz, ver *Filter.crop*.
+
+        :return: Un *FilterPipeline*.
+        """
+        return FilterPipeline([item.crop(rows, columns, total_rows) for item in self.filters])
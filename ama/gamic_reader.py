@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+
+"""
+Clase perteneciente al módulo de procesamiento de datos e inferencias Ama.
+
+.. module:: gamic_reader
+   :platform: Unix
+   :synopsis: Lectura selectiva de archivos GAMIC HDF5 por capa y momento.
+
+.. moduleauthor:: Andreas P. Koenzen <akc@apkc.net>
+"""
+
+import h5py
+import numpy as np
+import os
+
+from collections import OrderedDict
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+__author__ = "Andreas P. Koenzen"
+__copyright__ = "Copyright 2016, Proyecto de Tesis / Universidad Católica de Asunción."
+__credits__ = "Andreas P. Koenzen"
+__license__ = "BSD"
+__version__ = "0.1"
+__maintainer__ = "Andreas P. Koenzen"
+__email__ = "akc@apkc.net"
+__status__ = "Prototype"
+
+
+class LazyMapping(Mapping):
+    """
+    Diccionario de solo lectura cuyos valores se calculan recién cuando son accedidos por primera vez.
+    """
+
+    def __init__(self, keys, loader):
+        self._keys = list(keys)
+        self._loader = loader
+        self._values = {}
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        if key not in self._values:
+            self._values[key] = self._loader(key)
+
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return "{{{0}}}".format(", ".join(
+            "{0!r}: {1}".format(k, repr(self._values[k]) if k in self._values else "<sin leer>") for k in self._keys))
+
+
+class FileDescriptor:
+    """
+    Descriptor liviano de un archivo GAMIC HDF5. Contiene solo la estructura y los atributos
+    del archivo, sin ningún dato decodificado, y puede ser reutilizado por la etapa de
+    procesamiento para no volver a leerlos.
+    """
+
+    def __init__(self, filename, size, volume, scans):
+        self.filename = filename
+        """
+        string: El PATH al archivo.
+        """
+        self.size = size
+        """
+        int: El tamaño del archivo en bytes.
+        """
+        self.volume = volume
+        """
+        dict: Los atributos generales del volumen. Equivale a *metadata["VOL"]*.
+        """
+        self.scans = scans
+        """
+        OrderedDict: Por cada capa (*SCANn*) un diccionario con las claves *moments*, *Time* y *elevation*.
+        """
+
+    @property
+    def scan_count(self):
+        """
+        int: La cantidad de capas del archivo.
+        """
+        return len(self.scans)
+
+    @property
+    def double_polarization(self):
+        """
+        boolean: Si el archivo es de "Polarización Doble", es decir, si posee más de una capa de datos.
+        """
+        return self.scan_count > 1
+
+    @property
+    def radar_coordinates(self):
+        """
+        tuple: Latitud y Longitud del radar.
+        """
+        return float(self.volume["Latitude"]), float(self.volume["Longitude"])
+
+    def __repr__(self):
+        return "FileDescriptor({0}, {1} bytes, {2} capas)".format(self.filename, self.size, self.scan_count)
+
+
+class GamicReader:
+    """
+    Lector de archivos GAMIC HDF5 construido sobre h5py.
+
+    A diferencia de *wrl.io.read_GAMIC_hdf5*, que decodifica todas las capas y todos los momentos
+    de un volumen, este lector abre el archivo una sola vez y solo decodifica lo que se pide. El
+    resto de las capas y momentos quedan disponibles como accesos perezosos con la misma estructura
+    de diccionarios que devuelve wradlib.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = h5py.File(filename, "r")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Cierra el archivo HDF5. Luego de cerrarlo los accesos perezosos ya no pueden ser leídos.
+
+        :return: void
+        """
+        self.file.close()
+
+    def scan_keys(self):
+        """
+        Devuelve las claves de las capas presentes en el archivo.
+
+        :return: Una lista de claves con el formato *SCANn*, ordenadas por capa.
+        """
+        count = int(self.file["what"].attrs.get("sets", 0))
+
+        return [u"SCAN{0}".format(k) for k in range(count) if "scan{0}".format(k) in self.file]
+
+    def volume_attributes(self):
+        """
+        Devuelve los atributos generales del volumen. Equivale a *metadata["VOL"]*.
+
+        :return: Un diccionario con los atributos del volumen.
+        """
+        where = self.file["where"].attrs
+        what = self.file["what"].attrs
+
+        return {
+            "Latitude": where.get("lat"),
+            "Longitude": where.get("lon"),
+            "Height": where.get("height"),
+            "date": GamicReader._text(what.get("date")),
+            "object": GamicReader._text(what.get("object")),
+            "sets": what.get("sets")
+        }
+
+    def scan_attributes(self, scan_key):
+        """
+        Devuelve los atributos de una capa, incluyendo los vectores de azimut (*az*) y distancia (*r*).
+
+        :param scan_key: La clave de la capa. Ej. *SCAN0*.
+
+        :return: Un diccionario con los atributos de la capa.
+        """
+        scan = self.file[scan_key.lower()]
+        attributes = {}
+        for name, value in scan["how"].attrs.items():
+            attributes[name] = GamicReader._text(value)
+
+        ray_header = scan["ray_header"]
+        azimuth_start = np.array(ray_header["azimuth_start"], dtype=np.float64)
+        azimuth_stop = np.array(ray_header["azimuth_stop"], dtype=np.float64)
+
+        # el azimut que corresponde al primer rayo.
+        zero_index = np.where(azimuth_stop < azimuth_start)[0]
+        azimuth_stop[zero_index] += 360
+        zero_index = int(zero_index[0]) + 1 if len(zero_index) > 0 else 0
+
+        az = np.round(np.roll((azimuth_start + azimuth_stop) / 2, -zero_index, axis=0), 1)
+
+        bin_range = attributes["range_step"] * attributes["range_samples"]
+        r = np.arange(bin_range, bin_range * attributes["bin_count"] + bin_range, bin_range)
+
+        attributes["bin_range"] = bin_range
+        attributes["zero_index"] = zero_index
+        attributes["az"] = az
+        attributes["el"] = attributes.get("elevation")
+        attributes["r"] = r
+        attributes["Time"] = attributes.pop("timestamp", None)
+        attributes["max_range"] = r[-1]
+
+        return attributes
+
+    def moment_names(self, scan_key):
+        """
+        Devuelve los momentos presentes en una capa.
+
+        :param scan_key: La clave de la capa. Ej. *SCAN0*.
+
+        :return: Una lista con los nombres de los momentos en mayúsculas. Ej. *[Z, UZ, V]*.
+        """
+        scan = self.file[scan_key.lower()]
+
+        return [GamicReader._text(scan[group].attrs.get("moment")).upper() for group in scan if "moment" in group]
+
+    def scan_moment(self, scan_key, moment, zero_index=None):
+        """
+        Decodifica un único momento de una capa.
+
+        :param scan_key: La clave de la capa. Ej. *SCAN0*.
+        :param moment: El nombre del momento. Ej. *Z*.
+        :param zero_index: El índice del primer rayo. Si no se pasa se lee de los atributos de la capa.
+
+        :return: Un diccionario con las claves *data*, *dyn_range_min* y *dyn_range_max*.
+        """
+        scan = self.file[scan_key.lower()]
+        for group in scan:
+            if "moment" not in group:
+                continue
+
+            dataset = scan[group]
+            if GamicReader._text(dataset.attrs.get("moment")).upper() != moment:
+                continue
+
+            if zero_index is None:
+                zero_index = self.scan_attributes(scan_key)["zero_index"]
+
+            dyn_range_min = dataset.attrs.get("dyn_range_min")
+            dyn_range_max = dataset.attrs.get("dyn_range_max")
+            div = 254. if GamicReader._text(dataset.attrs.get("format")) == "UV8" else 65534.
+
+            values = dataset[...].astype(np.float64)
+            values -= 1
+            values *= (dyn_range_max - dyn_range_min) / div
+            values += dyn_range_min
+
+            return {
+                "data": np.roll(values, -zero_index, axis=0),
+                "dyn_range_min": dyn_range_min,
+                "dyn_range_max": dyn_range_max
+            }
+
+        raise KeyError(u"{0}/{1}".format(scan_key, moment))
+
+    def describe(self):
+        """
+        Lee solo la estructura de grupos y los atributos del archivo, sin decodificar datos.
+
+        :return: Un *FileDescriptor* con la estructura del archivo.
+        """
+        scans = OrderedDict()
+        for scan_key in self.scan_keys():
+            how = self.file[scan_key.lower()]["how"].attrs
+            scans[scan_key] = {
+                "moments": self.moment_names(scan_key),
+                "Time": GamicReader._text(how.get("timestamp")),
+                "elevation": how.get("elevation")
+            }
+
+        return FileDescriptor(self.filename, os.stat(self.filename).st_size, self.volume_attributes(), scans)
+
+    @staticmethod
+    def probe(filename):
+        """
+        Abre un archivo, lee su estructura y lo vuelve a cerrar.
+
+        :param filename: El archivo a verificar.
+
+        :return: Un *FileDescriptor* con la estructura del archivo.
+        """
+        with GamicReader(filename) as reader:
+            return reader.describe()
+
+    def read(self, layer, moment=u"Z", descriptor=None):
+        """
+        Lee un archivo decodificando solo la capa y el momento pedidos. Las demás capas y
+        momentos se decodifican recién al ser accedidos.
+
+        :param layer: La capa de datos a decodificar. Cada capa corresponde a un ángulo de elevación del radar.
+        :param moment: El momento a decodificar. Por defecto la reflectividad (*Z*).
+        :param descriptor: El *FileDescriptor* obtenido previamente con *probe*. Si se pasa, la \
+            estructura del archivo y los atributos del volumen no se vuelven a leer.
+
+        :return: Los datos y metadatos con la misma estructura que *wrl.io.read_GAMIC_hdf5*.
+        """
+        if descriptor is None:
+            descriptor = self.describe()
+        scan_keys = list(descriptor.scans)
+
+        metadata = LazyMapping([u"VOL"] + scan_keys,
+                               lambda key: descriptor.volume if key == u"VOL" else self.scan_attributes(key))
+
+        def load_scan(scan_key):
+            return LazyMapping(descriptor.scans[scan_key]["moments"],
+                               lambda name: self.scan_moment(scan_key, name, metadata[scan_key]["zero_index"]))
+
+        data = LazyMapping(scan_keys, load_scan)
+
+        # decodificar ahora la capa pedida, el resto queda para cuando sea necesario.
+        layer_key = u"SCAN{0}".format(layer)
+        data[layer_key][moment]
+
+        return data, metadata
+
+    @staticmethod
+    def _text(value):
+        if isinstance(value, bytes):
+            return value.decode("utf-8")
+
+        return value
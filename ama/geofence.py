@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+"""
+Clase perteneciente al módulo de procesamiento de datos e inferencias Ama.
+
+.. module:: geofence
+   :platform: Unix
+   :synopsis: Zonas de notificación (municipios, cuencas, etc.) con un índice espacial.
+
+.. moduleauthor:: Andreas P. Koenzen <akc@apkc.net>
+"""
+
+import ama.utils as utils
+import json
+import numpy as np
+import shapely
+import threading
+
+from shapely import affinity
+from shapely.geometry import MultiPoint, Point, shape
+from shapely.prepared import prep
+from shapely.strtree import STRtree
+
+__author__ = "Andreas P. Koenzen"
+__copyright__ = "Copyright 2016, Proyecto de Tesis / Universidad Católica de Asunción."
+__credits__ = "Andreas P. Koenzen"
+__license__ = "BSD"
+__version__ = "0.1"
+__maintainer__ = "Andreas P. Koenzen"
+__email__ = "akc@apkc.net"
+__status__ = "Prototype"
+
+
+class Geofence:
+    """
+    Conjunto de zonas de notificación leídas de un archivo GeoJSON.
+
+    Las geometrías se indexan una sola vez en un *STRtree* y se preparan para consultas
+    repetidas, por lo tanto cada consulta solo evalúa las zonas cuyo rectángulo toca la
+    geometría consultada y el costo por barrido no depende de la cantidad de zonas.
+
+    Las coordenadas siguen el orden de GeoJSON, es decir (Longitud, Latitud).
+    """
+
+    ###### OPCIONES DE ZONAS ######
+    NAME_PROPERTIES = ("nombre", "name", "id")
+    """
+    tuple: Las propiedades de cada *Feature* a utilizar como nombre de la zona, en orden de preferencia.
+    """
+    ALERT_DISTANCE = 0.
+    """
+    float: La distancia en kilómetros alrededor de cada cluster dentro de la cual una zona se considera afectada.
+    """
+    KMS_PER_DEGREE = 6371.0088 * np.pi / 180.
+    """
+    float: La cantidad de kilómetros en un grado de latitud.
+    """
+
+    BULK_QUERY = int(shapely.__version__.split(".")[0]) >= 2
+    """
+    boolean: Si el *STRtree* soporta consultas en bloque con predicado (shapely 2.x).
+    """
+
+    _default = None
+    _default_path = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, names, geometries):
+        self.names = list(names)
+        self.geometries = list(geometries)
+        self.tree = STRtree(self.geometries)
+        # solo las consultas de shapely 1.x evalúan el predicado con las geometrías preparadas.
+        self.prepared = None if self.BULK_QUERY else [prep(geometry) for geometry in self.geometries]
+        self._positions = None if self.BULK_QUERY else \
+            dict((id(geometry), k) for k, geometry in enumerate(self.geometries))
+
+    def __len__(self):
+        return len(self.geometries)
+
+    @staticmethod
+    def load(path):
+        """
+        Lee las zonas de un archivo GeoJSON (*FeatureCollection*).
+
+        :param path: El PATH del archivo.
+
+        :return: Un *Geofence*.
+        """
+        with open(path, "r") as f:
+            collection = json.load(f)
+
+        names = []
+        geometries = []
+        for k, feature in enumerate(collection.get("features", [])):
+            if not feature.get("geometry"):
+                continue
+
+            properties = feature.get("properties") or {}
+            name = next((properties[p] for p in Geofence.NAME_PROPERTIES if properties.get(p) is not None), k)
+
+            names.append(u"{0}".format(name))
+            geometries.append(shape(feature["geometry"]))
+
+        print(utils.Colors.BOLD + "INFO: Cargadas {0} zonas de notificación de {1}.".format(len(geometries), path) + utils.Colors.ENDC)
+
+        return Geofence(names, geometries)
+
+    @staticmethod
+    def default(path):
+        """
+        Devuelve las zonas compartidas por todo el proceso, leyéndolas la primera vez.
+
+        :param path: El PATH del archivo GeoJSON.
+
+        :return: Un *Geofence*.
+        """
+        with Geofence._default_lock:
+            if Geofence._default is None or Geofence._default_path != path:
+                Geofence._default = Geofence.load(path)
+                Geofence._default_path = path
+
+            return Geofence._default
+
+    def points(self, lat, lon):
+        """
+        Busca las zonas que contienen cada punto.
+
+        :param lat: Vector con las latitudes.
+        :param lon: Vector con las longitudes.
+
+        :return: Una lista con los índices de las zonas que contienen cada punto.
+        """
+        return self._match([Point(x, y) for x, y in zip(np.ravel(lon), np.ravel(lat))], "intersects")
+
+    def clusters(self, clusters, distance=None):
+        """
+        Busca las zonas afectadas por cada cluster, es decir las que tocan la envolvente convexa
+        del cluster o están a menos de *distance* de ella.
+
+        :param clusters: Un *ClusterSet* o una lista de matrices de Nx2 o más con Latitud, Longitud.
+        :param distance: La distancia en kilómetros. Por defecto *ALERT_DISTANCE*.
+
+        :return: Una lista con los índices de las zonas afectadas por cada cluster.
+        """
+        distance = self.ALERT_DISTANCE if distance is None else distance
+
+        hulls = []
+        for cluster in clusters:
+            points = np.asarray(cluster)[:, :2]
+            if distance > 0:
+                #
+                # Ampliar la envolvente sobre un plano local donde un grado de longitud mide lo mismo
+                # que uno de latitud, de lo contrario la distancia Este-Oeste queda corta en cos(lat).
+                #
+                scale = np.cos(np.radians(np.mean(points[:, 0])))
+                hull = MultiPoint([(x * scale, y) for y, x in points]).convex_hull.buffer(distance / self.KMS_PER_DEGREE)
+                hull = affinity.scale(hull, xfact=1. / scale, yfact=1., origin=(0, 0))
+            else:
+                hull = MultiPoint([(x, y) for y, x in points]).convex_hull
+            hulls.append(hull)
+
+        return self._match(hulls, "intersects")
+
+    def names_of(self, matches):
+        """
+        Convierte índices de zonas en nombres.
+
+        :param matches: Una lista de listas de índices, como las de *points* o *clusters*.
+
+        :return: Una lista de listas de nombres.
+        """
+        return [[self.names[k] for k in zones] for zones in matches]
+
+    def _match(self, geometries, predicate):
+        result = [[] for _ in geometries]
+        if len(geometries) == 0 or len(self.geometries) == 0:
+            return result
+
+        if self.BULK_QUERY:
+            #
+            # shapely 2.x: una sola consulta para todas las geometrías, devuelve pares de
+            # (geometría consultada, zona) ya filtrados por el predicado.
+            #
+            pairs = self.tree.query(np.array(geometries, dtype=object), predicate=predicate)
+            for query, zone in zip(*pairs):
+                result[int(query)].append(int(zone))
+
+            return [sorted(zones) for zones in result]
+
+        #
+        # shapely 1.x: una consulta por geometría que devuelve las zonas cuyo rectángulo la toca,
+        # como geometrías (hasta 1.8) o como índices, y luego se evalúa el predicado preparado.
+        #
+        for k, geometry in enumerate(geometries):
+            for candidate in self.tree.query(geometry):
+                zone = int(candidate) if isinstance(candidate, (int, np.integer)) else self._positions[id(candidate)]
+                if getattr(self.prepared[zone], predicate)(geometry):
+                    result[k].append(zone)
+
+        return [sorted(zones) for zones in result]
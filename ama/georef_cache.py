@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+
+"""
+Clase perteneciente al módulo de procesamiento de datos e inferencias Ama.
+
+.. module:: georef_cache
+   :platform: Unix
+   :synopsis: Caché persistente de coordenadas geográficas para una geometría de radar fija.
+
+.. moduleauthor:: Andreas P. Koenzen <akc@apkc.net>
+"""
+
+import ama.utils as utils
+import hashlib
+import numpy as np
+import os
+import threading
+import wradlib as wrl
+
+from collections import OrderedDict
+
+__author__ = "Andreas P. Koenzen"
+__copyright__ = "Copyright 2016, Proyecto de Tesis / Universidad Católica de Asunción."
+__credits__ = "Andreas P. Koenzen"
+__license__ = "BSD"
+__version__ = "0.1"
+__maintainer__ = "Andreas P. Koenzen"
+__email__ = "akc@apkc.net"
+__status__ = "Prototype"
+
+
+class GeorefCache:
+    """
+    Caché de las matrices de Latitud/Longitud de cada gate de una capa.
+
+    El radar no se mueve y los vectores de azimut y distancia son los mismos de un barrido
+    a otro, por lo tanto las coordenadas de cada gate se calculan una sola vez y luego se
+    guardan en disco como archivos *.npy* que se abren en modo *memory-map*. Además se
+    mantiene un LRU en memoria para el modo *run*.
+    """
+
+    def __init__(self):
+        pass
+
+    ###### OPCIONES DE CACHE ######
+    DIRECTORY = "georef_cache"
+    """
+    string: El directorio, relativo a la variable de entorno AMA_EXPORT_DATA, donde se guardan las matrices.
+    """
+    MEMORY_ENTRIES = 11
+    """
+    int: La cantidad de geometrías a mantener en memoria. Por defecto una por cada capa del radar.
+    """
+
+    _entries = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def key(azimuths, ranges, radar_latitude, radar_longitude, elevation=None):
+        """
+        Calcula la clave de una geometría de radar.
+
+        :param azimuths: Vector con los azimuts de cada fila.
+        :param ranges: Vector con las distancias de cada columna.
+        :param radar_latitude: La latitud del radar.
+        :param radar_longitude: La longitud del radar.
+        :param elevation: El ángulo de elevación de la capa.
+
+        :return: Un *string* hexadecimal que identifica a la geometría.
+        """
+        digest = hashlib.sha1()
+        digest.update("{0:.6f}:{1:.6f}:{2}".format(radar_latitude, radar_longitude, elevation).encode("utf-8"))
+        digest.update(np.ascontiguousarray(azimuths, dtype=np.float64))
+        digest.update(np.ascontiguousarray(ranges, dtype=np.float64))
+
+        return digest.hexdigest()
+
+    @staticmethod
+    def directory():
+        """
+        Devuelve el directorio de la caché en disco.
+
+        :return: El PATH al directorio o *None* si la variable AMA_EXPORT_DATA no está definida.
+        """
+        if "AMA_EXPORT_DATA" not in os.environ:
+            return None
+
+        return os.path.join(os.environ["AMA_EXPORT_DATA"], GeorefCache.DIRECTORY)
+
+    @staticmethod
+    def lookup(azimuths, ranges, radar_latitude, radar_longitude, elevation=None):
+        """
+        Devuelve las matrices de Latitud/Longitud de cada gate de una capa. Si la geometría
+        no existe en memoria ni en disco entonces se calcula y se guarda.
+
+        :param azimuths: Vector de N elementos con los azimuts de cada fila.
+        :param ranges: Vector de M elementos con las distancias de cada columna.
+        :param radar_latitude: La latitud del radar.
+        :param radar_longitude: La longitud del radar.
+        :param elevation: El ángulo de elevación de la capa.
+
+        :return: Dos matrices de NxM con las latitudes y longitudes de cada gate.
+        """
+        key = GeorefCache.key(azimuths, ranges, radar_latitude, radar_longitude, elevation)
+
+        with GeorefCache._lock:
+            if key in GeorefCache._entries:
+                grids = GeorefCache._entries.pop(key)
+                GeorefCache._entries[key] = grids  # mover al final, es el más reciente.
+                return grids
+
+        grids = GeorefCache._load(key)
+        if grids is None:
+            grids = GeorefCache._compute(azimuths, ranges, radar_latitude, radar_longitude)
+            GeorefCache._store(key, grids)
+
+        with GeorefCache._lock:
+            GeorefCache._entries[key] = grids
+            while len(GeorefCache._entries) > GeorefCache.MEMORY_ENTRIES:
+                GeorefCache._entries.popitem(last=False)
+
+        return grids
+
+    @staticmethod
+    def clear():
+        """
+        Vacía la caché en memoria. Los archivos en disco no son borrados.
+
+        :return: void
+        """
+        with GeorefCache._lock:
+            GeorefCache._entries.clear()
+
+    @staticmethod
+    def _compute(azimuths, ranges, radar_latitude, radar_longitude):
+        ranges_grid, azimuths_grid = np.meshgrid(np.asarray(ranges, dtype=np.float64),
+                                                 np.asarray(azimuths, dtype=np.float64))
+        lon, lat = wrl.georef.polar2lonlat(ranges_grid, azimuths_grid, (radar_longitude, radar_latitude))
+
+        return np.asarray(lat), np.asarray(lon)
+
+    @staticmethod
+    def _paths(key):
+        directory = GeorefCache.directory()
+        if directory is None:
+            return None
+
+        return os.path.join(directory, key + ".lat.npy"), os.path.join(directory, key + ".lon.npy")
+
+    @staticmethod
+    def _load(key):
+        paths = GeorefCache._paths(key)
+        if paths is None or not all(os.path.exists(path) for path in paths):
+            return None
+
+        try:
+            return tuple(np.load(path, mmap_mode="r") for path in paths)
+        except Exception as e:
+            print(utils.Colors.WARNING + "WARN: Caché de georeferencias corrupta, recalculando..." + utils.Colors.ENDC)
+            print(utils.Colors.WARNING + "DESC: {0}".format(e) + utils.Colors.ENDC)
+            return None
+
+    @staticmethod
+    def _store(key, grids):
+        paths = GeorefCache._paths(key)
+        if paths is None:
+            return
+
+        try:
+            if not os.path.exists(os.path.dirname(paths[0])):
+                os.makedirs(os.path.dirname(paths[0]))
+
+            #
+            # Escribir primero en un archivo temporal y luego renombrarlo, así otro proceso
+            # nunca puede abrir una matriz a medio escribir.
+            #
+            for path, grid in zip(paths, grids):
+                temporary = "{0}.{1}.tmp".format(path, os.getpid())
+                with open(temporary, "wb") as f:
+                    np.save(f, grid)
+                os.rename(temporary, path)
+        except Exception as e:
+            print(utils.Colors.WARNING + "WARN: No se pudo guardar la caché de georeferencias." + utils.Colors.ENDC)
+            print(utils.Colors.WARNING + "DESC: {0}".format(e) + utils.Colors.ENDC)
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+"""
+Clase perteneciente al módulo de procesamiento de datos e inferencias Ama.
+
+.. module:: grid_dbscan
+   :platform: Unix
+   :synopsis: DBSCAN indexado por una grilla, de costo aproximadamente lineal en la cantidad de puntos.
+
+.. moduleauthor:: Andreas P. Koenzen <akc@apkc.net>
+"""
+
+import numpy as np
+
+from scipy.spatial import cKDTree
+
+__author__ = "Andreas P. Koenzen"
+__copyright__ = "Copyright 2016, Proyecto de Tesis / Universidad Católica de Asunción."
+__credits__ = "Andreas P. Koenzen"
+__license__ = "BSD"
+__version__ = "0.1"
+__maintainer__ = "Andreas P. Koenzen"
+__email__ = "akc@apkc.net"
+__status__ = "Prototype"
+
+
+class GridDBSCAN:
+    """
+    Implementación de DBSCAN sobre una grilla de celdas.
+
+    Los puntos se proyectan sobre un plano local centrado en el radar y se agrupan en celdas de
+    lado *eps / sqrt(2)*. Todos los puntos de una celda están a menos de *eps* entre sí, por lo
+    tanto una celda con al menos *min_samples* puntos es completamente núcleo y solo es necesario
+    comparar puntos de celdas vecinas. Los clusters se forman uniendo celdas núcleo vecinas que
+    tengan al menos un par de puntos núcleo a distancia *eps*.
+
+    Las etiquetas son las mismas que las de *sklearn.cluster.DBSCAN* con métrica haversine salvo
+    por los puntos borde alcanzables desde dos clusters, que aquí se asignan al núcleo más cercano,
+    y por la diferencia entre la proyección plana y la distancia sobre la esfera.
+    """
+
+    KMS_PER_RADIAN = 6371.0088
+    """
+    float: La cantidad de kilómetros en un radián.
+    """
+    NOISE = -1
+    """
+    int: La etiqueta de los puntos considerados ruido.
+    """
+
+    def __init__(self, eps, min_samples):
+        self.eps = eps
+        """
+        float: El espacio radial o distancia entre puntos, en kilómetros.
+        """
+        self.min_samples = min_samples
+        """
+        int: La cantidad mínima de puntos, incluyendo el propio punto, para ser considerado núcleo.
+        """
+        self.labels_ = None
+        """
+        ndarray: Las etiquetas de cada punto luego de *fit*. Igual que en sklearn.
+        """
+        self.core_sample_indices_ = None
+        """
+        ndarray: Los índices de los puntos núcleo luego de *fit*. Igual que en sklearn.
+        """
+
+    @staticmethod
+    def project(lat, lon, center_latitude, center_longitude):
+        """
+        Proyecta coordenadas geográficas sobre un plano azimutal equidistante centrado en un punto.
+
+        :param lat: Vector con las latitudes.
+        :param lon: Vector con las longitudes.
+        :param center_latitude: La latitud del centro. Ej. la del radar.
+        :param center_longitude: La longitud del centro. Ej. la del radar.
+
+        :return: Una matriz de Nx2 con las coordenadas (x, y) en kilómetros.
+        """
+        lat = np.radians(np.asarray(lat, dtype=np.float64))
+        lon = np.radians(np.asarray(lon, dtype=np.float64))
+        lat0 = np.radians(center_latitude)
+        lon0 = np.radians(center_longitude)
+
+        dlon = lon - lon0
+        cos_c = np.sin(lat0) * np.sin(lat) + np.cos(lat0) * np.cos(lat) * np.cos(dlon)
+        c = np.arccos(np.clip(cos_c, -1., 1.))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            k = np.where(c > 0, c / np.sin(c), 1.)
+
+        x = k * np.cos(lat) * np.sin(dlon)
+        y = k * (np.cos(lat0) * np.sin(lat) - np.sin(lat0) * np.cos(lat) * np.cos(dlon))
+
+        return np.column_stack((x, y)) * GridDBSCAN.KMS_PER_RADIAN
+
+    def fit(self, lat, lon, center=None):
+        """
+        Ejecuta el agrupamiento.
+
+        :param lat: Vector con las latitudes.
+        :param lon: Vector con las longitudes.
+        :param center: Tupla (Latitud, Longitud) del centro de la proyección. Por defecto el \
+            centro de los datos.
+
+        :return: self
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        if center is None:
+            center = (float(np.mean(lat)), float(np.mean(lon))) if len(lat) > 0 else (0., 0.)
+
+        return self.fit_points(GridDBSCAN.project(lat, lon, center[0], center[1]))
+
+    def fit_points(self, points):
+        """
+        Ejecuta el agrupamiento sobre puntos ya proyectados en un plano.
+
+        :param points: Matriz de Nx2 con las coordenadas (x, y) en kilómetros.
+
+        :return: self
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        n = len(points)
+        labels = np.full(n, self.NOISE, dtype=np.intp)
+        if n == 0:
+            self.labels_ = labels
+            self.core_sample_indices_ = np.zeros(0, dtype=np.intp)
+            return self
+
+        # tolerancia para incluir los puntos exactamente a distancia *eps*, igual que sklearn.
+        radius = self.eps * (1. + 1e-9)
+
+        ###### GRILLA ######
+        side = self.eps / np.sqrt(2.)
+        cells = np.floor((points - points.min(axis=0)) / side).astype(np.int64)
+        width = int(cells[:, 1].max()) + 5
+        keys = (cells[:, 0] + 2) * width + (cells[:, 1] + 2)
+
+        order = np.argsort(keys, kind="mergesort")
+        unique_keys, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+        lookup = dict(zip(unique_keys.tolist(), range(len(unique_keys))))
+
+        def members(c):
+            return order[starts[c]:starts[c] + counts[c]]
+
+        # vecinos de una celda: todas las celdas cuyo punto más cercano puede estar a distancia *eps*.
+        offsets = [dx * width + dy for dx in range(-2, 3) for dy in range(-2, 3)]
+        neighbors = []
+        for key in unique_keys.tolist():
+            neighbors.append([lookup[key + o] for o in offsets if (key + o) in lookup])
+
+        ###### PUNTOS NUCLEO ######
+        tree = cKDTree(points)
+        core = np.zeros(n, dtype=bool)
+        for c in range(len(unique_keys)):
+            if counts[c] >= self.min_samples:
+                core[members(c)] = True
+            elif counts[neighbors[c]].sum() >= self.min_samples:
+                candidates = members(c)
+                core[candidates] = GridDBSCAN._count(tree, points[candidates], radius) >= self.min_samples
+
+        ###### UNION DE CELDAS NUCLEO ######
+        core_members = [None] * len(unique_keys)
+        core_trees = {}
+        for c in range(len(unique_keys)):
+            m = members(c)
+            core_members[c] = m[core[m]]
+
+        parent = np.arange(len(unique_keys))
+
+        def find(c):
+            while parent[c] != c:
+                parent[c] = parent[parent[c]]
+                c = parent[c]
+            return c
+
+        def tree_of(c):
+            if c not in core_trees:
+                core_trees[c] = cKDTree(points[core_members[c]])
+            return core_trees[c]
+
+        for c in range(len(unique_keys)):
+            if len(core_members[c]) == 0:
+                continue
+            for d in neighbors[c]:
+                if d <= c or len(core_members[d]) == 0:
+                    continue
+                a, b = find(c), find(d)
+                if a == b:
+                    continue
+                if tree_of(c).count_neighbors(tree_of(d), radius) > 0:
+                    parent[max(a, b)] = min(a, b)
+
+        ###### ETIQUETAS ######
+        core_indices = np.nonzero(core)[0]
+        if len(core_indices) > 0:
+            cell_of = np.empty(n, dtype=np.intp)
+            cell_of[order] = np.repeat(np.arange(len(unique_keys)), counts)
+            cell_roots = np.array([find(c) for c in range(len(unique_keys))])
+            roots = cell_roots[cell_of[core_indices]]
+
+            #
+            # Numerar los clusters en el orden en que sklearn los encuentra: por el primer punto
+            # núcleo (menor índice) de cada uno.
+            #
+            unique_roots, first = np.unique(roots, return_index=True)
+            rank = np.empty(len(unique_roots), dtype=np.intp)
+            rank[np.argsort(first, kind="mergesort")] = np.arange(len(unique_roots))
+            labels[core_indices] = rank[np.searchsorted(unique_roots, roots)]
+
+            # puntos borde: no núcleo pero a distancia *eps* de algún núcleo.
+            border = np.nonzero(~core)[0]
+            if len(border) > 0:
+                distances, nearest = cKDTree(points[core_indices]).query(points[border], k=1, distance_upper_bound=radius)
+                reachable = np.isfinite(distances)
+                labels[border[reachable]] = labels[core_indices[nearest[reachable]]]
+
+        self.labels_ = labels
+        self.core_sample_indices_ = core_indices
+
+        return self
+
+    @staticmethod
+    def _count(tree, points, radius):
+        try:
+            return tree.query_ball_point(points, radius, return_length=True)
+        except TypeError:
+            # versiones de scipy anteriores a 1.3.
+            return np.array([len(neighbors) for neighbors in tree.query_ball_point(points, radius)])
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+"""
+Clase perteneciente al módulo de procesamiento de datos e inferencias Ama.
+
+.. module:: gridder
+   :platform: Unix
+   :synopsis: Agregación de los gates de un barrido sobre una grilla cartesiana fija.
+
+.. moduleauthor:: Andreas P. Koenzen <akc@apkc.net>
+"""
+
+import ama.georef_cache as georef_cache
+import ama.grid_dbscan as grid_dbscan
+import numpy as np
+import threading
+
+from collections import OrderedDict
+
+__author__ = "Andreas P. Koenzen"
+__copyright__ = "Copyright 2016, Proyecto de Tesis / Universidad Católica de Asunción."
+__credits__ = "Andreas P. Koenzen"
+__license__ = "BSD"
+__version__ = "0.1"
+__maintainer__ = "Andreas P. Koenzen"
+__email__ = "akc@apkc.net"
+__status__ = "Prototype"
+
+
+class Gridder:
+    """
+    Agrega los gates de un barrido en celdas cuadradas de un plano centrado en el radar.
+
+    Cerca del radar los gates están mucho más juntos que la escala de los clusters, por lo tanto
+    agregarlos en celdas reduce la cantidad de puntos a agrupar y enviar. La celda de cada gate
+    solo depende de la geometría del radar, así que se calcula una sola vez por geometría y se
+    mantiene en un LRU en memoria. Las coordenadas de cada celda son el promedio de las de todos
+    sus gates, de esta forma no cambian de un barrido a otro.
+    """
+
+    def __init__(self):
+        pass
+
+    ###### OPCIONES DE GRILLA ######
+    MEMORY_ENTRIES = 11
+    """
+    int: La cantidad de geometrías a mantener en memoria. Por defecto una por cada capa del radar.
+    """
+    AGGREGATIONS = ("max", "mean")
+    """
+    tuple: Las funciones de agregación de reflectividades soportadas.
+    """
+
+    _entries = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def cells(azimuths, ranges, radar_latitude, radar_longitude, cell_size, elevation=None):
+        """
+        Devuelve la celda de cada gate de una capa y las coordenadas de cada celda.
+
+        :param azimuths: Vector de N elementos con los azimuts de cada fila.
+        :param ranges: Vector de M elementos con las distancias de cada columna.
+        :param radar_latitude: La latitud del radar.
+        :param radar_longitude: La longitud del radar.
+        :param cell_size: El lado de cada celda en metros.
+        :param elevation: El ángulo de elevación de la capa.
+
+        :return: Una matriz de NxM con el índice de la celda de cada gate y dos vectores con la \
+            latitud y longitud de cada celda.
+        """
+        key = "{0}.{1:g}".format(
+            georef_cache.GeorefCache.key(azimuths, ranges, radar_latitude, radar_longitude, elevation), cell_size)
+
+        with Gridder._lock:
+            if key in Gridder._entries:
+                geometry = Gridder._entries.pop(key)
+                Gridder._entries[key] = geometry  # mover al final, es el más reciente.
+                return geometry
+
+        lat, lon = georef_cache.GeorefCache.lookup(azimuths, ranges, radar_latitude, radar_longitude, elevation)
+        geometry = Gridder._compute(np.asarray(lat), np.asarray(lon), radar_latitude, radar_longitude, cell_size)
+
+        with Gridder._lock:
+            Gridder._entries[key] = geometry
+            while len(Gridder._entries) > Gridder.MEMORY_ENTRIES:
+                Gridder._entries.popitem(last=False)
+
+        return geometry
+
+    @staticmethod
+    def aggregate(dBZ, cells, cell_latitudes, cell_longitudes, aggregation="max"):
+        """
+        Agrega las reflectividades de los gates por celda.
+
+        :param dBZ: Vector con las reflectividades de los gates.
+        :param cells: Vector con el índice de la celda de cada gate.
+        :param cell_latitudes: Vector con la latitud de cada celda.
+        :param cell_longitudes: Vector con la longitud de cada celda.
+        :param aggregation: *max* o *mean*.
+
+        :return: Tres vectores con las dBZ, latitudes y longitudes de cada celda con datos, \
+            ordenados por celda.
+        """
+        if aggregation not in Gridder.AGGREGATIONS:
+            raise ValueError("Función de agregación no soportada: {0}".format(aggregation))
+
+        dBZ = np.asarray(dBZ, dtype=np.float64)
+        if len(dBZ) == 0:
+            return dBZ, np.zeros(0), np.zeros(0)
+
+        occupied, inverse = np.unique(cells, return_inverse=True)
+        if aggregation == "max":
+            order = np.argsort(inverse, kind="mergesort")
+            values = np.maximum.reduceat(dBZ[order], np.searchsorted(inverse[order], np.arange(len(occupied))))
+        else:
+            values = np.bincount(inverse, weights=dBZ) / np.bincount(inverse)
+
+        return np.round(values, 1), cell_latitudes[occupied], cell_longitudes[occupied]
+
+    @staticmethod
+    def clear():
+        """
+        Vacía el LRU en memoria.
+
+        :return: void
+        """
+        with Gridder._lock:
+            Gridder._entries.clear()
+
+    @staticmethod
+    def _compute(lat, lon, radar_latitude, radar_longitude, cell_size):
+        points = grid_dbscan.GridDBSCAN.project(lat.ravel(), lon.ravel(), radar_latitude, radar_longitude)
+        indices = np.floor(points * 1000. / cell_size).astype(np.int64)
+        indices -= indices.min(axis=0)
+
+        keys = indices[:, 1] * (indices[:, 0].max() + 1) + indices[:, 0]
+        unique_keys, cells = np.unique(keys, return_inverse=True)
+
+        counts = np.bincount(cells).astype(np.float64)
+        cell_latitudes = np.round(np.bincount(cells, weights=lat.ravel()) / counts, 5)
+        cell_longitudes = np.round(np.bincount(cells, weights=lon.ravel()) / counts, 5)
+
+        return cells.reshape(lat.shape), cell_latitudes, cell_longitudes
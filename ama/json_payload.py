@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+"""
+Clase perteneciente al módulo de procesamiento de datos e inferencias Ama.
+
+.. module:: json_payload
+   :platform: Unix
+   :synopsis: Serialización del JSON que se envía al Controlador.
+
+.. moduleauthor:: Andreas P. Koenzen <akc@apkc.net>
+"""
+
+import gzip
+import io
+import json
+import numpy as np
+
+__author__ = "Andreas P. Koenzen"
+__copyright__ = "Copyright 2016, Proyecto de Tesis / Universidad Católica de Asunción."
+__credits__ = "Andreas P. Koenzen"
+__license__ = "BSD"
+__version__ = "0.1"
+__maintainer__ = "Andreas P. Koenzen"
+__email__ = "akc@apkc.net"
+__status__ = "Prototype"
+
+
+class PayloadBuilder:
+    """
+    Serializador del JSON que se envía al Controlador.
+
+    Los puntos se ordenan con un *argsort* sobre la matriz y se formatean por bloques de filas,
+    escribiendo el resultado directamente en un archivo o buffer, opcionalmente comprimido con gzip.
+
+    Formato del JSON a generar:
+    ===========================
+    {
+        "fechaCarga": "2017-04-17T16:35:01.150Z",
+        "notificar": "True" | "False",
+        "centroides": ["-25.23864:-57.52254", ..., "-25.23864:-57.52254"],
+        "zonas": [["Asunción", "Luque"], ..., []],
+        "celdas": [{"id": 12, "edad": 3, "velocidad": [25.1, -3.4], "crecimiento": 4.0, "tendencia": 1.5}, ...],
+        "arrayDatos": ["6.0;-25.23864:-57.52254", ..., "7.0;-25.23864:-57.52254"]
+    }
+
+    La lista *zonas* tiene las zonas de notificación afectadas por cada cluster, en el mismo
+    orden que *centroides*, y solo se incluye cuando hay zonas configuradas. La lista *celdas* tiene,
+    también en ese orden, el identificador, la edad en barridos, la velocidad Este/Norte en km/h y el
+    crecimiento del área (km²/h) y de la reflectividad máxima (dBZ/h) de cada celda, y solo se incluye
+    cuando el seguimiento de celdas está habilitado.
+
+    En modo diferencias (ver *DeltaEncoder*) se agregan *secuencia* y *tipo*. Un cuadro completo
+    lleva todos los puntos en *arrayDatos*, mientras que un delta reemplaza *arrayDatos* por los
+    puntos nuevos, los que cambiaron de reflectividad y las coordenadas de los que ya no están:
+    {
+        ...
+        "secuencia": 12,
+        "tipo": "delta",
+        "agregados": ["6.0;-25.23864:-57.52254", ...],
+        "modificados": ["7.0;-25.23864:-57.52254", ...],
+        "eliminados": ["-25.23864:-57.52254", ...]
+    }
+    """
+
+    def __init__(self, compress=False):
+        self.compress = compress
+
+    CHUNK_SIZE = 10000
+    """
+    int: La cantidad de filas a formatear por bloque.
+    """
+    CENTROID_FORMAT = "\"%.5f:%.5f\""
+    """
+    string: El formato de cada centroide. Latitud y Longitud.
+    """
+    POINT_FORMAT = "\"%.1f;%.5f:%.5f\""
+    """
+    string: El formato de cada punto. dBZ, Latitud y Longitud.
+    """
+
+    def build(self, scan_time, notify, centroids, clustered, zones=None, cells=None, delta=None):
+        """
+        Genera el JSON completo en memoria.
+
+        :param scan_time: La fecha/hora de los datos.
+        :param notify: Si se deben enviar notificaciones.
+        :param centroids: Los centroides como tuplas o matriz de (Latitud, Longitud, dBZ).
+        :param clustered: Los puntos agrupados como tuplas o matriz de (Latitud, Longitud, dBZ).
+        :param zones: Una lista con los nombres de las zonas afectadas por cada cluster. *None* \
+            para no incluir la lista.
+        :param cells: Una lista con el diccionario de seguimiento de cada cluster devuelto por \
+            *StormTracker.update*. *None* para no incluir la lista.
+        :param delta: El cuadro devuelto por *DeltaEncoder.encode*, que reemplaza a *clustered*. \
+            *None* para enviar todos los puntos sin secuencia.
+
+        :return: Los bytes del JSON, comprimidos si el serializador fue creado con *compress*.
+        """
+        buffer = io.BytesIO()
+        self.write(buffer, scan_time, notify, centroids, clustered, zones, cells, delta)
+
+        return buffer.getvalue()
+
+    def write(self, out, scan_time, notify, centroids, clustered, zones=None, cells=None, delta=None):
+        """
+        Escribe el JSON en un archivo o buffer abierto en modo binario.
+
+        :param out: El archivo o buffer destino.
+        :param scan_time: La fecha/hora de los datos.
+        :param notify: Si se deben enviar notificaciones.
+        :param centroids: Los centroides como tuplas o matriz de (Latitud, Longitud, dBZ).
+        :param clustered: Los puntos agrupados como tuplas o matriz de (Latitud, Longitud, dBZ).
+        :param zones: Una lista con los nombres de las zonas afectadas por cada cluster. *None* \
+            para no incluir la lista.
+        :param cells: Una lista con el diccionario de seguimiento de cada cluster devuelto por \
+            *StormTracker.update*. *None* para no incluir la lista.
+        :param delta: El cuadro devuelto por *DeltaEncoder.encode*, que reemplaza a *clustered*. \
+            *None* para enviar todos los puntos sin secuencia.
+
+        :return: void
+        """
+        stream = gzip.GzipFile(fileobj=out, mode="wb") if self.compress else out
+        try:
+            centroids = PayloadBuilder._matrix(centroids)
+
+            PayloadBuilder._write(stream, "{{\"fechaCarga\":\"{0}\",".format(scan_time))
+            PayloadBuilder._write(stream, "\"notificar\":\"{0}\",".format(notify))
+
+            PayloadBuilder._write(stream, "\"centroides\":[")
+            self._write_rows(stream, self.CENTROID_FORMAT, centroids[:, [0, 1]])
+            PayloadBuilder._write(stream, "],")
+
+            if zones is not None:
+                PayloadBuilder._write(stream, "\"zonas\":{0},".format(json.dumps([list(names) for names in zones], separators=(",", ":"))))
+
+            if cells is not None:
+                PayloadBuilder._write(stream, "\"celdas\":{0},".format(json.dumps(cells, separators=(",", ":"), sort_keys=True)))
+
+            if delta is not None:
+                PayloadBuilder._write(stream, "\"secuencia\":{0},\"tipo\":\"{1}\",".format(delta["secuencia"], delta["tipo"]))
+                if delta["tipo"] == "completo":
+                    clustered = delta["puntos"]
+
+            if delta is None or delta["tipo"] == "completo":
+                clustered = PayloadBuilder._matrix(clustered)
+
+                # ordenar por dBZ (índice 2) manteniendo el orden original entre valores iguales.
+                clustered = clustered[np.argsort(clustered[:, 2], kind="mergesort")]
+
+                PayloadBuilder._write(stream, "\"arrayDatos\":[")
+                self._write_rows(stream, self.POINT_FORMAT, clustered[:, [2, 0, 1]])
+                PayloadBuilder._write(stream, "]}")
+            else:
+                for name in ("agregados", "modificados"):
+                    PayloadBuilder._write(stream, "\"{0}\":[".format(name))
+                    self._write_rows(stream, self.POINT_FORMAT, PayloadBuilder._matrix(delta[name])[:, [2, 0, 1]])
+                    PayloadBuilder._write(stream, "],")
+
+                PayloadBuilder._write(stream, "\"eliminados\":[")
+                self._write_rows(stream, self.CENTROID_FORMAT, np.asarray(delta["eliminados"], dtype=np.float64).reshape(-1, 2))
+                PayloadBuilder._write(stream, "]}")
+        finally:
+            if self.compress:
+                stream.close()  # escribe el final del gzip, pero no cierra *out*.
+
+    def _write_rows(self, stream, row_format, rows):
+        for start in range(0, len(rows), self.CHUNK_SIZE):
+            chunk = rows[start:start + self.CHUNK_SIZE]
+            text = ",".join([row_format] * len(chunk)) % tuple(chunk.ravel().tolist())
+            if start > 0:
+                text = "," + text
+
+            PayloadBuilder._write(stream, text)
+
+    @staticmethod
+    def _matrix(rows):
+        return np.asarray(rows, dtype=np.float64).reshape(-1, 3)
+
+    @staticmethod
+    def _write(stream, text):
+        if not isinstance(text, bytes):
+            text = text.encode("utf-8")
+
+        stream.write(text)
@@ -10,14 +10,25 @@ Clase perteneciente al módulo de procesamiento de datos e inferencias Ama.
 .. moduleauthor:: Andreas P. Koenzen <akc@apkc.net>
 """
 
+import ama.accumulator as accumulator
+import ama.ama_binary as ama_binary
+import ama.batch_processor as batch
+import ama.correlator as correlator
+import ama.delta as delta
+import ama.filters as filters
+import ama.gamic_reader as gamic_reader
+import ama.geofence as geofence
+import ama.json_payload as json_payload
+import ama.region as roi
+import ama.renderer as renderer
+import ama.sweep_buffer as sweep_buffer
+import ama.tracker as tracker
+import ama.uploader as uploader
 import ama.utils as utils
-import base64
-import matplotlib.pyplot as plt
+import ama.volume as volume
 import ntpath
 import numpy as np
-import pylab as pl
 import os
-import requests
 import sys
 import time
 import wradlib as wrl
@@ -70,24 +81,308 @@ class Processor:
     """
     float: El valor máximo para las reflectividades. Valores mayores a este son obviados. 
     """
+    GRID_CELL_SIZE = 0
+    """
+    float: El lado en metros de las celdas en las que se agregan los gates antes de agrupar y enviar. \
+        0 para utilizar cada gate.
+    """
+    GRID_AGGREGATION = "max"
+    """
+    string: La función de agregación de las celdas, *max* o *mean*.
+    """
+    DEDUPLICATION = None
+    """
+    string: La forma de combinar los gates con las mismas coordenadas, *max*, *mean* o *first*. *None* \
+        para no combinarlos.
+    """
+    COMPRESS_PAYLOAD = False
+    """
+    boolean: Bandera para comprimir con gzip el JSON que se envía al Controlador.
+    """
+    DELTA_PAYLOAD = False
+    """
+    boolean: Bandera para enviar al Controlador solo los puntos que cambiaron desde el barrido anterior, \
+        con un cuadro completo cada *DeltaEncoder.KEYFRAME_INTERVAL* envíos.
+    """
+    ACCUMULATE_RAINFALL = False
+    """
+    boolean: Bandera para actualizar los acumulados de lluvia con cada archivo nuevo. Solo para modo *run*.
+    """
+    TRACK_CELLS = False
+    """
+    boolean: Bandera para seguir las celdas de tormenta entre barridos e incluir sus identificadores, \
+        velocidades y crecimiento en el JSON que se envía al Controlador.
+    """
+    SWEEP_BUFFER_SIZE = 0
+    """
+    int: La cantidad de barridos a guardar por capa en el buffer circular con cada archivo nuevo. Solo \
+        para modo *run*. 0 para deshabilitar el buffer.
+    """
+    THUMBNAIL_SIZE = 0
+    """
+    int: El lado en píxeles de las imágenes a generar sin matplotlib (miniaturas). 0 para generar \
+        las imágenes completas con matplotlib.
+    """
+
+    ###### OPCIONES DE FILTRADO ######
+    SPECKLE_MINIMUM_NEIGHBORS = 0
+    """
+    int: La cantidad mínima de vecinos con eco de cada gate. 0 para deshabilitar el filtro de speckle.
+    """
+    USE_CLUTTER_MASK = False
+    """
+    boolean: Descartar los gates marcados en la máscara de clutter aprendida con *--learn-clutter*.
+    """
+    MINIMUM_RANGE = 0.
+    """
+    float: La distancia mínima al radar en kilómetros. Los gates más cercanos son obviados.
+    """
+    BLOCKED_SECTORS = []
+    """
+    list: Tuplas (desde, hasta) con los sectores de azimut en grados a obviar.
+    """
+
+    ###### OPCIONES DE REGION DE INTERES ######
+    ROI_MAXIMUM_RANGE = None
+    """
+    float: La distancia máxima al radar en kilómetros de los gates a procesar. *None* para procesar todo el barrido.
+    """
+    ROI_BBOX = None
+    """
+    tuple: Rectángulo (Latitud mínima, Longitud mínima, Latitud máxima, Longitud máxima) de los gates a procesar.
+    """
+    NOTIFICATION_RADIUS = 50.
+    """
+    float: La distancia al radar en kilómetros dentro de la cual un centroide genera notificaciones.
+    """
+    GEOFENCE_FILE = None
+    """
+    string: El PATH de un archivo GeoJSON con las zonas de notificación. Si se define, se notifica \
+        cuando algún cluster afecta a alguna zona en lugar de utilizar *NOTIFICATION_RADIUS*.
+    """
+
+    ###### OPCIONES DE VOLUMEN ######
+    CAPPI_ALTITUDE = None
+    """
+    float: La altitud sobre el nivel del mar en metros del CAPPI a generar junto con el máximo en columna \
+        al procesar todas las capas. *None* para no generarlo.
+    """
+
+    @staticmethod
+    def filter_pipeline(layer):
+        """
+        Arma la cadena de filtros configurada para una capa.
+
+        :param layer: La capa de datos a procesar.
+
+        :return: Un *FilterPipeline* o *None* si no hay filtros habilitados.
+        """
+        pipeline = filters.FilterPipeline()
+        if Processor.MINIMUM_RANGE > 0 or len(Processor.BLOCKED_SECTORS) > 0:
+            pipeline.filters.append(filters.SectorFilter(Processor.MINIMUM_RANGE, None, Processor.BLOCKED_SECTORS))
+        if Processor.USE_CLUTTER_MASK:
+            clutter = filters.ClutterFilter.load(layer)
+            if clutter is not None:
+                pipeline.filters.append(clutter)
+        if Processor.SPECKLE_MINIMUM_NEIGHBORS > 0:
+            # al final, para descartar también los gates que quedaron aislados por los demás filtros.
+            pipeline.filters.append(filters.SpeckleFilter(Processor.SPECKLE_MINIMUM_NEIGHBORS))
+
+        return pipeline if len(pipeline) > 0 else None
+
+    @staticmethod
+    def region():
+        """
+        Arma la región de interés configurada.
+
+        :return: Una *RegionOfInterest* o *None* si se procesa todo el barrido.
+        """
+        if Processor.ROI_MAXIMUM_RANGE is None and Processor.ROI_BBOX is None:
+            return None
+
+        return roi.RegionOfInterest(Processor.ROI_MAXIMUM_RANGE, Processor.ROI_BBOX)
+
+    def learn_clutter(self, origin, layer):
+        """
+        Aprende la máscara de clutter de una capa a partir de todos los archivos de un directorio,
+        idealmente barridos sin lluvia, y la guarda en AMA_EXPORT_DATA.
+
+        :param origin: El directorio origen de datos.
+        :param layer: La capa de datos a procesar. Cada capa corresponde a un ángulo de elevación del radar.
+
+        :return: void
+        """
+        origin = os.path.join(os.environ["WRADLIB_DATA"], origin)
+        matches = utils.Utils.files_for_processing(origin, self.QT, self.FILE_SIZE_LIMIT)
+        layer_key = u"SCAN{0}".format(layer)
+
+        learner = filters.ClutterLearner()
+        for item in matches:
+            try:
+                data, metadata = Processor.process(item, layer=layer)
+                if not learner.add(data[layer_key][u"Z"]["data"]):
+                    print(utils.Colors.WARNING + "WARN: Geometría distinta, obviando \"{0}\".".format(item) + utils.Colors.ENDC)
+            except Exception as e:
+                print(utils.Colors.FAIL + "ERROR: Procesando \"{0}\". DESC: {1}".format(item, e) + utils.Colors.ENDC)
+
+        if learner.scans == 0:
+            print(utils.Colors.FAIL + "ERROR: No hay archivos para aprender el clutter en *{0}*!".format(origin) + utils.Colors.ENDC)
+            return
+
+        clutter = learner.filter()
+        path = clutter.save(layer)
+        print(utils.Colors.BOLD + "INFO: Máscara de clutter con {0} gates de {1} barridos guardada en {2}.".format(
+            np.count_nonzero(clutter.clutter), learner.scans, path) + utils.Colors.ENDC)
+
+    def accumulate_rainfall(self, filename, layer, descriptor=None):
+        """
+        Integra la intensidad de lluvia de un archivo en los acumulados de una capa.
+
+        :param filename: El nombre del archivo a procesar.
+        :param layer: La capa de datos a procesar. Cada capa corresponde a un ángulo de elevación del radar.
+        :param descriptor: El descriptor del archivo devuelto por *Utils.should_process_file*.
+
+        :return: Tupla con el *RainfallAccumulator* y los metadatos de la capa.
+        """
+        data, metadata = Processor.process(filename, layer=layer, descriptor=descriptor)
+
+        return self.accumulate_scan(data, metadata, layer)
+
+    def accumulate_scan(self, data, metadata, layer):
+        """
+        Integra la intensidad de lluvia de un barrido ya decodificado en los acumulados de una capa.
+
+        :param data: Los datos devueltos por *Processor.process*.
+        :param metadata: Los metadatos devueltos por *Processor.process*.
+        :param layer: La capa de datos a procesar.
+
+        :return: Tupla con el *RainfallAccumulator* y los metadatos de la capa.
+        """
+        layer_key = u"SCAN{0}".format(layer)
+
+        values = data[layer_key][u"Z"]["data"]
+        totals = accumulator.RainfallAccumulator.default(layer, values.shape)
+        if totals.add(accumulator.RainfallAccumulator.rain_rate(values),
+                      accumulator.RainfallAccumulator.epoch(metadata[layer_key]["Time"])):
+            print(utils.Colors.BOLD + "INFO: Acumulados al {0}: {1}".format(metadata[layer_key]["Time"], ", ".join(
+                "{0}h máx. {1:.1f}mm".format(window // 3600, float(np.max(totals.accumulation(window))))
+                for window in totals.WINDOWS)) + utils.Colors.ENDC)
+
+        return totals, metadata[layer_key]
+
+    def ingest_scan(self, data, metadata, layer):
+        """
+        Agrega la capa ya decodificada de un archivo nuevo a los acumulados de lluvia y al buffer
+        de barridos, según *ACCUMULATE_RAINFALL* y *SWEEP_BUFFER_SIZE*.
+
+        :param data: Los datos devueltos por *Processor.process*.
+        :param metadata: Los metadatos devueltos por *Processor.process*.
+        :param layer: La capa de datos a procesar. Cada capa corresponde a un ángulo de elevación del radar.
+
+        :return: void
+        """
+        if self.ACCUMULATE_RAINFALL:
+            self.accumulate_scan(data, metadata, layer)
+        if self.SWEEP_BUFFER_SIZE:
+            sweep_buffer.SweepBuffer.default(layer, self.SWEEP_BUFFER_SIZE).add(data, metadata)
+
+    def sweep_window_maximum(self, destination, layer, seconds=None, binary=False):
+        """
+        Correlaciona la reflectividad máxima de cada gate sobre los últimos barridos guardados en
+        el buffer de una capa, sin leer archivos.
+
+        :param destination: El nombre del directorio en donde colocar el archivo resultante.
+        :param layer: La capa de datos a procesar. Cada capa corresponde a un ángulo de elevación del radar.
+        :param seconds: La duración de la ventana en segundos que termina en el barrido más reciente. \
+            *None* para todos los barridos del buffer.
+        :param binary: Generar el archivo en formato binario (*.amab*).
+
+        :return: void
+        """
+        buffer = sweep_buffer.SweepBuffer.default(layer)
+        if len(buffer) == 0:
+            print(utils.Colors.FAIL + "ERROR: El buffer de barridos de la capa {0} está vacío.".format(layer) + utils.Colors.ENDC)
+            return
+
+        slots = buffer.window(seconds)
+        data, metadata = buffer.scan(buffer.maximum(seconds))
+        dBZ, lat, lon = correlator.Correlator.correlate_scan(data, metadata, layer, self.MINIMUM_REFLECTIVITY,
+                                                             self.MAXIMUM_REFLECTIVITY, None, self.GRID_CELL_SIZE,
+                                                             self.GRID_AGGREGATION, Processor.filter_pipeline(layer),
+                                                             Processor.region(), self.DEDUPLICATION)
+
+        destination = os.path.join(os.environ["AMA_EXPORT_DATA"], destination)
+        if not os.path.exists(destination):
+            os.makedirs(destination)
+        path = os.path.join(destination, "sweep_max.layer_{0}.{1}".format(layer, "amab" if binary else "ama"))
+        self.write_correlation(path, dBZ, lat, lon, metadata, layer, binary)
+
+        print(utils.Colors.BOLD + "INFO: Máximo de {0} barridos ({1} a {2}) con {3} puntos guardado en {4}.".format(
+            len(slots), buffer.index["times"][slots[0]], buffer.index["times"][slots[-1]], len(dBZ), path) + utils.Colors.ENDC)
+
+    def process_directory_accumulate_rainfall(self, origin, destination, layer):
+        """
+        Integra en orden todos los archivos de un directorio en los acumulados de lluvia de una capa
+        y genera una imagen por cada ventana de acumulación.
+
+        :param origin: El directorio origen de datos.
+        :param destination: El directorio destino de las imagenes. Vacío para no generarlas.
+        :param layer: La capa de datos a procesar. Cada capa corresponde a un ángulo de elevación del radar.
+
+        :return: void
+        """
+        origin = os.path.join(os.environ["WRADLIB_DATA"], origin)
+        matches = utils.Utils.files_for_processing(origin, self.QT, self.FILE_SIZE_LIMIT)
+
+        totals, scan = None, None
+        for item in matches:
+            try:
+                totals, scan = self.accumulate_rainfall(item, layer)
+            except Exception as e:
+                print(utils.Colors.FAIL + "ERROR: Procesando \"{0}\". DESC: {1}".format(item, e) + utils.Colors.ENDC)
+
+        if totals is None:
+            print(utils.Colors.FAIL + "ERROR: No hay archivos para acumular en *{0}*!".format(origin) + utils.Colors.ENDC)
+            return
+
+        if destination:
+            destination = os.path.join(os.environ["AMA_EXPORT_DATA"], destination)
+            if not os.path.exists(destination):
+                os.makedirs(destination)
+
+            for window in totals.WINDOWS:
+                self.render_image(totals.accumulation(window), scan, "accumulation",
+                                  os.path.join(destination, "accumulation_layer_{0}_{1}h.png".format(layer, window // 3600)))
 
     @staticmethod
-    def process(filename, show_info=True):
+    def process(filename, show_info=True, layer=None, moment=u"Z", descriptor=None):
         """
         Procesa un archivo de datos de radar en formato GAMIC HDF5 y devuelve
         los datos.
         
         Esta función esta diseñada para archivos de "Polaridad Simple y Doble".
 
+        Si se especifica una capa solo se decodifica esa capa y el momento pedido, y el archivo se
+        cierra antes de volver, por lo tanto las demás capas ya no pueden ser accedidas. Para
+        recorrer varias capas de un archivo abierto utilizar *GamicReader* directamente.
+
         :param filename: El nombre del archivo a procesar. El formato debe ser \
             *WRADLIB_DATA/<filename>*.
         :param show_info: Si debe mostrar mensajes de información o no.
+        :param layer: La capa de datos a decodificar. *None* para decodificar todo el volumen.
+        :param moment: El momento a decodificar junto con la capa. Por defecto la reflectividad (*Z*).
+        :param descriptor: El descriptor devuelto por *Utils.should_process_file*, para no volver a \
+            leer la estructura del archivo.
 
         :return: Los datos de radar procesados.
         """
         filename = wrl.util.get_wradlib_data_file(filename)
         start = time.time()
-        data, metadata = wrl.io.read_GAMIC_hdf5(filename)
+        if layer is None:
+            data, metadata = wrl.io.read_GAMIC_hdf5(filename)
+        else:
+            with gamic_reader.GamicReader(filename) as reader:
+                data, metadata = reader.read(layer, moment, descriptor)
         end = time.time()
 
         if show_info == 1:
@@ -95,7 +390,7 @@ class Processor:
 
         return data, metadata
 
-    def process_directory_generate_raw_images_from_reflectivity(self, origin, destination):
+    def process_directory_generate_raw_images_from_reflectivity(self, origin, destination, workers=1):
         """
         Procesa todos los archivos que se encuentran en el directorio
         de datos de forma recursiva y genera imagenes para cada set de datos
@@ -105,42 +400,13 @@ class Processor:
 
         :param origin: El directorio origen de datos.
         :param destination: El directorio destino de las imagenes.
+        :param workers: La cantidad de procesos a utilizar.
 
         :return: void
         """
-        origin = os.path.join(os.environ["WRADLIB_DATA"], origin)
-        destination = os.path.join(os.environ["AMA_EXPORT_DATA"], destination)
-        matches = utils.Utils.files_for_processing(origin, self.QT, self.FILE_SIZE_LIMIT)
-
-        if len(matches) > 0:
-            for item in matches:
-                data, metadata = Processor.process(item)
-                fig = pl.figure(figsize=(10, 8))
-                wrl.vis.plot_cg_ppi(data[u"SCAN0"][u"Z"]["data"], fig=fig)
-
-                if not os.path.exists(destination):
-                    print(utils.Colors.WARNING + "WARN: Destino no existe, creando ..." + utils.Colors.ENDC)
-                    os.makedirs(destination)
-
-                clean_filename = os.path.splitext(ntpath.basename(item))[0]
-                pl.savefig(os.path.join(destination, (clean_filename + ".png")), bbox_inches="tight")
-                plt.close(fig)
-
-                if self.DEBUG == 1:
-                    print(metadata)
-                    print("------")
-                    print(data)
-
-                    for index, item in enumerate(matches):
-                        print("{0} => {1}".format(index, item))
-
-                    for index, item in enumerate(matches):
-                        print("{0} => {1}".format(index, os.path.splitext(ntpath.basename(item))[0]))
-        else:
-            print(utils.Colors.FAIL + "ERROR: No hay archivos para procesar en *{0}*!".format(
-                os.environ["WRADLIB_DATA"] + origin) + utils.Colors.ENDC)
+        self.process_directory("generate_raw_image_from_reflectivity", origin, destination, workers)
 
-    def process_directory_generate_raw_images_from_rainfall_intensity(self, origin, destination):
+    def process_directory_generate_raw_images_from_rainfall_intensity(self, origin, destination, workers=1):
         """
         Procesa todos los archivos que se encuentran en el directorio
         de datos de forma recursiva y genera imagenes para cada set de datos
@@ -150,6 +416,21 @@ class Processor:
 
         :param origin: El directorio origen de datos.
         :param destination: El directorio destino de las imagenes.
+        :param workers: La cantidad de procesos a utilizar.
+
+        :return: void
+        """
+        self.process_directory("generate_raw_image_from_rainfall_intensity", origin, destination, workers)
+
+    def process_directory(self, method, origin, destination, workers=1):
+        """
+        Ejecuta un método de generación de imágenes sobre todos los archivos de un directorio,
+        repartiéndolos entre un pool de procesos.
+
+        :param method: El nombre del método a ejecutar por cada archivo.
+        :param origin: El directorio origen de datos.
+        :param destination: El directorio destino de las imagenes.
+        :param workers: La cantidad de procesos a utilizar.
 
         :return: void
         """
@@ -158,46 +439,87 @@ class Processor:
         matches = utils.Utils.files_for_processing(origin, self.QT, self.FILE_SIZE_LIMIT)
 
         if len(matches) > 0:
-            for item in matches:
-                data, metadata = Processor.process(item)
-
-                Z = wrl.trafo.idecibel(data[u"SCAN0"][u"Z"]["data"])
-                R = wrl.zr.z2r(Z, a=200., b=1.6)
-
-                fig = pl.figure(figsize=(10, 8))
-                ax, cf = wrl.vis.plot_ppi(R, cmap="spectral")
-                pl.xlabel("Este del Radar (km)")
-                pl.ylabel("Norte del Radar (km)")
-                pl.title("Radar DINAC Fac. Veterinaria UNA\n6 min. profundidad de lluvia, " + metadata[u"SCAN0"]["Time"])
-                cb = pl.colorbar(cf, shrink=0.8)
-                cb.set_label("mm/h")
-                pl.xlim(-128, 128)
-                pl.ylim(-128, 128)
-                pl.grid(color="grey")
-
-                if not os.path.exists(destination):
-                    print(utils.Colors.WARNING + "WARN: Destino no existe, creando ..." + utils.Colors.ENDC)
-                    os.makedirs(destination)
-
-                clean_filename = os.path.splitext(ntpath.basename(item))[0]
-                pl.savefig(os.path.join(destination, (clean_filename + ".png")), bbox_inches="tight")
-                plt.close(fig)
-
-                if self.DEBUG == 1:
-                    print(metadata)
-                    print("------")
-                    print(data)
-
-                    for index, item in enumerate(matches):
-                        print("{0} => {1}".format(index, item))
-
-                    for index, item in enumerate(matches):
-                        print("{0} => {1}".format(index, os.path.splitext(ntpath.basename(item))[0]))
+            if not os.path.exists(destination):
+                print(utils.Colors.WARNING + "WARN: Destino no existe, creando ..." + utils.Colors.ENDC)
+                os.makedirs(destination)
+
+            if self.DEBUG == 1:
+                for index, item in enumerate(matches):
+                    print("{0} => {1}".format(index, item))
+
+                for index, item in enumerate(matches):
+                    print("{0} => {1}".format(index, os.path.splitext(ntpath.basename(item))[0]))
+
+            batch.BatchProcessor(workers).run(method, matches, (destination,))
         else:
             print(utils.Colors.FAIL + "ERROR: No hay archivos para procesar en *{0}*!".format(
                 os.environ["WRADLIB_DATA"] + origin) + utils.Colors.ENDC)
 
-    def single_correlate_dbz_to_location(self, filename, destination, layer):
+    def generate_raw_image_from_reflectivity(self, filename, destination):
+        """
+        Genera la imagen de reflectividad de un archivo.
+
+        :param filename: El archivo a procesar.
+        :param destination: El directorio destino de la imagen.
+
+        :return: void
+        """
+        data, metadata = Processor.process(filename, layer=0)
+
+        clean_filename = os.path.splitext(ntpath.basename(filename))[0]
+        self.render_image(data[u"SCAN0"][u"Z"]["data"], metadata[u"SCAN0"], "reflectivity",
+                          os.path.join(destination, (clean_filename + ".png")))
+
+        if self.DEBUG == 1:
+            print(metadata)
+            print("------")
+            print(data)
+
+    def generate_raw_image_from_rainfall_intensity(self, filename, destination):
+        """
+        Genera la imagen de intensidad de lluvia de un archivo.
+
+        :param filename: El archivo a procesar.
+        :param destination: El directorio destino de la imagen.
+
+        :return: void
+        """
+        data, metadata = Processor.process(filename, layer=0)
+
+        # la imagen utiliza la relación Z-R sin limitar, los acumulados utilizan la tabla de intensidades.
+        Z = wrl.trafo.idecibel(data[u"SCAN0"][u"Z"]["data"])
+        R = wrl.zr.z2r(Z, a=200., b=1.6)
+
+        clean_filename = os.path.splitext(ntpath.basename(filename))[0]
+        self.render_image(R, metadata[u"SCAN0"], "rainfall", os.path.join(destination, (clean_filename + ".png")))
+
+        if self.DEBUG == 1:
+            print(metadata)
+            print("------")
+            print(data)
+
+    def render_image(self, values, scan, product, path):
+        """
+        Genera la imagen PNG de una capa, con matplotlib o como miniatura según *THUMBNAIL_SIZE*.
+
+        En ambos casos la figura o el mapa de píxeles de la geometría del radar se construye una
+        sola vez por proceso y por cada archivo solo se actualizan los datos.
+
+        :param values: Matriz de NxM con los valores a graficar.
+        :param scan: Los metadatos de la capa, ej. *metadata[u"SCAN0"]*.
+        :param product: El producto a graficar, *reflectivity*, *rainfall* o *accumulation*.
+        :param path: El PATH del archivo PNG a generar.
+
+        :return: void
+        """
+        if self.THUMBNAIL_SIZE:
+            limit = renderer.PPIRenderer.PRODUCTS[product]["limit"]
+            renderer.ThumbnailRenderer.default(scan["az"], scan["r"], product, self.THUMBNAIL_SIZE, limit).render(
+                values, path)
+        else:
+            renderer.PPIRenderer.default(scan["az"], scan["r"], product).render(values, path, scan["Time"])
+
+    def single_correlate_dbz_to_location(self, filename, destination, layer, descriptor=None, binary=False):
         """
         Esta funcion realiza la correlacion entre dBZ y sus coordenadas geograficas en el mapa.
         
@@ -211,59 +533,150 @@ class Processor:
         Ejemplo:
             dBZ,latitude:longitude
 
+        En modo binario se genera en cambio un archivo *.amab* con el formato columnar de
+        *AmaBinary*.
+
         :param filename: El nombre del archivo a procesar.
         :param destination: El nombre del directorio en donde colocar los archivos resultantes.
         :param layer: La capa de datos a procesar. Cada capa corresponde a un ángulo de elevación del radar.
+        :param descriptor: El descriptor del archivo devuelto por *Utils.should_process_file*.
+        :param binary: Generar el archivo en formato binario.
 
         :return: void
         """
         start = time.time()
-        cdata = ""
         destination = os.path.join(os.environ["AMA_EXPORT_DATA"], destination,
-                                   (os.path.splitext(ntpath.basename(filename))[0] + ".layer_{0}.ama".format(layer)))
-        data, metadata = Processor.process(filename)
-        clean_data = []
-        layer_key = u"SCAN{0}".format(layer)
+                                   (os.path.splitext(ntpath.basename(filename))[0] + ".layer_{0}.{1}".format(
+                                       layer, "amab" if binary else "ama")))
+        data, metadata = Processor.process(filename, layer=layer, descriptor=descriptor)
 
-        file = open(destination, "w")
+        dBZ, lat, lon = correlator.Correlator.correlate_scan(data, metadata, layer, self.MINIMUM_REFLECTIVITY,
+                                                             self.MAXIMUM_REFLECTIVITY, None, self.GRID_CELL_SIZE,
+                                                             self.GRID_AGGREGATION, Processor.filter_pipeline(layer),
+                                                             Processor.region(), self.DEDUPLICATION)
+        self.write_correlation(destination, dBZ, lat, lon, metadata, layer, binary)
 
-        radar_latitude = float(metadata["VOL"]["Latitude"])
-        radar_longitude = float(metadata["VOL"]["Longitude"])
+        end = time.time()
+
+        print(utils.Colors.BOLD + "---" + utils.Colors.ENDC)
+        print(utils.Colors.BOLD + "Tamaño Datos Enviados: {0}kb".format(os.path.getsize(destination) / 1024) + utils.Colors.ENDC)
+        print(utils.Colors.BOLD + "Tiempo de Procesamiento: {0:.1f} segundos".format((end - start)) + utils.Colors.ENDC)
 
-        for (row, column), value in np.ndenumerate(data[layer_key][u"Z"]["data"]):
-            if value > -64.:
-                rng = metadata[layer_key]["r"][column]
-                azi = metadata[layer_key]["az"][row]
-                dBZ = value
-                lon, lat = wrl.georef.polar2lonlat(rng, azi, (radar_longitude, radar_latitude))
+    def write_correlation(self, destination, dBZ, lat, lon, metadata, layer, binary=False, time_key=None):
+        """
+        Escribe una correlación ordenada por dBZ en un archivo *.ama* o *.amab*.
 
-                # realizar los redondeos
-                dBZ_value = float("{0:.1f}".format(dBZ))
-                latitude_value = float("{0:.5f}".format(lat))
-                longitude_value = float("{0:.5f}".format(lon))
+        :param destination: El PATH del archivo a generar.
+        :param dBZ: Vector con las reflectividades.
+        :param lat: Vector con las latitudes.
+        :param lon: Vector con las longitudes.
+        :param metadata: Los metadatos devueltos por *Processor.process*.
+        :param layer: El número de capa a guardar en la cabecera del formato binario.
+        :param binary: Generar el archivo en formato binario.
+        :param time_key: La capa de la que tomar la hora del barrido. Por defecto *layer*.
 
-                if dBZ_value >= self.MINIMUM_REFLECTIVITY and dBZ_value <= self.MAXIMUM_REFLECTIVITY:
-                    clean_data.append((dBZ_value, latitude_value, longitude_value))
+        :return: void
+        """
+        # ordenar por dBZ manteniendo el orden original entre valores iguales.
+        order = np.argsort(dBZ, kind="mergesort")
+        rows = np.column_stack((dBZ[order], lat[order], lon[order]))
+
+        if binary:
+            layer_key = u"SCAN{0}".format(layer if time_key is None else time_key)
+            ama_binary.AmaBinary.write(destination, rows[:, 0], rows[:, 1], rows[:, 2],
+                                       metadata["VOL"]["Latitude"], metadata["VOL"]["Longitude"],
+                                       metadata[layer_key]["Time"], layer)
+        else:
+            file = open(destination, "w")
+            np.savetxt(file, rows, fmt=ama_binary.AmaBinary.TEXT_FORMAT)
+            file.close()
 
-        for i, (dBZ, lat, lon) in enumerate(sorted(clean_data, key=lambda tup: tup[0])):
-            line = "{0:.1f},{1:.5f}:{2:.5f}".format(dBZ, lat, lon)
+        if self.DEBUG == 1:
+            for row in rows:
+                print("{0:.1f},{1:.5f}:{2:.5f}".format(row[0], row[1], row[2]))
 
-            file.write(line + "\n")
+    def volume_correlate_dbz_to_location(self, filename, destination, descriptor=None, binary=False):
+        """
+        Realiza la correlacion entre dBZ y sus coordenadas geograficas de todas las capas de un
+        archivo en una sola pasada, y genera los productos compuestos del volumen.
 
-            cdata += line
+        El archivo se abre una única vez y cada capa se decodifica, se correlaciona y se agrega
+        a la grilla común antes de pasar a la siguiente, por lo tanto el costo es el de una lectura
+        del volumen y no el de una lectura por capa.
 
-            if self.DEBUG == 1:
-                print(line)
+        Archivos a generar:
+        ===================
+        - Un archivo *.layer_N.ama* por cada capa, igual al de *single_correlate_dbz_to_location*.
+        - Un archivo *.cmax.ama* con el máximo en columna.
+        - Un archivo *.cappi_<altitud>m.ama* con el CAPPI, si se definió *CAPPI_ALTITUDE*.
 
-        file.close()
+        :param filename: El nombre del archivo a procesar.
+        :param destination: El nombre del directorio en donde colocar los archivos resultantes.
+        :param descriptor: El descriptor del archivo devuelto por *Utils.should_process_file*.
+        :param binary: Generar los archivos en formato binario (*.amab*).
+
+        :return: void
+        """
+        start = time.time()
+        extension = "amab" if binary else "ama"
+        base = os.path.join(os.environ["AMA_EXPORT_DATA"], destination,
+                            os.path.splitext(ntpath.basename(filename))[0])
+
+        # el archivo queda abierto hasta decodificar la última capa.
+        reader = gamic_reader.GamicReader(wrl.util.get_wradlib_data_file(filename))
+        try:
+            data, metadata = reader.read(0, descriptor=descriptor)
+            scan_keys = [key for key in metadata if key != u"VOL"]
+            layers = [int(key[len(u"SCAN"):]) for key in scan_keys]
+            if len(layers) == 0:
+                print(utils.Colors.FAIL + "ERROR: El archivo no contiene capas." + utils.Colors.ENDC)
+                return
+
+            radar_latitude = float(metadata["VOL"]["Latitude"])
+            radar_longitude = float(metadata["VOL"]["Longitude"])
+            region = Processor.region()
+            composite = volume.VolumeComposite(radar_latitude, radar_longitude,
+                                               max(metadata[key]["max_range"] for key in scan_keys),
+                                               self.CAPPI_ALTITUDE, metadata["VOL"].get("Height"))
+
+            for layer, layer_key in zip(layers, scan_keys):
+                pipeline = Processor.filter_pipeline(layer)
+                dBZ, lat, lon = correlator.Correlator.correlate_scan(data, metadata, layer, self.MINIMUM_REFLECTIVITY,
+                                                                     self.MAXIMUM_REFLECTIVITY, None, self.GRID_CELL_SIZE,
+                                                                     self.GRID_AGGREGATION, pipeline, region,
+                                                                     self.DEDUPLICATION)
+                self.write_correlation("{0}.layer_{1}.{2}".format(base, layer, extension), dBZ, lat, lon, metadata, layer,
+                                       binary)
+
+                values = data[layer_key][u"Z"]["data"]
+                mask = values > correlator.Correlator.NO_DATA
+                if pipeline is not None:
+                    mask = pipeline.apply(values, metadata[layer_key]["az"], metadata[layer_key]["r"], mask)
+                composite.add(values, metadata[layer_key]["az"], metadata[layer_key]["r"],
+                              metadata[layer_key].get("elevation"), mask)
+        finally:
+            reader.close()
+
+        products = [("cmax", composite.column_max(), volume.VolumeComposite.COLUMN_MAX_LAYER)]
+        if self.CAPPI_ALTITUDE is not None:
+            products.append(("cappi_{0:g}m".format(self.CAPPI_ALTITUDE), composite.constant_altitude(),
+                             volume.VolumeComposite.CAPPI_LAYER))
+
+        for name, (dBZ, lat, lon), layer in products:
+            keep = (dBZ >= self.MINIMUM_REFLECTIVITY) & (dBZ <= self.MAXIMUM_REFLECTIVITY)
+            if region is not None:
+                keep &= region.contains(lat, lon)
+            self.write_correlation("{0}.{1}.{2}".format(base, name, extension), dBZ[keep], lat[keep], lon[keep],
+                                   metadata, layer, binary, layers[0])
 
         end = time.time()
 
         print(utils.Colors.BOLD + "---" + utils.Colors.ENDC)
-        print(utils.Colors.BOLD + "Tamaño Datos Enviados: {0}kb".format(sys.getsizeof(cdata) / 1024) + utils.Colors.ENDC)
-        print(utils.Colors.BOLD + "Tiempo de Procesamiento: {0:.1f} minutos".format((end - start) / 60) + utils.Colors.ENDC)
+        print(utils.Colors.BOLD + "Capas Procesadas: {0}".format(len(layers)) + utils.Colors.ENDC)
+        print(utils.Colors.BOLD + "Tiempo de Procesamiento: {0:.1f} segundos".format((end - start)) + utils.Colors.ENDC)
 
-    def correlate_dbz_to_location(self, filename, destination, process_all, layer, json_test=False):
+    def correlate_dbz_to_location(self, filename, destination, process_all, layer, json_test=False, workers=1,
+                                  binary=False, all_layers=False):
         """
         Esta funcion procesa todo un directorio de archivos y por cada uno realiza la 
         correlacion entre dBZ y sus coordenadas geograficas en el mapa.
@@ -284,6 +697,10 @@ class Processor:
             pasado como *filename*.
         :param layer: La capa de datos a procesar. Cada capa corresponde a un ángulo de elevación del radar.
         :param json_test: Habilitar modo test/verificación para archivos JSON.
+        :param workers: La cantidad de procesos a utilizar cuando se procesan todos los archivos.
+        :param binary: Generar los archivos en formato binario (*.amab*).
+        :param all_layers: Procesar todas las capas en una sola pasada y generar los productos \
+            compuestos. Ver *volume_correlate_dbz_to_location*.
 
         :return: void
         """
@@ -293,16 +710,60 @@ class Processor:
             matches = utils.Utils.files_for_processing(origin, self.QT, self.FILE_SIZE_LIMIT)
 
             if len(matches) > 0:
-                for item in matches:
-                    if utils.Utils.should_process_file(item, self.FILE_SIZE_LIMIT, True):
-                        self.single_correlate_dbz_to_location(item, destination, layer)
+                if all_layers:
+                    batch.BatchProcessor(workers).run("correlate_volume_to_location", matches, (destination, binary))
+                else:
+                    batch.BatchProcessor(workers).run("correlate_file_to_location", matches,
+                                                      (destination, layer, binary))
         else:
-            if json_test == 1:
+            if all_layers:
+                self.volume_correlate_dbz_to_location(filename, destination, binary=binary)
+            elif json_test == 1:
                 self.single_correlate_dbz_to_location_to_json(filename, layer, True)
             else:
-                self.single_correlate_dbz_to_location(filename, destination, layer)
+                self.single_correlate_dbz_to_location(filename, destination, layer, binary=binary)
+
+    def correlate_file_to_location(self, filename, destination, layer, binary=False):
+        """
+        Verifica si un archivo debe ser procesado y en ese caso realiza la correlacion entre
+        dBZ y sus coordenadas geograficas.
+
+        :param filename: El nombre del archivo a procesar.
+        :param destination: El nombre del directorio en donde colocar los archivos resultantes.
+        :param layer: La capa de datos a procesar. Cada capa corresponde a un ángulo de elevación del radar.
+        :param binary: Generar el archivo en formato binario (*.amab*).
 
-    def single_correlate_dbz_to_location_to_json(self, filename, layer, test=False):
+        :return: True si el archivo fue procesado, False si fue obviado.
+        """
+        descriptor = utils.Utils.should_process_file(filename, self.FILE_SIZE_LIMIT, True)
+        if not descriptor:
+            return False
+
+        self.single_correlate_dbz_to_location(filename, destination, layer, descriptor, binary)
+
+        return True
+
+    def correlate_volume_to_location(self, filename, destination, binary=False):
+        """
+        Verifica si un archivo debe ser procesado y en ese caso realiza la correlacion de todas
+        sus capas en una sola pasada.
+
+        :param filename: El nombre del archivo a procesar.
+        :param destination: El nombre del directorio en donde colocar los archivos resultantes.
+        :param binary: Generar los archivos en formato binario (*.amab*).
+
+        :return: True si el archivo fue procesado, False si fue obviado.
+        """
+        descriptor = utils.Utils.should_process_file(filename, self.FILE_SIZE_LIMIT, True)
+        if not descriptor:
+            return False
+
+        self.volume_correlate_dbz_to_location(filename, destination, descriptor, binary)
+
+        return True
+
+    def single_correlate_dbz_to_location_to_json(self, filename, layer, test=False, descriptor=None, data=None,
+                                                 metadata=None):
         """
         Esta funcion realiza la correlacion entre dBZ y sus coordenadas geograficas en el mapa.
         
@@ -314,13 +775,20 @@ class Processor:
             "fechaCarga": "2017-04-17T16:35:01.150Z",
             "notificar": True | False,
             "centroides": ["-25.23864:-57.52254", ..., "-25.23864:-57.52254"],
+            "celdas": [{"id": 12, "edad": 3, "velocidad": [25.1, -3.4], "crecimiento": 4.0, "tendencia": 1.5}, ...],
             "arrayDatos": ["6.0;-25.23864:-57.52254", ..., "7;-25.23864:-57.52254"]
         }
 
+        El archivo no se borra aquí aunque *SHOULD_REMOVE_PROCESSED_FILES* esté activo, lo borra
+        *FileListener* luego de entregarlo también a los acumulados y al buffer de barridos.
+
         :param filename: El nombre del archivo a procesar.
         :param layer: La capa de datos a procesar. Cada capa corresponde a un ángulo de elevación del radar.
         :param test: Habilitar modo test/verificación. En este modo no se llama al servicio Web solo \
-            se genera el archivo de verificación.
+            se genera el archivo de verificación, sin seguimiento de celdas ni diferencias.
+        :param descriptor: El descriptor del archivo devuelto por *Utils.should_process_file*.
+        :param data: Los datos ya decodificados por *Processor.process*. *None* para leer el archivo.
+        :param metadata: Los metadatos ya decodificados por *Processor.process*.
         
         :return: void
         """
@@ -329,69 +797,69 @@ class Processor:
 
         ### DEBUG FILE
         debug_file = os.path.join(os.environ["AMA_EXPORT_DATA"], "JSON.debug")
-        dfile = open(debug_file, "w")
+        dfile = open(debug_file, "wb")
 
         try:
             start = time.time()
-            cdata = ""
 
             #
             # Datos que retorna el proceso de detección de clusters.
             #
-            original, clustered, centroids, scan_time, radar_coordinates = dbscan.DBSCANProcessor().detect_dbz_clusters(filename, layer,
-                                                                                                                        test)
-            # construir el texto JSON.
-            # fecha
-            cdata += "{{\"fechaCarga\":\"{0}\",".format(scan_time)
-
-            # detectar si cualquiera de los centroides está dentro del espacio radial de notificaciones.
-            sendNotifications = False
-            if len(centroids) > 0:
-                for i, (centroid_lat, centroid_lon, centroid_dBZ) in enumerate(centroids):
-                    if haversine((radar_coordinates[0], radar_coordinates[1]), (centroid_lat, centroid_lon)) <= 50:
+            original, clusters, scan_time, radar_coordinates = dbscan.DBSCANProcessor().detect_dbz_clusters(filename, layer, test,
+                                                                                                            descriptor, data,
+                                                                                                            metadata)
+
+            zones = None
+            if self.GEOFENCE_FILE:
+                # detectar las zonas de notificación afectadas por cada cluster.
+                fence = geofence.Geofence.default(self.GEOFENCE_FILE)
+                zones = fence.names_of(fence.clusters(clusters))
+                sendNotifications = any(len(names) > 0 for names in zones)
+            else:
+                # detectar si cualquiera de los centroides está dentro del espacio radial de notificaciones.
+                sendNotifications = False
+                for centroid_lat, centroid_lon, centroid_dBZ in clusters.centermost:
+                    if haversine((radar_coordinates[0], radar_coordinates[1]), (centroid_lat, centroid_lon)) <= self.NOTIFICATION_RADIUS:
                         sendNotifications = True
-            cdata += "\"notificar\":\"{0}\",".format(sendNotifications)
-
-            # agregar los centroides con sus coordenadas.
-            cdata += "\"centroides\":["
-            if len(centroids) > 0:
-                for i, (centroid_lat, centroid_lon, centroid_dBZ) in enumerate(centroids):
-                    line = "\"{0:.5f}:{1:.5f}\",".format(centroid_lat, centroid_lon)
-                    # si es el último registro remover la coma al final.
-                    if i == (len(centroids) - 1):
-                        line = line[:-1]
-                    # cuerpo
-                    cdata += line
-            cdata += "],"
-
-            # agregar las dBZ con sus coordenadas.
-            cdata += "\"arrayDatos\":["
-            if len(clustered) > 0:
-                for i, (lat, lon, dBZ) in enumerate(sorted(clustered, key=lambda tup: tup[2])):  # Ordenar por dBZ (índice 2).
-                    line = "\"{0:.1f};{1:.5f}:{2:.5f}\",".format(dBZ, lat, lon)
-                    # si es el último registro remover la coma al final.
-                    if i == (len(clustered) - 1):
-                        line = line[:-1]
-                    # cuerpo
-                    cdata += line
-            cdata += "]}"
+
+            #
+            # El seguimiento y las diferencias guardan el estado de la capa, en modo verificación no
+            # se envía nada y por lo tanto no deben avanzar.
+            #
+            cells = None
+            if self.TRACK_CELLS and test == 0:
+                # asignar a cada cluster la celda del barrido anterior que le corresponde.
+                cells = tracker.StormTracker.default(layer).update(clusters, scan_time)
+
+            frame = None
+            if self.DELTA_PAYLOAD and test == 0:
+                # solo los puntos que cambiaron desde el último envío.
+                frame = delta.DeltaEncoder.default(layer).encode(clusters.points)
+
+            # construir el texto JSON.
+            cdata = json_payload.PayloadBuilder(self.COMPRESS_PAYLOAD).build(scan_time, sendNotifications, clusters.centermost,
+                                                                             clusters.points, zones, cells, frame)
 
             if test == 1:
-                dfile.write("{0}".format(cdata))
+                dfile.write(cdata)
 
-            # insertar los datos.
-            # IMPORTANTE! Añadir timeout de 30 segundos para el pedido.
+            # insertar los datos. Si el hilo de envío está activo solo se le entregan los datos.
             if test == 0:
-                url = "http://127.0.0.1:80/ama/datos/insertar"
-                headers = {
-                    'Content-type': 'application/json',
-                    'Authorization': 'Basic ' + base64.b64encode('Ama@admin:amaPass2017')
-                }
-                response = requests.post(url, data=cdata, headers=headers, timeout=30)
-                if response.status_code != requests.codes.ok:
-                    print(utils.Colors.FAIL + "ERROR: Insertando datos en WS." + utils.Colors.ENDC)
-                else:
+                # si el Controlador no recibe un envío con secuencia el próximo debe ser completo y los
+                # de la capa que ya estaban en la cola se descartan. Tampoco se guarda en el spool,
+                # al reenviarlo el receptor ya lo habría descartado.
+                on_failure = delta.DeltaEncoder.default(layer).reset if frame is not None else None
+                sender = uploader.Uploader.default()
+                if sender.running:
+                    sender.submit(cdata, self.COMPRESS_PAYLOAD, frame is None, on_failure,
+                                  layer if frame is not None else None)
+                    print(utils.Colors.BOLD + "INFO: Datos entregados al hilo de envío." + utils.Colors.ENDC)
+                elif sender.deliver(cdata, self.COMPRESS_PAYLOAD, frame is None):
                     print(utils.Colors.BOLD + "INFO: Datos insertados." + utils.Colors.ENDC)
+                else:
+                    print(utils.Colors.FAIL + "ERROR: Insertando datos en WS." + utils.Colors.ENDC)
+                    if on_failure is not None:
+                        on_failure()
 
             end = time.time()
 
@@ -399,7 +867,7 @@ class Processor:
             print(utils.Colors.BOLD + "Tamaño Datos Enviados: {0}kb".format(sys.getsizeof(cdata) / 1024) + utils.Colors.ENDC)
             print(utils.Colors.BOLD + "Tiempo de Procesamiento: {0:.1f} segundos".format((end - start)) + utils.Colors.ENDC)
 
-            if len(clustered) == 0:
+            if len(clusters) == 0 and not self.COMPRESS_PAYLOAD:
                 print(utils.Colors.BOLD + "---" + utils.Colors.ENDC)
                 print(utils.Colors.BOLD + "No se detectaron clusters. Se enviaron datos vacios al Controlador." + utils.Colors.ENDC)
                 print(utils.Colors.BOLD + "Datos:" + utils.Colors.ENDC)
@@ -410,11 +878,3 @@ class Processor:
             print(utils.Colors.FAIL + "DESC: {0}".format(e) + utils.Colors.ENDC)
         finally:
             dfile.close()  # Siempre cerrar el archivo con datos de debug.
-
-            # siempre borrar el archivo que fue procesado.
-            if self.SHOULD_REMOVE_PROCESSED_FILES == 1:
-                try:
-                    os.remove(filename)
-                except Exception as e:
-                    print(utils.Colors.FAIL + "ERROR: Borrando archivo original." + utils.Colors.ENDC)
-                    print(utils.Colors.FAIL + "DESC: {0}".format(e) + utils.Colors.ENDC)
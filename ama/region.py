@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+"""
+Clase perteneciente al módulo de procesamiento de datos e inferencias Ama.
+
+.. module:: region
+   :platform: Unix
+   :synopsis: Región de interés para procesar solo una parte de cada barrido.
+
+.. moduleauthor:: Andreas P. Koenzen <akc@apkc.net>
+"""
+
+import numpy as np
+
+__author__ = "Andreas P. Koenzen"
+__copyright__ = "Copyright 2016, Proyecto de Tesis / Universidad Católica de Asunción."
+__credits__ = "Andreas P. Koenzen"
+__license__ = "BSD"
+__version__ = "0.1"
+__maintainer__ = "Andreas P. Koenzen"
+__email__ = "akc@apkc.net"
+__status__ = "Prototype"
+
+
+class RegionOfInterest:
+    """
+    Región de interés definida por una distancia máxima al radar, un rectángulo de Latitud y
+    Longitud o ambos.
+
+    La región se traduce a los índices de azimut y distancia que pueden contener gates dentro
+    de ella, de forma que la matriz polar se recorta antes de georeferenciar, filtrar o agrupar
+    y el costo de procesar un barrido depende del tamaño de la región y no del alcance del radar.
+    """
+
+    KMS_PER_RADIAN = 6371.0088
+    """
+    float: La cantidad de kilómetros en un radián.
+    """
+    AZIMUTH_MARGIN = 1.
+    """
+    float: El margen en grados que se agrega al sector de azimuts de un rectángulo.
+    """
+    RANGE_MARGIN = 0.5
+    """
+    float: El margen en kilómetros que se agrega a las distancias de un rectángulo.
+    """
+
+    def __init__(self, maximum_range=None, bbox=None):
+        """
+        :param maximum_range: La distancia máxima al radar en kilómetros.
+        :param bbox: Tupla (Latitud mínima, Longitud mínima, Latitud máxima, Longitud máxima).
+        """
+        self.maximum_range = maximum_range
+        self.bbox = tuple(bbox) if bbox is not None else None
+
+    def indices(self, azimuths, ranges, radar_latitude, radar_longitude):
+        """
+        Calcula los índices de las filas (azimuts) y columnas (distancias) que pueden tener gates
+        dentro de la región.
+
+        :param azimuths: Vector con los azimuts de cada fila, en grados.
+        :param ranges: Vector con las distancias de cada columna, en metros, en orden creciente.
+        :param radar_latitude: La latitud del radar.
+        :param radar_longitude: La longitud del radar.
+
+        :return: Dos vectores de índices, filas y columnas.
+        """
+        azimuths = np.asarray(azimuths, dtype=np.float64)
+        ranges = np.asarray(ranges, dtype=np.float64) / 1000.
+
+        nearest, farthest = 0., np.inf
+        if self.maximum_range is not None:
+            farthest = self.maximum_range
+
+        rows = np.arange(len(azimuths))
+        if self.bbox is not None:
+            lat_min, lon_min, lat_max, lon_max = self.bbox
+            corners_lat = np.array([lat_min, lat_min, lat_max, lat_max])
+            corners_lon = np.array([lon_min, lon_max, lon_min, lon_max])
+
+            # el punto del rectángulo más cercano al radar.
+            inside_lat = min(max(radar_latitude, lat_min), lat_max)
+            inside_lon = min(max(radar_longitude, lon_min), lon_max)
+
+            nearest = float(RegionOfInterest._distance(radar_latitude, radar_longitude, inside_lat, inside_lon))
+            nearest = max(0., nearest - self.RANGE_MARGIN)
+            farthest = min(farthest, float(np.max(
+                RegionOfInterest._distance(radar_latitude, radar_longitude, corners_lat, corners_lon))) + self.RANGE_MARGIN)
+
+            if (inside_lat, inside_lon) != (radar_latitude, radar_longitude):
+                #
+                # El radar está fuera del rectángulo, por lo tanto el rectángulo ocupa un sector
+                # menor a 180 grados limitado por los rumbos hacia sus esquinas.
+                #
+                bearings = RegionOfInterest._bearing(radar_latitude, radar_longitude, corners_lat, corners_lon)
+                offsets = np.mod(bearings - bearings[0] + 180., 360.) - 180.
+                start = bearings[0] + offsets.min() - self.AZIMUTH_MARGIN
+                width = offsets.max() - offsets.min() + 2 * self.AZIMUTH_MARGIN
+                rows = np.nonzero(np.mod(azimuths - start, 360.) <= width)[0]
+
+        columns = np.nonzero((ranges >= nearest) & (ranges <= farthest))[0]
+
+        return rows, columns
+
+    def contains(self, lat, lon):
+        """
+        Verifica qué coordenadas están dentro del rectángulo de la región. La distancia máxima ya
+        es exacta con los índices de *indices*.
+
+        :param lat: Vector o matriz con las latitudes.
+        :param lon: Vector o matriz con las longitudes.
+
+        :return: Vector o matriz booleana.
+        """
+        if self.bbox is None:
+            return np.ones(np.shape(lat), dtype=bool)
+
+        lat_min, lon_min, lat_max, lon_max = self.bbox
+
+        return (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+
+    @staticmethod
+    def _distance(lat1, lon1, lat2, lon2):
+        lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+        a = np.sin((lat2 - lat1) / 2.) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.) ** 2
+
+        return 2. * RegionOfInterest.KMS_PER_RADIAN * np.arcsin(np.sqrt(np.clip(a, 0., 1.)))
+
+    @staticmethod
+    def _bearing(lat1, lon1, lat2, lon2):
+        lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+        y = np.sin(lon2 - lon1) * np.cos(lat2)
+        x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(lon2 - lon1)
+
+        return np.mod(np.degrees(np.arctan2(y, x)), 360.)
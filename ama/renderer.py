@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+
+"""
+Clase perteneciente al módulo de procesamiento de datos e inferencias Ama.
+
+.. module:: renderer
+   :platform: Unix
+   :synopsis: Generación de imágenes PPI sin pantalla, reutilizando la figura de cada geometría.
+
+.. moduleauthor:: Andreas P. Koenzen <akc@apkc.net>
+"""
+
+import ama.georef_cache as georef_cache
+import numpy as np
+import struct
+import threading
+import zlib
+
+from collections import OrderedDict
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+__author__ = "Andreas P. Koenzen"
+__copyright__ = "Copyright 2016, Proyecto de Tesis / Universidad Católica de Asunción."
+__credits__ = "Andreas P. Koenzen"
+__license__ = "BSD"
+__version__ = "0.1"
+__maintainer__ = "Andreas P. Koenzen"
+__email__ = "akc@apkc.net"
+__status__ = "Prototype"
+
+
+class PPIRenderer:
+    """
+    Genera imágenes PPI de una capa con matplotlib, utilizando directamente el backend Agg y sin
+    pasar por pylab ni pyplot.
+
+    La figura, los ejes, la malla polar, la barra de colores y las etiquetas solo dependen de la
+    geometría del radar y del producto, por lo tanto se construyen una sola vez y se mantienen en
+    un LRU en memoria. Por cada archivo solo se actualizan los valores de la malla y el título.
+    """
+
+    ###### OPCIONES DE IMAGENES ######
+    PRODUCTS = {
+        "reflectivity": {
+            "title": u"Reflectividad",
+            "label": u"dBZ",
+            "cmap": "jet",
+            "vmin": -32.,
+            "vmax": 80.,
+            "limit": None
+        },
+        "rainfall": {
+            "title": u"Radar DINAC Fac. Veterinaria UNA\n6 min. profundidad de lluvia",
+            "label": u"mm/h",
+            "cmap": "nipy_spectral",
+            "vmin": 0.,
+            "vmax": 100.,
+            "limit": 128.
+        },
+        "accumulation": {
+            "title": u"Lluvia acumulada",
+            "label": u"mm",
+            "cmap": "nipy_spectral",
+            "vmin": 0.,
+            "vmax": 150.,
+            "limit": None
+        }
+    }
+    """
+    dict: La presentación de cada producto: título, etiqueta de la barra de colores, mapa de colores, \
+        rango de valores y límite de los ejes en km (*None* para mostrar todo el alcance).
+    """
+    FIGURE_SIZE = (10, 8)
+    """
+    tuple: El tamaño de la figura en pulgadas.
+    """
+    DPI = 100
+    """
+    int: La resolución de la figura en puntos por pulgada.
+    """
+    MEMORY_ENTRIES = 4
+    """
+    int: La cantidad de figuras a mantener en memoria.
+    """
+
+    _entries = OrderedDict()
+    _lock = threading.Lock()
+
+    def __init__(self, azimuths, ranges, product):
+        """
+        :param azimuths: Vector de N elementos con los azimuts de cada fila, en grados.
+        :param ranges: Vector de M elementos con las distancias de cada columna, en metros.
+        :param product: El producto a graficar, una de las claves de *PRODUCTS*.
+        """
+        options = self.PRODUCTS[product]
+        self.title = options["title"]
+        self.lock = threading.Lock()
+
+        x, y = PPIRenderer.mesh(azimuths, ranges)
+
+        self.figure = Figure(figsize=self.FIGURE_SIZE, dpi=self.DPI)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.axes = self.figure.add_subplot(111)
+        self.image = self.axes.pcolormesh(x, y, np.zeros((len(azimuths), len(ranges))), cmap=options["cmap"],
+                                          vmin=options["vmin"], vmax=options["vmax"])
+        self.axes.set_aspect("equal")
+        self.axes.set_xlabel(u"Este del Radar (km)")
+        self.axes.set_ylabel(u"Norte del Radar (km)")
+        self.axes.grid(color="grey")
+        if options["limit"] is not None:
+            self.axes.set_xlim(-options["limit"], options["limit"])
+            self.axes.set_ylim(-options["limit"], options["limit"])
+
+        colorbar = self.figure.colorbar(self.image, ax=self.axes, shrink=0.8)
+        colorbar.set_label(options["label"])
+
+        self.heading = self.axes.set_title(self.title)
+        self.figure.tight_layout()
+
+    @staticmethod
+    def default(azimuths, ranges, product):
+        """
+        Devuelve el renderer de una geometría y un producto, construyéndolo la primera vez.
+
+        :param azimuths: Vector con los azimuts de cada fila, en grados.
+        :param ranges: Vector con las distancias de cada columna, en metros.
+        :param product: El producto a graficar.
+
+        :return: Un *PPIRenderer*.
+        """
+        key = "{0}.{1}".format(georef_cache.GeorefCache.key(azimuths, ranges, 0., 0.), product)
+
+        with PPIRenderer._lock:
+            if key in PPIRenderer._entries:
+                renderer = PPIRenderer._entries.pop(key)
+                PPIRenderer._entries[key] = renderer  # mover al final, es el más reciente.
+                return renderer
+
+        renderer = PPIRenderer(azimuths, ranges, product)
+
+        with PPIRenderer._lock:
+            PPIRenderer._entries[key] = renderer
+            while len(PPIRenderer._entries) > PPIRenderer.MEMORY_ENTRIES:
+                PPIRenderer._entries.popitem(last=False)
+
+        return renderer
+
+    def render(self, values, path, subtitle=None):
+        """
+        Genera la imagen PNG de una capa.
+
+        :param values: Matriz de NxM con los valores a graficar. Los valores no finitos quedan en blanco.
+        :param path: El PATH del archivo PNG a generar.
+        :param subtitle: Texto a agregar debajo del título, ej. la hora del barrido.
+
+        :return: void
+        """
+        with self.lock:
+            self.image.set_array(np.ma.masked_invalid(np.asarray(values, dtype=np.float64)).ravel())
+            self.heading.set_text(self.title if subtitle is None else u"{0}, {1}".format(self.title, subtitle))
+            self.canvas.print_png(path)
+
+    @staticmethod
+    def mesh(azimuths, ranges):
+        """
+        Calcula los vértices de la malla polar de una capa sobre el plano del radar.
+
+        :param azimuths: Vector de N elementos con los azimuts de cada fila, en grados.
+        :param ranges: Vector de M elementos con las distancias de cada columna, en metros.
+
+        :return: Dos matrices de (N+1)x(M+1) con las coordenadas *x* (Este) e *y* (Norte) en km.
+        """
+        azimuths = np.asarray(azimuths, dtype=np.float64)
+        ranges = np.asarray(ranges, dtype=np.float64) / 1000.
+
+        azimuth_step = np.median(np.diff(np.unwrap(np.radians(azimuths)))) if len(azimuths) > 1 else np.radians(1.)
+        azimuth_edges = np.append(np.radians(azimuths) - azimuth_step / 2., np.radians(azimuths[-1]) + azimuth_step / 2.)
+        range_step = ranges[1] - ranges[0] if len(ranges) > 1 else ranges[0]
+        range_edges = np.append(ranges - range_step / 2., ranges[-1] + range_step / 2.).clip(0.)
+
+        x = np.sin(azimuth_edges)[:, np.newaxis] * range_edges[np.newaxis, :]
+        y = np.cos(azimuth_edges)[:, np.newaxis] * range_edges[np.newaxis, :]
+
+        return x, y
+
+
+class ThumbnailRenderer:
+    """
+    Genera miniaturas PNG de una capa sin utilizar matplotlib.
+
+    Para cada píxel se precalcula una sola vez el gate que le corresponde, de forma que generar
+    una imagen es indexar la matriz de la capa, convertir los valores en colores con una tabla de
+    256 entradas y comprimir las filas con zlib.
+    """
+
+    ###### OPCIONES DE MINIATURAS ######
+    PALETTES = {
+        "reflectivity": [
+            (-32., (0, 0, 0, 0)),
+            (5., (0, 0, 0, 0)),
+            (5.01, (4, 233, 231, 255)),
+            (15., (1, 159, 244, 255)),
+            (25., (2, 253, 2, 255)),
+            (35., (253, 248, 2, 255)),
+            (45., (253, 149, 0, 255)),
+            (55., (212, 0, 0, 255)),
+            (65., (248, 0, 253, 255)),
+            (80., (255, 255, 255, 255))
+        ],
+        "rainfall": [
+            (0., (0, 0, 0, 0)),
+            (0.1, (0, 0, 0, 0)),
+            (0.11, (170, 210, 255, 255)),
+            (2., (0, 120, 255, 255)),
+            (10., (2, 200, 2, 255)),
+            (30., (253, 220, 2, 255)),
+            (60., (240, 60, 0, 255)),
+            (100., (180, 0, 200, 255))
+        ],
+        "accumulation": [
+            (0., (0, 0, 0, 0)),
+            (0.2, (0, 0, 0, 0)),
+            (0.21, (170, 210, 255, 255)),
+            (5., (0, 120, 255, 255)),
+            (20., (2, 200, 2, 255)),
+            (50., (253, 220, 2, 255)),
+            (100., (240, 60, 0, 255)),
+            (150., (180, 0, 200, 255))
+        ]
+    }
+    """
+    dict: Los colores RGBA de cada producto como pares (valor, color), en orden creciente. Entre dos \
+        pares los colores se interpolan linealmente.
+    """
+    SIZE = 512
+    """
+    int: El lado de la miniatura en píxeles.
+    """
+    MEMORY_ENTRIES = 4
+    """
+    int: La cantidad de mapas de píxeles a mantener en memoria.
+    """
+
+    _entries = OrderedDict()
+    _lock = threading.Lock()
+
+    def __init__(self, azimuths, ranges, product, size=None, limit=None):
+        """
+        :param azimuths: Vector de N elementos con los azimuts de cada fila, en grados.
+        :param ranges: Vector de M elementos con las distancias de cada columna, en metros.
+        :param product: El producto a graficar, una de las claves de *PALETTES*.
+        :param size: El lado de la miniatura en píxeles. Por defecto *SIZE*.
+        :param limit: La distancia al radar en km que cubre la miniatura. Por defecto todo el alcance.
+        """
+        self.size = int(size or self.SIZE)
+        palette = self.PALETTES[product]
+        self.minimum = palette[0][0]
+        self.maximum = palette[-1][0]
+
+        # la tabla de colores de 256 entradas entre el mínimo y el máximo de la paleta.
+        levels = np.linspace(self.minimum, self.maximum, 256)
+        stops = np.array([value for value, _ in palette])
+        colors = np.array([color for _, color in palette], dtype=np.float64)
+        self.table = np.column_stack([np.interp(levels, stops, colors[:, k]) for k in range(4)]).round().astype(np.uint8)
+
+        self.rows, self.columns, self.inside = ThumbnailRenderer.pixels(azimuths, ranges, self.size, limit)
+
+    @staticmethod
+    def default(azimuths, ranges, product, size=None, limit=None):
+        """
+        Devuelve el renderer de una geometría y un producto, construyéndolo la primera vez.
+
+        :return: Un *ThumbnailRenderer*.
+        """
+        key = "{0}.{1}.{2}.{3}".format(georef_cache.GeorefCache.key(azimuths, ranges, 0., 0.), product, size, limit)
+
+        with ThumbnailRenderer._lock:
+            if key in ThumbnailRenderer._entries:
+                renderer = ThumbnailRenderer._entries.pop(key)
+                ThumbnailRenderer._entries[key] = renderer  # mover al final, es el más reciente.
+                return renderer
+
+        renderer = ThumbnailRenderer(azimuths, ranges, product, size, limit)
+
+        with ThumbnailRenderer._lock:
+            ThumbnailRenderer._entries[key] = renderer
+            while len(ThumbnailRenderer._entries) > ThumbnailRenderer.MEMORY_ENTRIES:
+                ThumbnailRenderer._entries.popitem(last=False)
+
+        return renderer
+
+    def render(self, values, path):
+        """
+        Genera la miniatura PNG de una capa.
+
+        :param values: Matriz de NxM con los valores a graficar. Los valores no finitos quedan transparentes.
+        :param path: El PATH del archivo PNG a generar.
+
+        :return: void
+        """
+        ThumbnailRenderer.write_png(path, self.colorize(values))
+
+    def colorize(self, values):
+        """
+        Convierte una capa en una imagen RGBA.
+
+        :param values: Matriz de NxM con los valores a graficar.
+
+        :return: Matriz de SIZExSIZEx4 de uint8.
+        """
+        values = np.asarray(values, dtype=np.float64)[self.rows, self.columns]
+        scaled = (values - self.minimum) * (255. / (self.maximum - self.minimum))
+        levels = np.where(np.isfinite(scaled), scaled, 0.).clip(0, 255).astype(np.uint8)
+
+        image = self.table[levels]
+        image[~(self.inside & np.isfinite(values))] = 0
+
+        return image
+
+    @staticmethod
+    def pixels(azimuths, ranges, size, limit=None):
+        """
+        Calcula el gate que corresponde a cada píxel de una miniatura centrada en el radar.
+
+        :param azimuths: Vector de N elementos con los azimuts de cada fila, en grados.
+        :param ranges: Vector de M elementos con las distancias de cada columna, en metros.
+        :param size: El lado de la miniatura en píxeles.
+        :param limit: La distancia al radar en km que cubre la miniatura. *None* para todo el alcance.
+
+        :return: Dos matrices de SIZExSIZE con la fila y la columna del gate de cada píxel, y una \
+            matriz booleana con los píxeles dentro del alcance.
+        """
+        azimuths = np.mod(np.asarray(azimuths, dtype=np.float64), 360.)
+        ranges = np.asarray(ranges, dtype=np.float64) / 1000.
+        range_step = ranges[1] - ranges[0] if len(ranges) > 1 else ranges[0]
+        extent = ranges[-1] + range_step / 2. if limit is None else float(limit)
+
+        centers = (np.arange(size) + .5) * (2. * extent / size) - extent
+        x = centers[np.newaxis, :]
+        y = -centers[:, np.newaxis]
+        distance = np.hypot(x, y)
+        bearing = np.mod(np.degrees(np.arctan2(x, y)), 360.)
+
+        # el gate más cercano en distancia y el azimut más cercano, teniendo en cuenta el norte.
+        columns = np.rint((distance - ranges[0]) / range_step).astype(np.int64)
+        inside = (columns >= 0) & (columns < len(ranges)) & (distance <= ranges[-1] + range_step / 2.)
+        columns = columns.clip(0, len(ranges) - 1)
+
+        order = np.argsort(azimuths, kind="mergesort")
+        ordered = azimuths[order]
+        after = np.searchsorted(ordered, bearing) % len(ordered)
+        before = (after - 1) % len(ordered)
+        distance_after = np.abs(np.mod(ordered[after] - bearing + 180., 360.) - 180.)
+        distance_before = np.abs(np.mod(ordered[before] - bearing + 180., 360.) - 180.)
+        rows = order[np.where(distance_before < distance_after, before, after)]
+
+        return rows, columns, inside
+
+    @staticmethod
+    def write_png(path, image):
+        """
+        Escribe una imagen RGBA como PNG de 8 bits por canal.
+
+        :param path: El PATH del archivo PNG a generar.
+        :param image: Matriz de HxWx4 de uint8.
+
+        :return: void
+        """
+        height, width = image.shape[:2]
+
+        # cada fila comienza con el tipo de filtro, 0 = ninguno.
+        rows = np.zeros((height, 1 + width * 4), dtype=np.uint8)
+        rows[:, 1:] = np.ascontiguousarray(image, dtype=np.uint8).reshape(height, width * 4)
+
+        def chunk(kind, payload):
+            return (struct.pack(">I", len(payload)) + kind + payload +
+                    struct.pack(">I", zlib.crc32(kind + payload) & 0xFFFFFFFF))
+
+        with open(path, "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n")
+            f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)))
+            f.write(chunk(b"IDAT", zlib.compress(rows.tobytes(), 6)))
+            f.write(chunk(b"IEND", b""))
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+
+"""
+Clase perteneciente al módulo de procesamiento de datos e inferencias Ama.
+
+.. module:: spool
+   :platform: Unix
+   :synopsis: Almacenamiento en disco de los datos que el Controlador no aceptó.
+
+.. moduleauthor:: Andreas P. Koenzen <akc@apkc.net>
+"""
+
+import ama.utils as utils
+import gzip
+import io
+import os
+import threading
+import time
+
+from collections import OrderedDict
+
+__author__ = "Andreas P. Koenzen"
+__copyright__ = "Copyright 2016, Proyecto de Tesis / Universidad Católica de Asunción."
+__credits__ = "Andreas P. Koenzen"
+__license__ = "BSD"
+__version__ = "0.1"
+__maintainer__ = "Andreas P. Koenzen"
+__email__ = "akc@apkc.net"
+__status__ = "Prototype"
+
+
+class Spool:
+    """
+    Cola persistente de los JSON que no pudieron ser enviados al Controlador.
+
+    Cada JSON se guarda comprimido en un archivo propio y se registra en un índice de solo
+    agregado, donde cada línea es un alta (*+*) o una baja (*-*). Cuando el Controlador vuelve
+    a responder los datos pendientes se reenvían por lotes, del más antiguo al más nuevo o al
+    revés. El espacio en disco es acotado: al superarlo se descartan los datos más antiguos.
+
+    Las secuencias nunca se reutilizan, aunque el spool quede vacío, para que un JSON nuevo no
+    reemplace a uno apartado en *REJECTED_DIRECTORY*. Al compactar el índice se guarda la última
+    secuencia asignada.
+
+    Formato del índice:
+    ===================
+        =,última secuencia
+        +,secuencia,bytes,fecha,comprimido
+        -,secuencia
+    """
+
+    ###### OPCIONES DEL SPOOL ######
+    DIRECTORY = "spool"
+    """
+    string: El directorio, relativo a la variable de entorno AMA_EXPORT_DATA, donde se guardan los datos.
+    """
+    MAX_BYTES = 512 * 1024 * 1024
+    """
+    int: El espacio máximo en disco de los datos pendientes.
+    """
+    MAX_ENTRIES = 10000
+    """
+    int: La cantidad máxima de datos pendientes.
+    """
+    BATCH_SIZE = 20
+    """
+    int: La cantidad de datos a reenviar por lote.
+    """
+    REJECTED_DIRECTORY = "rejected"
+    """
+    string: El subdirectorio donde se apartan los datos que el Controlador rechazó al reenviarlos.
+    """
+
+    def __init__(self, directory=None):
+        if directory is None:
+            directory = os.path.join(os.environ["AMA_EXPORT_DATA"], self.DIRECTORY)
+
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index")
+        self.entries = OrderedDict()
+        self.sequence = 0
+        self.lock = threading.RLock()
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._load()
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def size(self):
+        """
+        int: El espacio en disco de los datos pendientes en bytes.
+        """
+        return sum(entry[0] for entry in self.entries.values())
+
+    def store(self, payload, compressed=False):
+        """
+        Guarda un JSON que no pudo ser enviado.
+
+        :param payload: Los bytes del JSON.
+        :param compressed: Si el JSON ya está comprimido con gzip.
+
+        :return: La secuencia asignada al JSON.
+        """
+        data = payload if compressed else Spool._compress(payload)
+
+        with self.lock:
+            self.sequence += 1
+            sequence = self.sequence
+
+            path = self._path(sequence)
+            temporary = path + ".tmp"
+            with open(temporary, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.rename(temporary, path)
+
+            self.entries[sequence] = (len(data), time.time(), compressed)
+            self._append("+,{0},{1},{2:.3f},{3}".format(sequence, len(data), self.entries[sequence][1], int(compressed)))
+            self._evict()
+
+        print(utils.Colors.WARNING + "WARN: Datos guardados en el spool ({0} pendientes).".format(len(self.entries)) + utils.Colors.ENDC)
+
+        return sequence
+
+    def pending(self, newest_first=False):
+        """
+        Devuelve las secuencias pendientes.
+
+        :param newest_first: Ordenar del más nuevo al más antiguo.
+
+        :return: Una lista de secuencias.
+        """
+        with self.lock:
+            sequences = list(self.entries)
+
+        return sequences[::-1] if newest_first else sequences
+
+    def load(self, sequence):
+        """
+        Lee un JSON pendiente.
+
+        :param sequence: La secuencia del JSON.
+
+        :return: Tupla con los bytes del JSON y si están comprimidos con gzip.
+        """
+        with self.lock:
+            compressed = self.entries[sequence][2]
+
+        with open(self._path(sequence), "rb") as f:
+            data = f.read()
+
+        return (data, True) if compressed else (Spool._decompress(data), False)
+
+    def remove(self, sequence):
+        """
+        Borra un JSON pendiente, por ejemplo luego de que fue enviado.
+
+        :param sequence: La secuencia del JSON.
+
+        :return: void
+        """
+        with self.lock:
+            if sequence not in self.entries:
+                return
+
+            del self.entries[sequence]
+            self._append("-,{0}".format(sequence))
+            try:
+                os.remove(self._path(sequence))
+            except OSError:
+                pass
+
+    def reject(self, sequence):
+        """
+        Aparta un JSON pendiente que el Controlador rechazó, para que no bloquee el reenvío de
+        los siguientes. El archivo se mueve a *REJECTED_DIRECTORY* para poder revisarlo.
+
+        :param sequence: La secuencia del JSON.
+
+        :return: void
+        """
+        rejected = os.path.join(self.directory, self.REJECTED_DIRECTORY)
+        with self.lock:
+            if sequence not in self.entries:
+                return
+
+            if not os.path.exists(rejected):
+                os.makedirs(rejected)
+            try:
+                os.rename(self._path(sequence), os.path.join(rejected, os.path.basename(self._path(sequence))))
+            except OSError:
+                pass
+            self.remove(sequence)
+
+        print(utils.Colors.WARNING + "WARN: Dato {0} rechazado por el Controlador, apartado en {1}.".format(
+            sequence, rejected) + utils.Colors.ENDC)
+
+    def replay(self, send, newest_first=False, batch_size=None):
+        """
+        Reenvía un lote de datos pendientes. El reenvío se detiene en el primer error, ya que
+        significa que el Controlador todavía no responde. Los datos que el Controlador rechaza
+        se apartan con *reject* y el reenvío continúa con los siguientes.
+
+        :param send: Función que recibe los bytes del JSON y si están comprimidos y devuelve \
+            True si el Controlador los aceptó, None si los rechazó y False si no respondió. \
+            Ej. *Uploader.send*.
+        :param newest_first: Reenviar primero los datos más nuevos.
+        :param batch_size: La cantidad máxima de datos a reenviar. Por defecto *BATCH_SIZE*.
+
+        :return: La cantidad de datos reenviados.
+        """
+        sent = 0
+        for sequence in self.pending(newest_first)[:batch_size or self.BATCH_SIZE]:
+            try:
+                payload, compressed = self.load(sequence)
+            except (IOError, OSError, KeyError) as e:
+                print(utils.Colors.FAIL + "ERROR: Leyendo dato {0} del spool. DESC: {1}".format(sequence, e) + utils.Colors.ENDC)
+                self.remove(sequence)
+                continue
+
+            accepted = send(payload, compressed)
+            if accepted is None:
+                self.reject(sequence)
+                continue
+            if not accepted:
+                break
+
+            self.remove(sequence)
+            sent += 1
+
+        if sent > 0:
+            print(utils.Colors.BOLD + "INFO: Reenviados {0} datos del spool ({1} pendientes).".format(sent, len(self.entries)) + utils.Colors.ENDC)
+
+        return sent
+
+    def drain(self, send, newest_first=False):
+        """
+        Reenvía lotes hasta vaciar el spool o hasta que el Controlador deje de responder.
+
+        :param send: Función de envío, ver *replay*.
+        :param newest_first: Reenviar primero los datos más nuevos.
+
+        :return: La cantidad de datos reenviados.
+        """
+        total = 0
+        while len(self.entries) > 0:
+            pending = len(self.entries)
+            total += self.replay(send, newest_first)
+            if len(self.entries) == pending:
+                break
+
+        return total
+
+    def _evict(self):
+        size = self.size
+        while len(self.entries) > 0 and (size > self.MAX_BYTES or len(self.entries) > self.MAX_ENTRIES):
+            sequence = next(iter(self.entries))
+            size -= self.entries[sequence][0]
+            self.remove(sequence)
+            print(utils.Colors.WARNING + "WARN: Spool lleno, descartado dato {0}.".format(sequence) + utils.Colors.ENDC)
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return
+
+        with open(self.index_path, "r") as f:
+            for line in f:
+                fields = line.strip().split(",")
+                try:
+                    sequence = int(fields[1])
+                    if fields[0] == "+":
+                        self.entries[sequence] = (int(fields[2]), float(fields[3]), fields[4] == "1")
+                    elif fields[0] == "-":
+                        self.entries.pop(sequence, None)
+                    self.sequence = max(self.sequence, sequence)
+                except (IndexError, ValueError):
+                    continue  # línea incompleta, por ejemplo por un corte de luz.
+
+        # descartar entradas cuyo archivo ya no existe.
+        for sequence in [s for s in self.entries if not os.path.exists(self._path(s))]:
+            del self.entries[sequence]
+
+        self._compact()
+
+    def _compact(self):
+        temporary = self.index_path + ".tmp"
+        with open(temporary, "w") as f:
+            f.write("=,{0}\n".format(self.sequence))
+            for sequence, (size, created, compressed) in self.entries.items():
+                f.write("+,{0},{1},{2:.3f},{3}\n".format(sequence, size, created, int(compressed)))
+        os.rename(temporary, self.index_path)
+
+    def _append(self, line):
+        with open(self.index_path, "a") as f:
+            f.write(line + "\n")
+
+    def _path(self, sequence):
+        return os.path.join(self.directory, "{0:012d}.json.gz".format(sequence))
+
+    @staticmethod
+    def _compress(payload):
+        buffer = io.BytesIO()
+        stream = gzip.GzipFile(fileobj=buffer, mode="wb")
+        stream.write(payload)
+        stream.close()
+
+        return buffer.getvalue()
+
+    @staticmethod
+    def _decompress(data):
+        return gzip.GzipFile(fileobj=io.BytesIO(data), mode="rb").read()
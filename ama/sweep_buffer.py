@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+
+"""
+Clase perteneciente al módulo de procesamiento de datos e inferencias Ama.
+
+.. module:: sweep_buffer
+   :platform: Unix
+   :synopsis: Buffer circular en disco con los últimos barridos decodificados de una capa.
+
+.. moduleauthor:: Andreas P. Koenzen <akc@apkc.net>
+"""
+
+import ama.accumulator as accumulator
+import ama.correlator as correlator
+import ama.utils as utils
+import json
+import numpy as np
+import os
+import threading
+
+__author__ = "Andreas P. Koenzen"
+__copyright__ = "Copyright 2016, Proyecto de Tesis / Universidad Católica de Asunción."
+__credits__ = "Andreas P. Koenzen"
+__license__ = "BSD"
+__version__ = "0.1"
+__maintainer__ = "Andreas P. Koenzen"
+__email__ = "akc@apkc.net"
+__status__ = "Prototype"
+
+
+class SweepBuffer:
+    """
+    Los últimos *capacity* barridos decodificados de una capa, guardados en un único arreglo de
+    *capacity*xNxM abierto en modo *memory-map* junto con un índice de horas y la geometría de la capa.
+
+    Permite calcular productos sobre una ventana de tiempo (máximo, promedio, cantidad de barridos
+    sobre un umbral) y volver a procesar los barridos con otros parámetros sin leer los archivos
+    HDF5, que en modo *run* pueden haber sido borrados.
+    """
+
+    ###### OPCIONES DE BUFFER ######
+    DIRECTORY = "sweep_buffer"
+    """
+    string: El directorio, relativo a la variable de entorno AMA_EXPORT_DATA, donde se guardan los barridos.
+    """
+    CAPACITY = 12
+    """
+    int: La cantidad de barridos por capa por defecto, ej. una hora con un barrido cada 5 minutos.
+    """
+
+    _entries = {}
+    _lock = threading.Lock()
+
+    def __init__(self, layer, capacity=None):
+        """
+        Abre el buffer de una capa. Si no existe se crea recién con el primer barrido.
+
+        :param layer: La capa de datos.
+        :param capacity: La cantidad de barridos. *None* para utilizar la del buffer existente o *CAPACITY*.
+        """
+        self.layer = layer
+        self.directory = os.path.join(os.environ["AMA_EXPORT_DATA"], self.DIRECTORY, "layer_{0}".format(layer))
+        self.lock = threading.Lock()
+        self.sweeps = None
+
+        self.index = self._read_index()
+        if self.index is not None and capacity is not None and self.index["capacity"] != capacity:
+            print(utils.Colors.WARNING + "WARN: La capacidad del buffer de la capa {0} cambió, reiniciando...".format(
+                layer) + utils.Colors.ENDC)
+            self.index = None
+
+        self.capacity = int(capacity or (self.index["capacity"] if self.index is not None else self.CAPACITY))
+        if self.index is not None:
+            self.sweeps = np.load(os.path.join(self.directory, "sweeps.npy"), mmap_mode="r+")
+
+    def __len__(self):
+        return 0 if self.index is None else min(self.index["sequence"], self.capacity)
+
+    @staticmethod
+    def default(layer, capacity=None):
+        """
+        Devuelve el buffer de una capa compartido por todo el proceso, abriéndolo la primera vez.
+
+        :param layer: La capa de datos.
+        :param capacity: La cantidad de barridos.
+
+        :return: Un *SweepBuffer*.
+        """
+        with SweepBuffer._lock:
+            buffer = SweepBuffer._entries.get(layer)
+            if buffer is None or (capacity is not None and buffer.capacity != capacity):
+                buffer = SweepBuffer(layer, capacity)
+                SweepBuffer._entries[layer] = buffer
+
+            return buffer
+
+    def add(self, data, metadata):
+        """
+        Agrega el barrido de reflectividad (*Z*) de la capa, reemplazando al más antiguo si el
+        buffer está lleno.
+
+        :param data: Los datos devueltos por *Processor.process*.
+        :param metadata: Los metadatos devueltos por *Processor.process*.
+
+        :return: True si el barrido fue agregado, False si ya estaba en el buffer.
+        """
+        layer_key = u"SCAN{0}".format(self.layer)
+        scan = metadata[layer_key]
+        values = np.asarray(data[layer_key][u"Z"]["data"], dtype=np.float32)
+        geometry = {
+            "shape": list(values.shape),
+            "azimuths": [float(k) for k in scan["az"]],
+            "ranges": [float(k) for k in scan["r"]],
+            "elevation": None if scan.get("elevation") is None else float(scan.get("elevation")),
+            "latitude": float(metadata["VOL"]["Latitude"]),
+            "longitude": float(metadata["VOL"]["Longitude"])
+        }
+
+        with self.lock:
+            if self.index is None or self.index["geometry"] != geometry:
+                if self.index is not None:
+                    print(utils.Colors.WARNING + "WARN: La geometría de la capa {0} cambió, reiniciando el buffer...".format(
+                        self.layer) + utils.Colors.ENDC)
+                self._create(geometry)
+
+            if scan["Time"] in self.index["times"]:
+                return False
+
+            slot = self.index["sequence"] % self.capacity
+            self.sweeps[slot] = values
+            self.sweeps.flush()
+
+            self.index["times"][slot] = scan["Time"]
+            self.index["epochs"][slot] = accumulator.RainfallAccumulator.epoch(scan["Time"])
+            self.index["sequence"] += 1
+            self._write_index()
+
+        return True
+
+    def window(self, seconds=None):
+        """
+        Devuelve las posiciones de los barridos dentro de una ventana de tiempo que termina en el
+        barrido más reciente.
+
+        :param seconds: La duración de la ventana en segundos. *None* para todos los barridos.
+
+        :return: Vector con las posiciones ordenadas del más antiguo al más reciente.
+        """
+        if len(self) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        epochs = np.array([-1 if k is None else k for k in self.index["epochs"]], dtype=np.int64)
+        slots = np.nonzero(epochs >= 0)[0]
+        slots = slots[np.argsort(epochs[slots], kind="mergesort")]
+        if seconds is not None:
+            slots = slots[epochs[slots] > epochs[slots[-1]] - seconds]
+
+        return slots
+
+    def maximum(self, seconds=None):
+        """
+        Calcula la reflectividad máxima de cada gate dentro de una ventana.
+
+        :param seconds: La duración de la ventana en segundos. *None* para todos los barridos.
+
+        :return: Matriz de NxM con las reflectividades.
+        """
+        return self._stack(seconds).max(axis=0)
+
+    def mean(self, seconds=None):
+        """
+        Calcula la reflectividad promedio de cada gate dentro de una ventana, solo sobre los
+        barridos con datos en el gate.
+
+        :param seconds: La duración de la ventana en segundos. *None* para todos los barridos.
+
+        :return: Matriz de NxM con las reflectividades. *NaN* en los gates sin datos.
+        """
+        stack = self._stack(seconds)
+        valid = stack > correlator.Correlator.NO_DATA
+        counts = valid.sum(axis=0)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, np.where(valid, stack, 0.).sum(axis=0) / counts, np.nan)
+
+    def count(self, threshold, seconds=None):
+        """
+        Cuenta en cuántos barridos de una ventana cada gate supera un umbral.
+
+        :param threshold: La reflectividad mínima (inclusive).
+        :param seconds: La duración de la ventana en segundos. *None* para todos los barridos.
+
+        :return: Matriz de NxM de enteros.
+        """
+        return (self._stack(seconds) >= threshold).sum(axis=0)
+
+    def scan(self, values=None, slot=None):
+        """
+        Arma los datos y metadatos de un barrido del buffer, o de una matriz calculada sobre él,
+        con la misma estructura que *Processor.process*. Así pueden pasarse directamente a la
+        correlación y al agrupamiento.
+
+        :param values: Matriz de NxM a utilizar como reflectividad, ej. la de *maximum*.
+        :param slot: La posición del barrido a utilizar si no se pasa *values*. Por defecto el más reciente.
+
+        :return: Tupla con los datos y los metadatos.
+        """
+        if len(self) == 0:
+            raise ValueError("El buffer de la capa {0} está vacío.".format(self.layer))
+
+        slots = self.window()
+        slot = slots[-1] if slot is None else slot
+        if values is None:
+            values = np.asarray(self.sweeps[slot], dtype=np.float64)
+
+        geometry = self.index["geometry"]
+        layer_key = u"SCAN{0}".format(self.layer)
+        metadata = {
+            u"VOL": {"Latitude": geometry["latitude"], "Longitude": geometry["longitude"]},
+            layer_key: {
+                "az": np.array(geometry["azimuths"]),
+                "r": np.array(geometry["ranges"]),
+                "elevation": geometry["elevation"],
+                "Time": self.index["times"][slot]
+            }
+        }
+
+        return {layer_key: {u"Z": {"data": values}}}, metadata
+
+    def replay(self, seconds=None):
+        """
+        Recorre los barridos de una ventana, del más antiguo al más reciente, sin leer archivos.
+
+        :param seconds: La duración de la ventana en segundos. *None* para todos los barridos.
+
+        :return: Un generador de tuplas con los datos y los metadatos de cada barrido, ver *scan*.
+        """
+        for slot in self.window(seconds):
+            yield self.scan(slot=slot)
+
+    def _stack(self, seconds):
+        slots = self.window(seconds)
+        if len(slots) == 0:
+            raise ValueError("El buffer de la capa {0} está vacío.".format(self.layer))
+
+        return np.asarray(self.sweeps[np.sort(slots)], dtype=np.float64)
+
+    def _read_index(self):
+        path = os.path.join(self.directory, "index.json")
+        if not os.path.exists(path) or not os.path.exists(os.path.join(self.directory, "sweeps.npy")):
+            return None
+
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def _create(self, geometry):
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+        self.sweeps = np.lib.format.open_memmap(os.path.join(self.directory, "sweeps.npy"), mode="w+",
+                                                dtype=np.float32, shape=(self.capacity,) + tuple(geometry["shape"]))
+        self.index = {
+            "capacity": self.capacity,
+            "geometry": geometry,
+            "sequence": 0,
+            "times": [None] * self.capacity,
+            "epochs": [None] * self.capacity
+        }
+        self._write_index()
+
+    def _write_index(self):
+        path = os.path.join(self.directory, "index.json")
+        temporary = "{0}.{1}.tmp".format(path, os.getpid())
+        with open(temporary, "w") as f:
+            json.dump(self.index, f)
+        os.rename(temporary, path)
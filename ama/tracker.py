@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+
+"""
+Clase perteneciente al módulo de procesamiento de datos e inferencias Ama.
+
+.. module:: tracker
+   :platform: Unix
+   :synopsis: Seguimiento de celdas de tormenta entre barridos consecutivos.
+
+.. moduleauthor:: Andreas P. Koenzen <akc@apkc.net>
+"""
+
+import ama.accumulator as accumulator
+import ama.utils as utils
+import json
+import numpy as np
+import os
+import threading
+
+from scipy.spatial import cKDTree
+
+__author__ = "Andreas P. Koenzen"
+__copyright__ = "Copyright 2016, Proyecto de Tesis / Universidad Católica de Asunción."
+__credits__ = "Andreas P. Koenzen"
+__license__ = "BSD"
+__version__ = "0.1"
+__maintainer__ = "Andreas P. Koenzen"
+__email__ = "akc@apkc.net"
+__status__ = "Prototype"
+
+
+class StormTracker:
+    """
+    Sigue las celdas de tormenta (clusters) de una capa de un barrido al siguiente.
+
+    De cada barrido solo se guardan los resúmenes de sus celdas: identificador, centroide,
+    rectángulo, área, reflectividad máxima y velocidad. Con el barrido nuevo se predice la
+    posición de cada celda según su velocidad, se buscan las celdas nuevas cercanas a cada
+    predicción con un *KD-Tree* y se asignan los pares de menor costo, combinando distancia y
+    superposición de rectángulos. Las celdas nuevas sin par reciben un identificador nuevo.
+
+    El estado se guarda como JSON en *DIRECTORY*, por lo tanto el seguimiento continúa entre
+    archivos de *FileListener* y entre reinicios del proceso.
+    """
+
+    ###### OPCIONES DE SEGUIMIENTO ######
+    DIRECTORY = "tracks"
+    """
+    string: El directorio, relativo a la variable de entorno AMA_EXPORT_DATA, donde se guarda el estado.
+    """
+    MATCH_DISTANCE = 20.
+    """
+    float: La distancia máxima en km entre la posición predicha de una celda y una celda nueva para asignarlas.
+    """
+    MAXIMUM_GAP = 1800
+    """
+    int: El tiempo máximo en segundos entre dos barridos para continuar las celdas. Pasado este tiempo \
+        todas las celdas son nuevas.
+    """
+    MAXIMUM_MISSES = 1
+    """
+    int: La cantidad de barridos que una celda puede no encontrarse antes de descartarla.
+    """
+    SMOOTHING = 0.5
+    """
+    float: El peso del último desplazamiento en la velocidad de una celda. 1 para no suavizar.
+    """
+    KMS_PER_DEGREE = 6371.0088 * np.pi / 180.
+    """
+    float: La cantidad de kilómetros en un grado de latitud.
+    """
+
+    _entries = {}
+    _lock = threading.Lock()
+
+    def __init__(self, layer):
+        self.layer = layer
+        self.directory = os.path.join(os.environ["AMA_EXPORT_DATA"], self.DIRECTORY)
+        self.path = os.path.join(self.directory, "layer_{0}.json".format(layer))
+        self.lock = threading.Lock()
+
+        self.state = {"time": None, "next_id": 1, "tracks": []}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    self.state = json.load(f)
+            except ValueError:
+                print(utils.Colors.WARNING + "WARN: Estado de seguimiento inválido en {0}, reiniciando...".format(
+                    self.path) + utils.Colors.ENDC)
+
+    @staticmethod
+    def default(layer):
+        """
+        Devuelve el seguimiento de una capa compartido por todo el proceso, leyéndolo la primera vez.
+
+        :param layer: La capa de datos.
+
+        :return: Un *StormTracker*.
+        """
+        with StormTracker._lock:
+            if layer not in StormTracker._entries:
+                StormTracker._entries[layer] = StormTracker(layer)
+
+            return StormTracker._entries[layer]
+
+    def update(self, clusters, scan_time):
+        """
+        Asigna identificadores a los clusters de un barrido nuevo y actualiza el estado.
+
+        :param clusters: Un *ClusterSet*.
+        :param scan_time: La hora del barrido en formato ISO 8601.
+
+        :return: Una lista con un diccionario por cluster, en el orden de *clusters*, con su \
+            identificador (*id*), cantidad de barridos (*edad*), velocidad Este/Norte en km/h \
+            (*velocidad*), crecimiento del área en km²/h (*crecimiento*) y tendencia de la \
+            reflectividad máxima en dBZ/h (*tendencia*). *None* si el barrido es anterior al último.
+        """
+        now = accumulator.RainfallAccumulator.epoch(scan_time)
+
+        with self.lock:
+            last = self.state["time"]
+            if last is not None and now <= last:
+                print(utils.Colors.WARNING + "WARN: El barrido es anterior al último seguido, obviando..." + utils.Colors.ENDC)
+                return None
+
+            previous = self.state["tracks"] if last is not None and now - last <= self.MAXIMUM_GAP else []
+            pairs = self._match(previous, clusters, now)
+
+            tracks = []
+            cells = []
+            matched = set()
+            for k in range(len(clusters)):
+                latitude, longitude = float(clusters.centroids[k, 0]), float(clusters.centroids[k, 1])
+                track = {
+                    "id": None,
+                    "lat": latitude,
+                    "lon": longitude,
+                    "bbox": [float(v) for v in clusters.bbox[k]],
+                    "area": float(clusters.area[k]),
+                    "max_dBZ": float(clusters.max_dBZ[k]),
+                    "u": 0.,
+                    "v": 0.,
+                    "growth": 0.,
+                    "trend": 0.,
+                    "age": 1,
+                    "misses": 0,
+                    "seen": now
+                }
+
+                if k in pairs:
+                    old = previous[pairs[k]]
+                    matched.add(pairs[k])
+                    hours_since = (now - old["seen"]) / 3600.
+                    u = (longitude - old["lon"]) * self.KMS_PER_DEGREE * np.cos(np.radians(latitude)) / hours_since
+                    v = (latitude - old["lat"]) * self.KMS_PER_DEGREE / hours_since
+                    weight = self.SMOOTHING if old["age"] > 1 else 1.
+
+                    track["id"] = old["id"]
+                    track["u"] = float(weight * u + (1. - weight) * old["u"])
+                    track["v"] = float(weight * v + (1. - weight) * old["v"])
+                    track["growth"] = float((track["area"] - old["area"]) / hours_since)
+                    track["trend"] = float((track["max_dBZ"] - old["max_dBZ"]) / hours_since)
+                    track["age"] = old["age"] + 1
+                else:
+                    track["id"] = self.state["next_id"]
+                    self.state["next_id"] += 1
+
+                tracks.append(track)
+                cells.append({
+                    "id": track["id"],
+                    "edad": track["age"],
+                    "velocidad": [round(track["u"], 1), round(track["v"], 1)],
+                    "crecimiento": round(track["growth"], 1),
+                    "tendencia": round(track["trend"], 1)
+                })
+
+            # las celdas no encontradas se mantienen unos barridos, por si reaparecen.
+            for j, old in enumerate(previous):
+                if j not in matched and old["misses"] < self.MAXIMUM_MISSES:
+                    old = dict(old)
+                    old["misses"] += 1
+                    tracks.append(old)
+
+            self.state["time"] = now
+            self.state["tracks"] = tracks
+            self._write_state()
+
+        return cells
+
+    def _match(self, previous, clusters, now):
+        if len(previous) == 0 or len(clusters) == 0:
+            return {}
+
+        # la posición y el rectángulo predichos de cada celda anterior según su velocidad.
+        latitudes = np.array([track["lat"] for track in previous])
+        scale = np.cos(np.radians(latitudes))
+        elapsed = (now - np.array([track["seen"] for track in previous], dtype=np.float64)) / 3600.
+        shift_lat = np.array([track["v"] for track in previous]) * elapsed / self.KMS_PER_DEGREE
+        shift_lon = np.array([track["u"] for track in previous]) * elapsed / (self.KMS_PER_DEGREE * scale)
+
+        predicted = np.column_stack((latitudes + shift_lat, np.array([track["lon"] for track in previous]) + shift_lon))
+        boxes = np.array([track["bbox"] for track in previous]) + np.column_stack((shift_lat, shift_lon, shift_lat, shift_lon))
+
+        # distancias en km sobre un plano local, suficiente para las escalas de una tormenta.
+        reference = np.cos(np.radians(np.mean(latitudes)))
+        tree = cKDTree(np.column_stack((predicted[:, 0], predicted[:, 1] * reference)) * self.KMS_PER_DEGREE)
+        centroids = np.column_stack((clusters.centroids[:, 0], clusters.centroids[:, 1] * reference)) * self.KMS_PER_DEGREE
+
+        candidates = []
+        for k, neighbors in enumerate(tree.query_ball_point(centroids, self.MATCH_DISTANCE)):
+            for j in neighbors:
+                distance = np.hypot(*(centroids[k] - tree.data[j]))
+                cost = distance / self.MATCH_DISTANCE - StormTracker._overlap(clusters.bbox[k], boxes[j])
+                candidates.append((cost, k, j))
+
+        # asignar primero los pares de menor costo.
+        pairs = {}
+        used = set()
+        for cost, k, j in sorted(candidates):
+            if k not in pairs and j not in used:
+                pairs[k] = j
+                used.add(j)
+
+        return pairs
+
+    @staticmethod
+    def _overlap(a, b):
+        height = min(a[2], b[2]) - max(a[0], b[0])
+        width = min(a[3], b[3]) - max(a[1], b[1])
+        if height <= 0 or width <= 0:
+            return 0.
+
+        intersection = height * width
+        union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+
+        return intersection / union if union > 0 else 0.
+
+    def _makedirs(self):
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+    def _write_state(self):
+        self._makedirs()
+        temporary = "{0}.{1}.tmp".format(self.path, os.getpid())
+        with open(temporary, "w") as f:
+            json.dump(self.state, f)
+        os.rename(temporary, self.path)
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+
+"""
+Clase perteneciente al módulo de procesamiento de datos e inferencias Ama.
+
+.. module:: uploader
+   :platform: Unix
+   :synopsis: Cliente HTTP para el envío de datos al Controlador.
+
+.. moduleauthor:: Andreas P. Koenzen <akc@apkc.net>
+"""
+
+import ama.spool as spool
+import ama.utils as utils
+import os
+import random
+import requests
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+__author__ = "Andreas P. Koenzen"
+__copyright__ = "Copyright 2016, Proyecto de Tesis / Universidad Católica de Asunción."
+__credits__ = "Andreas P. Koenzen"
+__license__ = "BSD"
+__version__ = "0.1"
+__maintainer__ = "Andreas P. Koenzen"
+__email__ = "akc@apkc.net"
+__status__ = "Prototype"
+
+
+class Uploader:
+    """
+    Cliente para el servicio Web del Controlador (*/ama/datos/insertar*).
+
+    Mantiene una sesión con un pool de conexiones persistentes, reintenta los envíos que
+    fallan por errores 5xx, 408, 429 o por timeout con espera exponencial más un componente
+    aleatorio y opcionalmente envía en un hilo de fondo para no bloquear el procesamiento.
+
+    El destino y las credenciales se configuran con las variables de entorno
+    AMA_CONTROLLER_URL, AMA_CONTROLLER_USER y AMA_CONTROLLER_PASSWORD, o como argumentos. Las
+    credenciales no tienen valores por defecto.
+    """
+
+    ###### OPCIONES DE ENVIO ######
+    URL = "http://127.0.0.1:80/ama/datos/insertar"
+    """
+    string: El URL por defecto del servicio Web.
+    """
+    TIMEOUT = 30
+    """
+    int: El tiempo máximo de espera de cada pedido en segundos.
+    """
+    RETRIES = 4
+    """
+    int: La cantidad de reintentos luego del primer envío fallido.
+    """
+    BACKOFF_BASE = 1.0
+    """
+    float: La espera base entre reintentos en segundos. Se duplica en cada reintento.
+    """
+    BACKOFF_MAX = 30.0
+    """
+    float: La espera máxima entre reintentos en segundos, también para la indicada en *Retry-After*.
+    """
+    RETRY_STATUS = (408, 429)
+    """
+    tuple: Los errores 4xx temporales que se reintentan, además de los 5xx.
+    """
+    POOL_SIZE = 4
+    """
+    int: La cantidad máxima de conexiones persistentes.
+    """
+    QUEUE_SIZE = 16
+    """
+    int: La cantidad máxima de envíos pendientes en el hilo de fondo.
+    """
+    USE_SPOOL = True
+    """
+    boolean: Guardar en disco los datos que el Controlador no aceptó, para reenviarlos luego.
+    """
+    REPLAY_NEWEST_FIRST = False
+    """
+    boolean: Reenviar primero los datos pendientes más nuevos.
+    """
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, url=None, user=None, password=None, timeout=None, retries=None, spool=None):
+        self.url = url or os.environ.get("AMA_CONTROLLER_URL", self.URL)
+        self.timeout = self.TIMEOUT if timeout is None else timeout
+        self.retries = self.RETRIES if retries is None else retries
+        self.spool = spool
+
+        user = user or os.environ.get("AMA_CONTROLLER_USER")
+        password = password or os.environ.get("AMA_CONTROLLER_PASSWORD")
+        if not user or not password:
+            raise ValueError("Credenciales del Controlador no definidas, utilizar AMA_CONTROLLER_USER y AMA_CONTROLLER_PASSWORD.")
+
+        self.session = requests.Session()
+        self.session.auth = (user, password)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.POOL_SIZE)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.queue = None
+        self.thread = None
+        self.generations = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def default():
+        """
+        Devuelve el cliente compartido por todo el proceso, creándolo la primera vez.
+
+        :return: Un *Uploader*.
+        """
+        with Uploader._default_lock:
+            if Uploader._default is None:
+                Uploader._default = Uploader(
+                    spool=spool.Spool() if Uploader.USE_SPOOL and "AMA_EXPORT_DATA" in os.environ else None)
+
+            return Uploader._default
+
+    @property
+    def running(self):
+        """
+        boolean: Si el hilo de envío en segundo plano está activo.
+        """
+        return self.thread is not None and self.thread.is_alive()
+
+    def send(self, payload, compressed=False):
+        """
+        Envía un JSON al Controlador, reintentando ante errores 5xx, 408, 429 o timeouts.
+
+        :param payload: Los bytes del JSON.
+        :param compressed: Si el JSON está comprimido con gzip.
+
+        :return: True si el Controlador aceptó los datos (2xx), None si los rechazó con otro error 4xx, \
+            por lo tanto no tiene sentido volver a enviarlos, y False si no respondió o respondió con un \
+            error temporal.
+        """
+        headers = {"Content-type": "application/json"}
+        if compressed:
+            headers["Content-Encoding"] = "gzip"
+
+        delay = None
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                time.sleep(self.backoff(attempt) if delay is None else delay)
+
+            delay = None
+            try:
+                response = self.session.post(self.url, data=payload, headers=headers, timeout=self.timeout)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                print(utils.Colors.WARNING + "WARN: Intento {0} de envío fallido. DESC: {1}".format(attempt + 1, e) + utils.Colors.ENDC)
+                continue
+
+            if 200 <= response.status_code < 300:
+                return True
+            if response.status_code < 500 and response.status_code not in self.RETRY_STATUS:
+                # errores del cliente, reintentar no cambia el resultado.
+                print(utils.Colors.FAIL + "ERROR: El Controlador rechazó los datos (HTTP {0}).".format(response.status_code) + utils.Colors.ENDC)
+                return None
+
+            delay = self.retry_after(response)
+            print(utils.Colors.WARNING + "WARN: Intento {0} de envío fallido (HTTP {1}).".format(attempt + 1, response.status_code) + utils.Colors.ENDC)
+
+        return False
+
+    def deliver(self, payload, compressed=False, spool=True):
+        """
+        Envía un JSON al Controlador. Si el Controlador no responde el JSON se guarda en el spool,
+        y si el envío tiene éxito se aprovecha para reenviar un lote de datos pendientes. Los JSON
+        rechazados con un error 4xx no se guardan, ya que reenviarlos daría el mismo error.
+
+        :param payload: Los bytes del JSON.
+        :param compressed: Si el JSON está comprimido con gzip.
+        :param spool: Si el JSON debe guardarse en el spool cuando el Controlador no responde. Los \
+            JSON con número de secuencia no se guardan, al reenviarlos ya llegó uno posterior.
+
+        :return: True si el Controlador aceptó los datos, False de lo contrario.
+        """
+        accepted = self.send(payload, compressed)
+        if accepted:
+            if self.spool is not None and len(self.spool) > 0:
+                self.spool.replay(self.send, self.REPLAY_NEWEST_FIRST)
+            return True
+
+        if accepted is False and spool and self.spool is not None:
+            self.spool.store(payload, compressed)
+
+        return False
+
+    def backoff(self, attempt):
+        """
+        Calcula la espera antes de un reintento: exponencial con un tope y un componente
+        aleatorio para que varios procesos no reintenten al mismo tiempo.
+
+        :param attempt: El número de reintento, desde 1.
+
+        :return: La espera en segundos.
+        """
+        return random.uniform(0, min(self.BACKOFF_MAX, self.BACKOFF_BASE * (2 ** (attempt - 1))))
+
+    def retry_after(self, response):
+        """
+        Lee la espera pedida por el Controlador en el encabezado *Retry-After*, en segundos.
+
+        :param response: La respuesta HTTP.
+
+        :return: La espera en segundos, como máximo *BACKOFF_MAX*, o *None* si no se indicó en segundos.
+        """
+        try:
+            return min(self.BACKOFF_MAX, max(0., float(response.headers["Retry-After"])))
+        except (KeyError, ValueError):
+            return None
+
+    def start(self):
+        """
+        Lanza el hilo de envío en segundo plano.
+
+        :return: void
+        """
+        if self.running:
+            return
+
+        self.queue = queue.Queue(self.QUEUE_SIZE)
+        self.thread = threading.Thread(target=self._run, name="ama-uploader")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, payload, compressed=False, spool=True, on_failure=None, group=None):
+        """
+        Entrega un JSON al hilo de envío. Si la cola está llena se espera a que se libere lugar.
+
+        :param payload: Los bytes del JSON.
+        :param compressed: Si el JSON está comprimido con gzip.
+        :param spool: Si el JSON debe guardarse en el spool cuando el Controlador no responde. Ver *deliver*.
+        :param on_failure: Función sin argumentos que el hilo de envío llama si el Controlador no \
+            aceptó los datos, ej. para forzar un cuadro completo en el próximo envío.
+        :param group: Identificador de los JSON que dependen del anterior, ej. los deltas de una capa. \
+            Si uno falla, los del mismo grupo que ya estaban en la cola se descartan sin enviarse.
+
+        :return: void
+        """
+        if not self.running:
+            raise RuntimeError("El hilo de envío no está activo.")
+
+        with self.lock:
+            generation = self.generations.get(group, 0)
+
+        self.queue.put((payload, compressed, spool, on_failure, group, generation))
+
+    def stop(self, wait=True):
+        """
+        Detiene el hilo de envío.
+
+        :param wait: Esperar a que se envíen todos los datos pendientes.
+
+        :return: void
+        """
+        if not self.running:
+            return
+
+        if wait:
+            self.queue.join()
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+
+                payload, compressed, keep, on_failure, group, generation = item
+                with self.lock:
+                    stale = group is not None and generation < self.generations.get(group, 0)
+                if stale:
+                    print(utils.Colors.WARNING + "WARN: Datos descartados, falló un envío anterior del que dependen." + utils.Colors.ENDC)
+                elif self.deliver(payload, compressed, keep):
+                    print(utils.Colors.BOLD + "INFO: Datos insertados." + utils.Colors.ENDC)
+                else:
+                    print(utils.Colors.FAIL + "ERROR: Insertando datos en WS." + utils.Colors.ENDC)
+                    if group is not None:
+                        # antes de *on_failure*, así lo que se entregue luego ya no se descarta.
+                        with self.lock:
+                            self.generations[group] = generation + 1
+                    if on_failure is not None:
+                        on_failure()
+            except Exception as e:
+                print(utils.Colors.FAIL + "ERROR: Enviando datos en segundo plano." + utils.Colors.ENDC)
+                print(utils.Colors.FAIL + "DESC: {0}".format(e) + utils.Colors.ENDC)
+            finally:
+                self.queue.task_done()
@@ -61,7 +61,7 @@ class Utils:
         matches = []
         counter = 0
 
-        for filename in os.listdir(origin):
+        for filename in sorted(os.listdir(origin)):
             if filename.endswith(".mvol"):
                 if qt != -1 and counter >= qt:
                     break
@@ -77,21 +77,15 @@ class Utils:
 
         return matches
 
-    @staticmethod
-    def deduplicate_correlated_data(ri, lat, lon, data):
-        for i, (r, la, lo) in enumerate(data):
-            if la == lat and lo == lon:
-                print(Colors.WARNING + "WARN: Dato duplicado => RI={0:.2f}={1:.2f} Lat={2:.5f}={3:.5f} Long={4:.5f}={5:.5f}".format(
-                    r, ri, la, lat, lo, lon) + Colors.ENDC)
-                return False
-
-        return True
-
     @staticmethod
     def should_process_file(filename, file_size_limit, double_polarization_mode):
         """
         Chequea si un archivo cumple con las condiciones para ser procesado.
 
+        Para la verificación solo se leen la estructura de grupos y los atributos del archivo,
+        sin decodificar ningún dato. El descriptor devuelto puede ser pasado a la etapa de
+        procesamiento para que el archivo se decodifique una única vez.
+
         :param filename: El archivo a procesar.
         :param file_size_limit: El tamaño máximo de un archivo a procesar. \
             Los archivos que sobrepasen el tamaño serán obviados.
@@ -99,37 +93,49 @@ class Utils:
             Doble". En este modo los archivos son mayores en tamaño, debido a que \
             contienen varias elevaciones del Radar.
 
-        :return: True si el archivo debe ser procesado, False de lo contrario.
+        :return: Un *FileDescriptor* si el archivo debe ser procesado, False de lo contrario.
         """
-
-        import ama.processor as processor
-
         if filename.endswith(".mvol"):
             if double_polarization_mode == False:
                 if os.stat(filename).st_size < file_size_limit:
-                    return True
+                    return Utils.probe_file(filename)
             else:
                 #
                 # Aplicar los chequeos.
                 #
                 if os.stat(filename).st_size > file_size_limit:
                     #
-                    # Abrir el archivo y ver si es de hecho de "Polarización Doble".
+                    # Leer la estructura del archivo y ver si es de hecho de "Polarización Doble".
                     #
                     print(Colors.BOLD + "INFO: Verificando si es de *Polarización Doble*..." + Colors.ENDC)
-                    data, metadata = processor.Processor().process(filename, False)
-                    counter = 0
-                    for k in range(0, 11):
-                        key = u"SCAN{0}".format(k)
-                        if key in metadata:
-                            counter += 1
+                    descriptor = Utils.probe_file(filename)
 
                     #
-                    # Solo si la cantidad de *Metadatos* es mayor que 1 el archivo puede ser de
+                    # Solo si la cantidad de capas es mayor que 1 el archivo puede ser de
                     # "Polarización Doble". De lo contrario significa que solo posee una capa de datos.
                     #
-                    if counter > 1:
+                    if descriptor and descriptor.double_polarization:
                         print(Colors.BOLD + "INFO: Archivo si es de *Polarización Doble*. Procesando..." + Colors.ENDC)
-                        return True
+                        return descriptor
 
         return False
+
+    @staticmethod
+    def probe_file(filename):
+        """
+        Lee la estructura y los atributos de un archivo de radar: cantidad de capas, momentos
+        presentes, fechas/horas de cada capa y la posición del radar.
+
+        :param filename: El archivo a verificar.
+
+        :return: Un *FileDescriptor* con la estructura del archivo, False si el archivo no pudo ser leído.
+        """
+
+        import ama.gamic_reader as gamic_reader
+
+        try:
+            return gamic_reader.GamicReader.probe(filename)
+        except Exception as e:
+            print(Colors.FAIL + "ERROR: El archivo no es un HDF5 GAMIC válido." + Colors.ENDC)
+            print(Colors.FAIL + "DESC: {0}".format(e) + Colors.ENDC)
+            return False
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+
+"""
+Clase perteneciente al módulo de procesamiento de datos e inferencias Ama.
+
+.. module:: volume
+   :platform: Unix
+   :synopsis: Productos compuestos de todo el volumen (máximo en columna y CAPPI) sobre una grilla común.
+
+.. moduleauthor:: Andreas P. Koenzen <akc@apkc.net>
+"""
+
+import ama.georef_cache as georef_cache
+import numpy as np
+import threading
+
+from collections import OrderedDict
+
+__author__ = "Andreas P. Koenzen"
+__copyright__ = "Copyright 2016, Proyecto de Tesis / Universidad Católica de Asunción."
+__credits__ = "Andreas P. Koenzen"
+__license__ = "BSD"
+__version__ = "0.1"
+__maintainer__ = "Andreas P. Koenzen"
+__email__ = "akc@apkc.net"
+__status__ = "Prototype"
+
+
+class VolumeComposite:
+    """
+    Combina todas las capas de un volumen sobre una grilla cartesiana común centrada en el radar.
+
+    Cada capa se agrega con *add* a medida que se decodifica, por lo tanto el volumen completo
+    nunca está en memoria. La celda y la altura del haz de cada gate solo dependen de la geometría
+    de la capa, así que se calculan una sola vez por geometría y se mantienen en un LRU en memoria.
+
+    Productos:
+        - Máximo en columna: la mayor reflectividad de todas las capas sobre cada celda.
+        - CAPPI: la reflectividad de la capa cuyo haz pasa más cerca de una altitud dada sobre \
+          cada celda, dentro de *CAPPI_TOLERANCE*.
+    """
+
+    ###### OPCIONES DE COMPUESTOS ######
+    CELL_SIZE = 1000.
+    """
+    float: El lado de cada celda de la grilla común en metros.
+    """
+    CAPPI_TOLERANCE = 1000.
+    """
+    float: La distancia vertical máxima en metros entre el haz y la altitud del CAPPI.
+    """
+    EFFECTIVE_RADIUS = 4. / 3. * 6371000.
+    """
+    float: El radio efectivo de la Tierra en metros para la propagación del haz (modelo de 4/3).
+    """
+    EARTH_RADIUS = 6371008.8
+    """
+    float: El radio medio de la Tierra en metros, para convertir la grilla a coordenadas geográficas.
+    """
+    MEMORY_ENTRIES = 11
+    """
+    int: La cantidad de geometrías a mantener en memoria. Por defecto una por cada capa del radar.
+    """
+    COLUMN_MAX_LAYER = 0xFFFF
+    """
+    int: El número de capa con el que se guarda el máximo en columna en formato binario.
+    """
+    CAPPI_LAYER = 0xFFFE
+    """
+    int: El número de capa con el que se guarda el CAPPI en formato binario.
+    """
+
+    _entries = OrderedDict()
+    _lock = threading.Lock()
+
+    def __init__(self, radar_latitude, radar_longitude, extent, altitude=None, radar_height=0., cell_size=None):
+        """
+        :param radar_latitude: La latitud del radar.
+        :param radar_longitude: La longitud del radar.
+        :param extent: La distancia máxima al radar en metros que debe cubrir la grilla.
+        :param altitude: La altitud sobre el nivel del mar del CAPPI en metros. *None* para no generarlo.
+        :param radar_height: La altitud sobre el nivel del mar del radar en metros.
+        :param cell_size: El lado de cada celda en metros. Por defecto *CELL_SIZE*.
+        """
+        self.radar_latitude = float(radar_latitude)
+        self.radar_longitude = float(radar_longitude)
+        self.cell_size = float(cell_size or self.CELL_SIZE)
+        self.half = int(np.ceil(float(extent) / self.cell_size))
+        self.side = 2 * self.half
+        self.altitude = altitude
+        self.radar_height = float(radar_height or 0.)
+        self.layers = 0
+
+        self.column = np.full(self.side * self.side, -np.inf)
+        if altitude is not None:
+            self.cappi = np.full(self.side * self.side, -np.inf)
+            self.distance = np.full(self.side * self.side, np.inf)
+
+    def add(self, values, azimuths, ranges, elevation, mask=None):
+        """
+        Agrega una capa.
+
+        :param values: Matriz de NxM con las reflectividades.
+        :param azimuths: Vector de N elementos con los azimuts de cada fila, en grados.
+        :param ranges: Vector de M elementos con las distancias de cada columna, en metros.
+        :param elevation: El ángulo de elevación de la capa, en grados.
+        :param mask: Matriz booleana de NxM con los gates a utilizar, ej. la de un *FilterPipeline*. \
+            Por defecto todos los gates con datos.
+
+        :return: void
+        """
+        order, starts, cells, heights = self.layer_map(azimuths, ranges, elevation)
+
+        values = np.asarray(values, dtype=np.float64)
+        valid = np.isfinite(values) if mask is None else (mask & np.isfinite(values))
+        gates = np.where(valid, values, -np.inf).ravel()[order]
+
+        # la reflectividad máxima de la capa en cada celda que toca.
+        maximum = np.maximum.reduceat(gates, starts) if len(starts) > 0 else np.zeros(0)
+        self.column[cells] = np.maximum(self.column[cells], maximum)
+
+        if self.altitude is not None:
+            #
+            # El CAPPI toma en cada celda la capa cuyo haz pasa más cerca de la altitud pedida,
+            # tenga eco o no. Si el haz más cercano no tiene eco la celda queda vacía.
+            #
+            distance = np.abs(heights + self.radar_height - self.altitude)
+            closer = (distance < self.distance[cells]) & (distance <= self.CAPPI_TOLERANCE)
+            self.cappi[cells[closer]] = maximum[closer]
+            self.distance[cells[closer]] = distance[closer]
+
+        self.layers += 1
+
+    def column_max(self):
+        """
+        Devuelve el máximo en columna.
+
+        :return: Tres vectores con las dBZ, latitudes y longitudes de cada celda con eco.
+        """
+        return self._product(self.column)
+
+    def constant_altitude(self):
+        """
+        Devuelve el CAPPI.
+
+        :return: Tres vectores con las dBZ, latitudes y longitudes de cada celda con eco.
+        """
+        if self.altitude is None:
+            raise ValueError("El compuesto no fue creado con una altitud de CAPPI.")
+
+        return self._product(self.cappi)
+
+    def layer_map(self, azimuths, ranges, elevation):
+        """
+        Devuelve el mapa de índices de una capa sobre la grilla común.
+
+        :param azimuths: Vector de N elementos con los azimuts de cada fila, en grados.
+        :param ranges: Vector de M elementos con las distancias de cada columna, en metros.
+        :param elevation: El ángulo de elevación de la capa, en grados.
+
+        :return: Tupla con los índices de los gates dentro de la grilla ordenados por celda, el \
+            inicio de cada celda en ese orden, las celdas tocadas por la capa y la altura media \
+            del haz sobre el radar en cada una de ellas.
+        """
+        key = "{0}.{1:g}.{2}".format(
+            georef_cache.GeorefCache.key(azimuths, ranges, self.radar_latitude, self.radar_longitude, elevation),
+            self.cell_size, self.half)
+
+        with VolumeComposite._lock:
+            if key in VolumeComposite._entries:
+                geometry = VolumeComposite._entries.pop(key)
+                VolumeComposite._entries[key] = geometry  # mover al final, es el más reciente.
+                return geometry
+
+        geometry = self._compute(azimuths, ranges, elevation)
+
+        with VolumeComposite._lock:
+            VolumeComposite._entries[key] = geometry
+            while len(VolumeComposite._entries) > VolumeComposite.MEMORY_ENTRIES:
+                VolumeComposite._entries.popitem(last=False)
+
+        return geometry
+
+    @staticmethod
+    def beam(ranges, elevation):
+        """
+        Calcula la altura del haz sobre el radar y la distancia sobre la superficie para cada
+        distancia de una capa, con el modelo de radio efectivo de 4/3.
+
+        :param ranges: Vector con las distancias sobre el haz, en metros.
+        :param elevation: El ángulo de elevación, en grados.
+
+        :return: Dos vectores, alturas y distancias sobre la superficie, en metros.
+        """
+        ranges = np.asarray(ranges, dtype=np.float64)
+        elevation = np.radians(float(elevation or 0.))
+        radius = VolumeComposite.EFFECTIVE_RADIUS
+
+        heights = np.sqrt(ranges ** 2 + radius ** 2 + 2. * ranges * radius * np.sin(elevation)) - radius
+        surface = radius * np.arcsin(ranges * np.cos(elevation) / (radius + heights))
+
+        return heights, surface
+
+    @staticmethod
+    def clear():
+        """
+        Vacía el LRU en memoria.
+
+        :return: void
+        """
+        with VolumeComposite._lock:
+            VolumeComposite._entries.clear()
+
+    def _compute(self, azimuths, ranges, elevation):
+        heights, surface = VolumeComposite.beam(ranges, elevation)
+        azimuths = np.radians(np.asarray(azimuths, dtype=np.float64))
+
+        x = np.sin(azimuths)[:, np.newaxis] * surface[np.newaxis, :]
+        y = np.cos(azimuths)[:, np.newaxis] * surface[np.newaxis, :]
+        ix = np.floor(x / self.cell_size).astype(np.int64) + self.half
+        iy = np.floor(y / self.cell_size).astype(np.int64) + self.half
+
+        inside = ((ix >= 0) & (ix < self.side) & (iy >= 0) & (iy < self.side)).ravel()
+        keys = (iy * self.side + ix).ravel()
+        gates = np.nonzero(inside)[0]
+
+        order = gates[np.argsort(keys[gates], kind="mergesort")]
+        cells, starts = np.unique(keys[order], return_index=True)
+
+        gate_heights = np.broadcast_to(heights[np.newaxis, :], x.shape).ravel()[order]
+        mean_heights = np.add.reduceat(gate_heights, starts) / np.diff(np.append(starts, len(order)))
+
+        return order, starts, cells, mean_heights
+
+    def _product(self, grid):
+        cells = np.nonzero(np.isfinite(grid))[0]
+
+        # el centro de cada celda sobre el plano azimutal equidistante del radar.
+        x = ((cells % self.side) - self.half + .5) * self.cell_size
+        y = ((cells // self.side) - self.half + .5) * self.cell_size
+        rho = np.hypot(x, y)
+        c = rho / self.EARTH_RADIUS
+
+        lat0 = np.radians(self.radar_latitude)
+        lon0 = np.radians(self.radar_longitude)
+        lat = np.arcsin(np.cos(c) * np.sin(lat0) + y * np.sin(c) * np.cos(lat0) / rho)
+        lon = lon0 + np.arctan2(x * np.sin(c), rho * np.cos(lat0) * np.cos(c) - y * np.sin(lat0) * np.sin(c))
+
+        return np.round(grid[cells], 1), np.round(np.degrees(lat), 5), np.round(np.degrees(lon), 5)
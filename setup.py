@@ -14,7 +14,7 @@ setup(
     install_requires=[
         "wradlib >= 0.9",
         "haversine >= 0.4.5",
-        "numpy >= 1.6.1",
+        "numpy >= 1.10",
         "matplotlib	>= 1.1.0",
         "scipy >= 0.9",
         "h5py >= 2.0.1",
@@ -22,9 +22,7 @@ setup(
         "gdal >= 1.9",
         "watchdog >= 0.8.3",
         "requests >= 2.13.0",
-        "geopy",
         "scikit-learn",
-        "shapely",
-        "pandas"
+        "shapely"
     ]
 )
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pruebas de los acumulados de lluvia contra una suma directa de los incrementos de cada ventana.
+"""
+
+import ama.accumulator as accumulator
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class RainfallAccumulatorTest(unittest.TestCase):
+
+    LAYER = 0
+    SHAPE = (6, 5)
+    START = 1496311200  # 2017-06-01T10:00:00Z
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.environment = os.environ.get("AMA_EXPORT_DATA")
+        os.environ["AMA_EXPORT_DATA"] = self.directory
+
+        self.options = (accumulator.RainfallAccumulator.WINDOWS, accumulator.RainfallAccumulator.SLOTS)
+        accumulator.RainfallAccumulator.WINDOWS = (900, 1800)
+        accumulator.RainfallAccumulator.SLOTS = 8
+        accumulator.RainfallAccumulator._entries = {}
+
+        self.random = np.random.RandomState(3)
+        self.added = []
+
+    def tearDown(self):
+        accumulator.RainfallAccumulator.WINDOWS, accumulator.RainfallAccumulator.SLOTS = self.options
+        accumulator.RainfallAccumulator._entries = {}
+        if self.environment is None:
+            del os.environ["AMA_EXPORT_DATA"]
+        else:
+            os.environ["AMA_EXPORT_DATA"] = self.environment
+        shutil.rmtree(self.directory)
+
+    def add(self, scan_time):
+        rate = self.random.uniform(0., 20., self.SHAPE).astype(np.float32)
+        totals = accumulator.RainfallAccumulator.default(self.LAYER, self.SHAPE)
+        self.assertTrue(totals.add(rate, scan_time))
+
+        # el mismo intervalo que el acumulador: el primero o luego de un corte, SCAN_INTERVAL.
+        last = self.added[-1][0] if self.added else None
+        interval = accumulator.RainfallAccumulator.SCAN_INTERVAL \
+            if last is None or scan_time - last > accumulator.RainfallAccumulator.MAXIMUM_INTERVAL else scan_time - last
+        self.added.append((scan_time, rate * (interval / 3600.)))
+
+        return totals
+
+    def expected(self, window, slots=None):
+        last = self.added[-1][0]
+        increments = self.added[-(slots or accumulator.RainfallAccumulator.SLOTS):]
+
+        return sum(increment for scan_time, increment in increments if scan_time > last - window)
+
+    def assertWindows(self, totals):
+        for window in accumulator.RainfallAccumulator.WINDOWS:
+            self.assertTrue(np.allclose(totals.accumulation(window), self.expected(window), atol=1e-4))
+
+    def test_accumulation_across_windows(self):
+        for k in range(20):
+            totals = self.add(self.START + 300 * k + (60 if k % 3 == 0 else 0))
+            self.assertWindows(totals)
+
+    def test_old_scans_leave_the_window_after_a_gap(self):
+        for k in range(4):
+            self.add(self.START + 300 * k)
+        totals = self.add(self.START + 300 * 3 + 3600)
+
+        self.assertWindows(totals)
+        self.assertTrue(np.allclose(totals.accumulation(1800), self.added[-1][1], atol=1e-5))
+
+    def test_ring_eviction_when_window_is_longer_than_slots(self):
+        accumulator.RainfallAccumulator.SLOTS = 4
+        for k in range(10):
+            totals = self.add(self.START + 300 * k)
+
+            self.assertTrue(np.allclose(totals.accumulation(1800), self.expected(1800, 4), atol=1e-4))
+
+    def test_older_scan_is_rejected(self):
+        totals = self.add(self.START + 600)
+
+        self.assertFalse(totals.add(np.ones(self.SHAPE), self.START))
+        self.assertFalse(totals.add(np.ones(self.SHAPE), self.START + 600))
+
+    def test_state_survives_restart(self):
+        for k in range(5):
+            self.add(self.START + 300 * k)
+        accumulator.RainfallAccumulator._entries = {}
+
+        totals = self.add(self.START + 300 * 5)
+
+        self.assertWindows(totals)
+
+    def test_rain_rate_table(self):
+        dBZ = np.array([[-64., 10., 30.04, 55., 70.]])
+        rate = accumulator.RainfallAccumulator.rain_rate(dBZ)
+        expected = (10. ** (np.array([10., 30.]) / 10.) / 200.) ** (1. / 1.6)
+
+        self.assertEqual(rate[0, 0], 0.)
+        self.assertTrue(np.allclose(rate[0, 1:3], expected, rtol=1e-5))
+        self.assertEqual(rate[0, 3], rate[0, 4])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pruebas de la conversión entre los archivos de correlación de texto (*.ama*) y binarios (*.amab*).
+"""
+
+import ama.ama_binary as ama_binary
+import numpy as np
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+
+class AmaBinaryTest(unittest.TestCase):
+
+    RADAR = (-25.2737, -57.6359)
+    SCAN_TIME = "2017-06-01T10:00:00.000Z"
+    LAYER = 3
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.text_path = os.path.join(self.directory, "scan.ama")
+        self.binary_path = os.path.join(self.directory, "scan.amab")
+
+        random = np.random.RandomState(11)
+        count = 1000
+        # como *Processor.write_correlation*: dBZ, latitud y longitud con la resolución del texto.
+        self.rows = np.column_stack((np.round(random.uniform(-31.5, 80., count), 1),
+                                     np.round(random.uniform(-27.5, -23., count), 5),
+                                     np.round(random.uniform(-60., -55., count), 5)))
+        with open(self.text_path, "w") as f:
+            np.savetxt(f, self.rows, fmt=ama_binary.AmaBinary.TEXT_FORMAT)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_header(self):
+        ama_binary.AmaBinary.text_to_binary(self.text_path, self.binary_path, self.RADAR[0], self.RADAR[1],
+                                            self.SCAN_TIME, self.LAYER)
+
+        # la cabecera documentada, independiente de la constante del módulo.
+        header = struct.Struct("<4sHHdd32sQ")
+        with open(self.binary_path, "rb") as f:
+            magic, version, layer, latitude, longitude, scan_time, count = header.unpack(f.read(header.size))
+
+        self.assertEqual(header.size, ama_binary.AmaBinary.HEADER_SIZE)
+        self.assertEqual((magic, version, layer), (b"AMAB", ama_binary.AmaBinary.VERSION, self.LAYER))
+        self.assertEqual((latitude, longitude), self.RADAR)
+        self.assertEqual(scan_time.rstrip(b"\0"), self.SCAN_TIME.encode("ascii"))
+        self.assertEqual(count, len(self.rows))
+        # sin suma de verificación en la cabecera, la cantidad de puntos debe cubrir el archivo entero.
+        self.assertEqual(os.path.getsize(self.binary_path), 64 + count * (4 + 4 + 2))
+
+    def test_round_trip(self):
+        ama_binary.AmaBinary.text_to_binary(self.text_path, self.binary_path, self.RADAR[0], self.RADAR[1],
+                                            self.SCAN_TIME, self.LAYER)
+        data = ama_binary.AmaBinary.read(self.binary_path)
+
+        self.assertEqual((len(data), data.layer, data.scan_time), (len(self.rows), self.LAYER, self.SCAN_TIME))
+        self.assertTrue(isinstance(data.raw_latitude, np.memmap))
+        self.assertTrue(np.array_equal(data.raw_dBZ, np.rint(self.rows[:, 0] * 10).astype(np.int16)))
+        self.assertTrue(np.allclose(np.column_stack((data.dBZ, data.latitude, data.longitude)), self.rows, atol=1e-9))
+
+        converted = os.path.join(self.directory, "converted.ama")
+        ama_binary.AmaBinary.binary_to_text(self.binary_path, converted)
+        del data
+
+        with open(self.text_path, "r") as original, open(converted, "r") as result:
+            self.assertEqual(result.read(), original.read())
+
+    def test_empty(self):
+        open(self.text_path, "w").close()
+
+        ama_binary.AmaBinary.text_to_binary(self.text_path, self.binary_path, self.RADAR[0], self.RADAR[1],
+                                            self.SCAN_TIME, self.LAYER)
+
+        self.assertEqual(len(ama_binary.AmaBinary.read(self.binary_path)), 0)
+
+    def test_invalid_files(self):
+        with open(self.binary_path, "wb") as f:
+            f.write(b"AMAB")
+        self.assertRaises(ValueError, ama_binary.AmaBinary.read, self.binary_path)
+
+        with open(self.binary_path, "wb") as f:
+            f.write(ama_binary.AmaBinary.HEADER.pack(b"AMAB", ama_binary.AmaBinary.VERSION + 1, 0, 0., 0., b"", 0))
+        self.assertRaises(ValueError, ama_binary.AmaBinary.read, self.binary_path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pruebas de la combinación de gates con coordenadas duplicadas.
+"""
+
+import ama.correlator as correlator
+import numpy as np
+import unittest
+
+
+def deduplicate_correlated_data(ri, lat, lon, data):
+    """
+    La verificación de duplicados que reemplazó *Correlator.deduplicate*: un punto solo se agrega
+    si ninguno de los ya agregados tiene las mismas coordenadas.
+    """
+    for i, (r, la, lo) in enumerate(data):
+        if la == lat and lo == lon:
+            return False
+
+    return True
+
+
+class DeduplicateTest(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(13)
+        count = 2000
+        # pocas coordenadas distintas para que haya muchos duplicados, como cerca del radar.
+        lat = np.round(-25.27 + random.randint(0, 40, count) * 1e-5, 5)
+        lon = np.round(-57.63 + random.randint(0, 40, count) * 1e-5, 5)
+        self.dBZ = np.round(random.uniform(20., 60., count), 1)
+        self.lat, self.lon = lat, lon
+
+    def test_first_matches_removed_check(self):
+        data = []
+        for ri, la, lo in zip(self.dBZ.tolist(), self.lat.tolist(), self.lon.tolist()):
+            if deduplicate_correlated_data(ri, la, lo, data):
+                data.append((ri, la, lo))
+
+        dBZ, lat, lon, duplicates = correlator.Correlator.deduplicate(self.dBZ, self.lat, self.lon, "first")
+
+        self.assertEqual(list(zip(dBZ.tolist(), lat.tolist(), lon.tolist())), data)
+        self.assertEqual(duplicates, len(self.dBZ) - len(data))
+
+    def test_points_within_one_quantum_collapse(self):
+        # a menos de medio 1e-5 grados de la misma coordenada redondeada.
+        lat = np.array([-25.123451, -25.123449, -25.12345, -25.123456])
+        lon = np.array([-57.543211, -57.543209, -57.54321, -57.54321])
+        dBZ = np.array([30., 45., 35., 50.])
+
+        values, lat, lon, duplicates = correlator.Correlator.deduplicate(dBZ, lat, lon, "max")
+
+        self.assertEqual(duplicates, 2)
+        self.assertEqual(values.tolist(), [45., 50.])
+        self.assertEqual(np.round(lat, 5).tolist(), [-25.12345, -25.12346])
+
+    def test_kept_row_follows_policy(self):
+        dBZ = np.array([30., 20., 45., 25., 40.])
+        lat = np.array([-25.1, -25.2, -25.1, -25.2, -25.1])
+        lon = np.array([-57.1, -57.2, -57.1, -57.2, -57.1])
+
+        for policy, expected in (("first", [30., 20.]), ("max", [45., 25.]), ("mean", [38.3, 22.5])):
+            values, kept_lat, kept_lon, duplicates = correlator.Correlator.deduplicate(dBZ, lat, lon, policy)
+
+            # en el orden de la primera aparición de cada coordenada, con sus coordenadas.
+            self.assertEqual(values.tolist(), expected)
+            self.assertEqual(kept_lat.tolist(), [-25.1, -25.2])
+            self.assertEqual(kept_lon.tolist(), [-57.1, -57.2])
+            self.assertEqual(duplicates, 3)
+
+    def test_without_duplicates(self):
+        dBZ, lat, lon, duplicates = correlator.Correlator.deduplicate([30., 40.], [-25.1, -25.2], [-57.1, -57.2])
+
+        self.assertEqual((dBZ.tolist(), duplicates), ([30., 40.], 0))
+        self.assertRaises(ValueError, correlator.Correlator.deduplicate, [30.], [-25.1], [-57.1], "median")
+
+
+if __name__ == "__main__":
+    unittest.main()
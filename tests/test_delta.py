@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pruebas de la codificación de los puntos enviados como diferencias, desde *DeltaEncoder* hasta
+*DeltaDecoder* pasando por el JSON generado por *PayloadBuilder*.
+"""
+
+import ama.delta as delta
+import ama.json_payload as json_payload
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class DeltaTest(unittest.TestCase):
+
+    LAYER = 0
+    KEYFRAME_INTERVAL = 4
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.environment = os.environ.get("AMA_EXPORT_DATA")
+        os.environ["AMA_EXPORT_DATA"] = self.directory
+
+        self.interval = delta.DeltaEncoder.KEYFRAME_INTERVAL
+        delta.DeltaEncoder.KEYFRAME_INTERVAL = self.KEYFRAME_INTERVAL
+        delta.DeltaEncoder._entries = {}
+
+        self.random = np.random.RandomState(1)
+        self.encoder = delta.DeltaEncoder.default(self.LAYER)
+        self.decoder = delta.DeltaDecoder()
+
+    def tearDown(self):
+        delta.DeltaEncoder.KEYFRAME_INTERVAL = self.interval
+        delta.DeltaEncoder._entries = {}
+        if self.environment is None:
+            del os.environ["AMA_EXPORT_DATA"]
+        else:
+            os.environ["AMA_EXPORT_DATA"] = self.environment
+        shutil.rmtree(self.directory)
+
+    def scans(self, count):
+        # barridos sucesivos donde desaparecen, cambian y aparecen puntos.
+        points = self.random_points(2000)
+        for k in range(count):
+            if k > 0:
+                points = points[self.random.rand(len(points)) > 0.03]
+                changed = self.random.rand(len(points)) < 0.05
+                points[changed, 2] += 1.5
+                points = np.vstack((points, self.random_points(100)))
+            yield points.copy()
+
+    def random_points(self, count):
+        return np.round(np.column_stack((-25.5 + self.random.rand(count) * 0.5,
+                                         -57.9 + self.random.rand(count) * 0.5,
+                                         20. + self.random.rand(count) * 30.)), 5)
+
+    def send(self, points, compress=False):
+        frame = self.encoder.encode(points)
+
+        return frame, json_payload.PayloadBuilder(compress).build("2017-06-01T10:00:00Z", False, np.zeros((0, 3)),
+                                                                  points, None, None, frame)
+
+    def assertReconstructed(self, points):
+        expected = delta.DeltaEncoder.from_fixed_point(*delta.DeltaEncoder.fixed_point(points))
+        expected = expected[np.lexsort((expected[:, 1], expected[:, 0]))]
+        reconstructed = self.decoder.points()
+
+        self.assertEqual(reconstructed.shape, expected.shape)
+        self.assertTrue(np.allclose(reconstructed, expected))
+
+    def test_keyframes(self):
+        kinds = []
+        for points in self.scans(2 * self.KEYFRAME_INTERVAL + 1):
+            frame, payload = self.send(points)
+            kinds.append(frame["tipo"])
+
+            self.assertTrue(self.decoder.apply(payload))
+            self.assertReconstructed(points)
+
+        self.assertEqual([k for k, kind in enumerate(kinds) if kind == "completo"], [0, 4, 8])
+
+    def test_dropped_sequence_waits_for_keyframe(self):
+        for k, points in enumerate(self.scans(2 * self.KEYFRAME_INTERVAL)):
+            frame, payload = self.send(points)
+            if k == 2:
+                continue  # envío perdido.
+
+            applied = self.decoder.apply(payload)
+            if 2 < k < self.KEYFRAME_INTERVAL:
+                self.assertEqual(frame["tipo"], "delta")
+                self.assertFalse(applied)
+            else:
+                self.assertTrue(applied)
+                self.assertReconstructed(points)
+
+    def test_reset_forces_keyframe(self):
+        scans = self.scans(3)
+        self.decoder.apply(self.send(next(scans))[1])
+        self.send(next(scans))  # envío que no llegó al Controlador.
+        self.encoder.reset()
+
+        frame, payload = self.send(next(scans))
+
+        self.assertEqual(frame["tipo"], "completo")
+        self.assertTrue(self.decoder.apply(payload))
+
+    def test_gzip_payload(self):
+        for points in self.scans(3):
+            payload = self.send(points, True)[1]
+
+            self.assertEqual(payload[:2], b"\x1f\x8b")
+            self.assertTrue(self.decoder.apply(payload))
+            self.assertReconstructed(points)
+
+    def test_replayed_old_frame_is_ignored(self):
+        payloads = []
+        for points in self.scans(3):
+            payloads.append(self.send(points)[1])
+            self.decoder.apply(payloads[-1])
+        sequence = self.decoder.sequence
+
+        self.assertFalse(self.decoder.apply(payloads[1]))
+        self.assertEqual(self.decoder.sequence, sequence)
+        self.assertReconstructed(points)
+
+    def test_state_survives_restart(self):
+        scans = self.scans(2)
+        self.send(next(scans))
+        delta.DeltaEncoder._entries = {}
+
+        frame = delta.DeltaEncoder.default(self.LAYER).encode(next(scans))
+
+        self.assertEqual((frame["secuencia"], frame["tipo"]), (2, "delta"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pruebas de las zonas de notificación.
+"""
+
+import ama.geofence as geofence
+import numpy as np
+import unittest
+
+from shapely.geometry import box
+
+
+class GeofenceTest(unittest.TestCase):
+
+    CENTER = (-25.2737, -57.6359)
+    OFFSET = 50.
+
+    def setUp(self):
+        latitude, longitude = self.CENTER
+        east = longitude + self.OFFSET / (geofence.Geofence.KMS_PER_DEGREE * np.cos(np.radians(latitude)))
+        north = latitude + self.OFFSET / geofence.Geofence.KMS_PER_DEGREE
+
+        # zonas pequeñas a 50 km del cluster hacia el Este y hacia el Norte.
+        self.fence = geofence.Geofence(["Este", "Norte"], [
+            box(east, latitude - 0.001, east + 0.01, latitude + 0.001),
+            box(longitude - 0.001, north, longitude + 0.001, north + 0.01)
+        ])
+
+        random = np.random.RandomState(0)
+        self.cluster = np.column_stack((latitude + random.uniform(-1e-4, 1e-4, 20),
+                                        longitude + random.uniform(-1e-4, 1e-4, 20)))
+
+    def test_distance_is_the_same_in_every_direction(self):
+        self.assertEqual(self.fence.names_of(self.fence.clusters([self.cluster], self.OFFSET + 2.)), [["Este", "Norte"]])
+        self.assertEqual(self.fence.names_of(self.fence.clusters([self.cluster], self.OFFSET - 2.)), [[]])
+
+    def test_points(self):
+        latitude, longitude = self.CENTER
+        east = longitude + self.OFFSET / (geofence.Geofence.KMS_PER_DEGREE * np.cos(np.radians(latitude)))
+
+        self.assertEqual(self.fence.points([latitude, latitude], [east + 0.005, longitude]), [[0], []])
+
+
+if __name__ == "__main__":
+    unittest.main()
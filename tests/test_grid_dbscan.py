@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pruebas del motor de agrupamiento sobre grilla contra *sklearn.cluster.DBSCAN* con métrica haversine.
+"""
+
+import ama.grid_dbscan as grid_dbscan
+import numpy as np
+import unittest
+
+from sklearn.cluster import DBSCAN
+from sklearn.metrics import adjusted_rand_score
+
+
+class GridDBSCANTest(unittest.TestCase):
+
+    RADAR = (-25.2737, -57.6359)
+    EPS = 2.
+    MIN_SAMPLES = 20
+    AGREEMENT = 0.999
+
+    @staticmethod
+    def points(seed):
+        # celdas de tormenta a distintas distancias del radar sobre un fondo de ecos dispersos.
+        random = np.random.RandomState(seed)
+        centers = [(-25.10, -57.50), (-25.40, -57.90), (-25.75, -57.30), (-24.90, -58.10), (-25.30, -57.62)]
+        parts = [np.column_stack((lat + random.randn(1500) * 0.04, lon + random.randn(1500) * 0.04))
+                 for lat, lon in centers]
+        parts.append(np.column_stack((random.uniform(-26.2, -24.3, 3000), random.uniform(-58.7, -56.6, 3000))))
+
+        return np.round(np.vstack(parts), 5)
+
+    def reference(self, points):
+        return DBSCAN(eps=self.EPS / grid_dbscan.GridDBSCAN.KMS_PER_RADIAN, min_samples=self.MIN_SAMPLES,
+                      algorithm="ball_tree", metric="haversine").fit(np.radians(points)).labels_
+
+    def test_labels_agree_with_sklearn(self):
+        for seed in (1, 2, 3):
+            points = GridDBSCANTest.points(seed)
+            expected = self.reference(points)
+            labels = grid_dbscan.GridDBSCAN(self.EPS, self.MIN_SAMPLES).fit(points[:, 0], points[:, 1], self.RADAR).labels_
+
+            self.assertEqual(len(set(labels)), len(set(expected)))
+            self.assertGreaterEqual(adjusted_rand_score(expected, labels), self.AGREEMENT)
+            self.assertGreaterEqual(np.mean((labels == grid_dbscan.GridDBSCAN.NOISE) ==
+                                            (expected == grid_dbscan.GridDBSCAN.NOISE)), self.AGREEMENT)
+
+    def test_empty_input(self):
+        labels = grid_dbscan.GridDBSCAN(self.EPS, self.MIN_SAMPLES).fit(np.zeros(0), np.zeros(0), self.RADAR).labels_
+
+        self.assertEqual(len(labels), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pruebas del serializador del JSON contra la concatenación de textos que lo generaba antes.
+"""
+
+import ama.json_payload as json_payload
+import gzip
+import io
+import numpy as np
+import unittest
+
+
+def concatenate(scan_time, notify, centroids, clustered):
+    """
+    El JSON tal como lo armaba *Processor.single_correlate_dbz_to_location_to_json* antes de *PayloadBuilder*.
+    """
+    cdata = ""
+    cdata += "{{\"fechaCarga\":\"{0}\",".format(scan_time)
+    cdata += "\"notificar\":\"{0}\",".format(notify)
+
+    cdata += "\"centroides\":["
+    if len(centroids) > 0:
+        for i, (centroid_lat, centroid_lon, centroid_dBZ) in enumerate(centroids):
+            line = "\"{0:.5f}:{1:.5f}\",".format(centroid_lat, centroid_lon)
+            if i == (len(centroids) - 1):
+                line = line[:-1]
+            cdata += line
+    cdata += "],"
+
+    cdata += "\"arrayDatos\":["
+    if len(clustered) > 0:
+        for i, (lat, lon, dBZ) in enumerate(sorted(clustered, key=lambda tup: tup[2])):
+            line = "\"{0:.1f};{1:.5f}:{2:.5f}\",".format(dBZ, lat, lon)
+            if i == (len(clustered) - 1):
+                line = line[:-1]
+            cdata += line
+    cdata += "]}"
+
+    return cdata.encode("utf-8")
+
+
+class PayloadBuilderTest(unittest.TestCase):
+
+    SCAN_TIME = "2017-06-01T10:00:00.000Z"
+
+    def setUp(self):
+        self.chunk_size = json_payload.PayloadBuilder.CHUNK_SIZE
+        json_payload.PayloadBuilder.CHUNK_SIZE = 7  # varios bloques con pocos puntos.
+
+        random = np.random.RandomState(7)
+        count = 500
+        # reflectividades en pasos de 0.5 dBZ, para que haya muchos puntos con la misma clave de orden.
+        self.clustered = np.column_stack((-25.5 + random.rand(count) * 0.5,
+                                          -57.9 + random.rand(count) * 0.5,
+                                          20. + random.randint(0, 20, count) * 0.5))
+        self.centroids = self.clustered[random.choice(count, 6, replace=False)]
+
+    def tearDown(self):
+        json_payload.PayloadBuilder.CHUNK_SIZE = self.chunk_size
+
+    def test_same_bytes_as_concatenation(self):
+        for notify in (True, False):
+            expected = concatenate(self.SCAN_TIME, notify, self.centroids, self.clustered)
+            payload = json_payload.PayloadBuilder().build(self.SCAN_TIME, notify, self.centroids, self.clustered)
+
+            self.assertEqual(payload, expected)
+
+    def test_equal_reflectivities_keep_input_order(self):
+        clustered = np.array([[-25.1, -57.1, 30.], [-25.2, -57.2, 20.], [-25.3, -57.3, 30.], [-25.4, -57.4, 20.]])
+
+        payload = json_payload.PayloadBuilder().build(self.SCAN_TIME, False, clustered[:1], clustered)
+
+        self.assertEqual(payload, concatenate(self.SCAN_TIME, False, clustered[:1], clustered))
+        self.assertTrue(payload.endswith(b"[\"20.0;-25.20000:-57.20000\",\"20.0;-25.40000:-57.40000\","
+                                         b"\"30.0;-25.10000:-57.10000\",\"30.0;-25.30000:-57.30000\"]}"))
+
+    def test_empty(self):
+        empty = np.zeros((0, 3))
+
+        self.assertEqual(json_payload.PayloadBuilder().build(self.SCAN_TIME, False, empty, empty),
+                         concatenate(self.SCAN_TIME, False, empty, empty))
+
+    def test_compressed(self):
+        payload = json_payload.PayloadBuilder(True).build(self.SCAN_TIME, True, self.centroids, self.clustered)
+
+        self.assertEqual(gzip.GzipFile(fileobj=io.BytesIO(payload), mode="rb").read(),
+                         concatenate(self.SCAN_TIME, True, self.centroids, self.clustered))
+
+
+if __name__ == "__main__":
+    unittest.main()
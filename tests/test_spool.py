@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pruebas de la cola persistente de datos no enviados.
+"""
+
+import ama.spool as spool
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class SpoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_pending_survive_restart(self):
+        pending = spool.Spool(self.directory)
+        for k in range(3):
+            pending.store("{{\"a\":{0}}}".format(k).encode("utf-8"))
+        pending.remove(pending.pending()[0])
+
+        pending = spool.Spool(self.directory)
+
+        self.assertEqual(pending.pending(), [2, 3])
+        self.assertEqual(pending.load(3), (b"{\"a\":2}", False))
+
+    def test_sequences_are_not_reused_after_emptying(self):
+        pending = spool.Spool(self.directory)
+        first = pending.store(b"{\"a\":1}")
+        pending.reject(first)
+        rejected = os.path.join(self.directory, spool.Spool.REJECTED_DIRECTORY, "{0:012d}.json.gz".format(first))
+        with open(rejected, "rb") as f:
+            original = f.read()
+
+        # la primera vez el índice vacío se compacta, la segunda solo queda lo compactado.
+        spool.Spool(self.directory)
+        pending = spool.Spool(self.directory)
+        second = pending.store(b"{\"a\":2}")
+        pending.reject(second)
+
+        self.assertGreater(second, first)
+        with open(rejected, "rb") as f:
+            self.assertEqual(f.read(), original)
+        self.assertEqual(len(os.listdir(os.path.join(self.directory, spool.Spool.REJECTED_DIRECTORY))), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
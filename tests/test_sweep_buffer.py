@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pruebas del buffer circular de barridos y de la entrega de un mismo barrido decodificado a los
+acumulados y al buffer.
+"""
+
+import ama.accumulator as accumulator
+import ama.processor as processor
+import ama.sweep_buffer as sweep_buffer
+import numpy as np
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+
+class SweepBufferTest(unittest.TestCase):
+
+    LAYER = 0
+    SHAPE = (8, 6)
+    CAPACITY = 4
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.environment = os.environ.get("AMA_EXPORT_DATA")
+        os.environ["AMA_EXPORT_DATA"] = self.directory
+
+        sweep_buffer.SweepBuffer._entries = {}
+        accumulator.RainfallAccumulator._entries = {}
+        self.random = np.random.RandomState(5)
+
+    def tearDown(self):
+        sweep_buffer.SweepBuffer._entries = {}
+        accumulator.RainfallAccumulator._entries = {}
+        if self.environment is None:
+            del os.environ["AMA_EXPORT_DATA"]
+        else:
+            os.environ["AMA_EXPORT_DATA"] = self.environment
+        shutil.rmtree(self.directory)
+
+    def scan(self, minute):
+        # la misma estructura que devuelve Processor.process para una capa.
+        layer_key = u"SCAN{0}".format(self.LAYER)
+        values = np.round(self.random.uniform(-10., 60., self.SHAPE), 1)
+        metadata = {
+            u"VOL": {"Latitude": -25.2737, "Longitude": -57.6359},
+            layer_key: {
+                "az": np.linspace(0., 360., self.SHAPE[0], endpoint=False),
+                "r": np.arange(1, self.SHAPE[1] + 1) * 1000.,
+                "elevation": 0.5,
+                "Time": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(1496311200 + 60 * minute))
+            }
+        }
+
+        return {layer_key: {u"Z": {"data": values}}}, metadata
+
+    def add(self, minutes):
+        buffer = sweep_buffer.SweepBuffer.default(self.LAYER, self.CAPACITY)
+        values = []
+        for minute in minutes:
+            data, metadata = self.scan(minute)
+            self.assertTrue(buffer.add(data, metadata))
+            values.append(data[u"SCAN0"][u"Z"]["data"])
+
+        return buffer, values
+
+    def test_ring_wraps_around(self):
+        buffer, values = self.add([5 * k for k in range(7)])
+
+        self.assertEqual(len(buffer), self.CAPACITY)
+        self.assertTrue(np.allclose(buffer.maximum(), np.max(values[-self.CAPACITY:], axis=0)))
+        replayed = [data[u"SCAN0"][u"Z"]["data"] for data, metadata in buffer.replay()]
+        self.assertTrue(np.allclose(replayed, values[-self.CAPACITY:]))
+
+    def test_window_ends_at_latest_scan(self):
+        buffer, values = self.add([0, 5, 10, 15])
+
+        self.assertTrue(np.allclose(buffer.maximum(600), np.max(values[-2:], axis=0)))
+        self.assertTrue(np.array_equal(buffer.count(30., 600), (np.array(values[-2:]) >= 30.).sum(axis=0)))
+
+    def test_out_of_order_and_repeated_scans(self):
+        buffer, values = self.add([10, 0, 5])
+        data, metadata = self.scan(5)
+
+        self.assertFalse(buffer.add(data, metadata))
+        times = [buffer.index["times"][slot] for slot in buffer.window()]
+        self.assertEqual(times, sorted(times))
+        self.assertTrue(np.allclose(buffer.scan()[0][u"SCAN0"][u"Z"]["data"], values[0]))
+
+    def test_state_survives_restart(self):
+        buffer, values = self.add([0, 5, 10, 15, 20])
+        sweep_buffer.SweepBuffer._entries = {}
+
+        buffer = sweep_buffer.SweepBuffer.default(self.LAYER)
+
+        self.assertEqual((len(buffer), buffer.capacity), (self.CAPACITY, self.CAPACITY))
+        self.assertTrue(np.allclose(buffer.maximum(), np.max(values[-self.CAPACITY:], axis=0)))
+
+    def test_consumers_share_one_decoded_scan(self):
+        options = (processor.Processor.ACCUMULATE_RAINFALL, processor.Processor.SWEEP_BUFFER_SIZE)
+        processor.Processor.ACCUMULATE_RAINFALL = True
+        processor.Processor.SWEEP_BUFFER_SIZE = self.CAPACITY
+        try:
+            data, metadata = self.scan(0)
+            original = data[u"SCAN0"][u"Z"]["data"].copy()
+
+            processor.Processor().ingest_scan(data, metadata, self.LAYER)
+
+            self.assertTrue(np.array_equal(data[u"SCAN0"][u"Z"]["data"], original))
+            buffer = sweep_buffer.SweepBuffer.default(self.LAYER)
+            self.assertEqual(len(buffer), 1)
+            self.assertTrue(np.allclose(buffer.scan()[0][u"SCAN0"][u"Z"]["data"], original))
+
+            totals = accumulator.RainfallAccumulator.default(self.LAYER, self.SHAPE)
+            expected = accumulator.RainfallAccumulator.rain_rate(original) * \
+                (accumulator.RainfallAccumulator.SCAN_INTERVAL / 3600.)
+            self.assertTrue(np.allclose(totals.accumulation(accumulator.RainfallAccumulator.WINDOWS[0]), expected, atol=1e-5))
+        finally:
+            processor.Processor.ACCUMULATE_RAINFALL, processor.Processor.SWEEP_BUFFER_SIZE = options
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pruebas del cliente del servicio Web del Controlador contra un servidor HTTP local.
+"""
+
+import ama.spool as spool
+import ama.uploader as uploader
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    """
+    Servidor HTTP local que atiende cada pedido en su propio hilo, para que un pedido demorado
+    no bloquee al reintento.
+    """
+    daemon_threads = True
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Responde a cada POST con la siguiente respuesta del guión del servidor. Una respuesta es
+    un código HTTP o una tupla (segundos de espera, código HTTP).
+    """
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.requests.append(body)
+
+        response = self.server.script.pop(0) if self.server.script else 200
+        delay, status = response if isinstance(response, tuple) else (0, response)
+        if delay:
+            time.sleep(delay)
+
+        self.send_response(status)
+        if status in self.server.retry_after:
+            self.send_header("Retry-After", self.server.retry_after[status])
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UploaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer(("127.0.0.1", 0), StubHandler)
+        self.server.script = []
+        self.server.requests = []
+        self.server.retry_after = {}
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+        self.backoff = uploader.Uploader.BACKOFF_BASE
+        uploader.Uploader.BACKOFF_BASE = 0.
+
+        url = "http://127.0.0.1:{0}/ama/datos/insertar".format(self.server.server_address[1])
+        self.client = uploader.Uploader(url=url, user="ama", password="ama", timeout=0.5, retries=2)
+
+    def tearDown(self):
+        uploader.Uploader.BACKOFF_BASE = self.backoff
+        self.client.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_server_error_is_retried(self):
+        self.server.script = [500, 503, 200]
+
+        self.assertTrue(self.client.send(b"{}"))
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_retries_are_bounded(self):
+        self.server.script = [500, 500, 500, 500]
+
+        self.assertFalse(self.client.send(b"{}"))
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_client_error_is_not_retried(self):
+        self.server.script = [400, 200]
+
+        self.assertFalse(self.client.send(b"{}"))
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_any_success_status_is_accepted(self):
+        for status in (201, 202, 204):
+            self.server.script = [status]
+
+            self.assertTrue(self.client.send(b"{}"))
+
+    def test_temporary_client_errors_are_retried(self):
+        self.server.script = [408, 429, 200]
+
+        self.assertTrue(self.client.send(b"{}"))
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_retry_after_is_honoured(self):
+        self.server.script = [429, 200]
+        self.server.retry_after = {429: "1"}
+
+        start = time.time()
+        self.assertTrue(self.client.send(b"{}"))
+        self.assertGreaterEqual(time.time() - start, 1.)
+
+    def test_credentials_are_required(self):
+        environment = dict((k, os.environ.pop(k)) for k in ("AMA_CONTROLLER_USER", "AMA_CONTROLLER_PASSWORD")
+                           if k in os.environ)
+        try:
+            self.assertRaises(ValueError, uploader.Uploader, url=self.client.url)
+        finally:
+            os.environ.update(environment)
+
+    def test_timeout_is_retried(self):
+        self.server.script = [(1.5, 200), 200]
+
+        self.assertTrue(self.client.send(b"{\"a\":1}"))
+        self.assertEqual(self.server.requests, [b"{\"a\":1}", b"{\"a\":1}"])
+
+    def test_rejected_payload_is_not_spooled(self):
+        directory = tempfile.mkdtemp()
+        try:
+            self.client.spool = spool.Spool(directory)
+            self.server.script = [422, 500, 500, 500]
+
+            self.assertFalse(self.client.deliver(b"{\"a\":1}"))
+            self.assertEqual(len(self.client.spool), 0)
+            self.assertFalse(self.client.deliver(b"{\"a\":2}"))
+            self.assertEqual(len(self.client.spool), 1)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_background_failure_is_reported(self):
+        directory = tempfile.mkdtemp()
+        try:
+            self.client.spool = spool.Spool(directory)
+            self.server.script = [500, 500, 500, 200]
+            failures = []
+
+            self.client.start()
+            self.client.submit(b"{\"secuencia\":1}", spool=False, on_failure=lambda: failures.append(1))
+            self.client.submit(b"{\"secuencia\":2}", spool=False, on_failure=lambda: failures.append(2))
+            self.client.stop()
+
+            self.assertEqual(failures, [1])
+            self.assertEqual(len(self.client.spool), 0)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_failure_drops_queued_payloads_of_the_group(self):
+        self.server.script = [(0.3, 500), 500, 500, 200, 200]
+        failures = []
+
+        self.client.start()
+        for k in range(3):
+            self.client.submit("{{\"secuencia\":{0}}}".format(k).encode("utf-8"), spool=False,
+                               on_failure=lambda: failures.append(1), group=0)
+        self.client.submit(b"{\"otra\":1}")  # sin grupo, no depende de los anteriores.
+        self.client.stop()
+
+        self.assertEqual(failures, [1])
+        self.assertEqual(self.server.requests[-1], b"{\"otra\":1}")
+        self.assertEqual(len(self.server.requests), 4)
+
+        # lo que se entrega luego de la falla, ej. el cuadro completo, se envía.
+        self.client.start()
+        self.client.submit(b"{\"secuencia\":3}", spool=False, group=0)
+        self.client.stop()
+
+        self.assertEqual(self.server.requests[-1], b"{\"secuencia\":3}")
+
+    def test_replay_sets_aside_rejected_payloads(self):
+        directory = tempfile.mkdtemp()
+        try:
+            pending = spool.Spool(directory)
+            for k in range(3):
+                pending.store("{{\"a\":{0}}}".format(k).encode("utf-8"))
+            self.server.script = [400, 200, 200]
+
+            self.assertEqual(pending.drain(self.client.send), 2)
+            self.assertEqual(len(pending), 0)
+            self.assertEqual(len(self.server.requests), 3)
+            self.assertEqual(len(os.listdir(os.path.join(directory, spool.Spool.REJECTED_DIRECTORY))), 1)
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    unittest.main()